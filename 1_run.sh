@@ -33,8 +33,9 @@ docker compose exec ia-gateway /bin/bash -c '
     echo "   Para pará-lo, pressione CTRL+C."
     echo "---------------------------------------------------------------------"
 
-    # Inicia o servidor em modo de recarga, acessível de fora do container
-    uvicorn servidor_modelo_local:app --reload --host 0.0.0.0 --port 8000
+    # Inicia o servidor acessível de fora do container. Sem --reload: os índices RAG
+    # são recarregados pelo próprio gateway, sem reconfigurar nem recarregar os modelos
+    uvicorn servidor_modelo_local:app --host 0.0.0.0 --port 8000
 '
 
 echo "---------------------------------------------------------------------"
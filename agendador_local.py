@@ -0,0 +1,188 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from typing import AsyncIterator, Optional
+
+CAPACIDADE_FILA_PADRAO = 8
+TIMEOUT_ENTRE_TOKENS = 180.0
+TEMPO_MAXIMO_GERACAO = 180.0
+
+
+class FilaCheia(Exception):
+    """A fila do modelo está cheia; o cliente deve tentar novamente após `retry_after` segundos."""
+
+    def __init__(self, nome_servico: str, retry_after: int):
+        super().__init__(f"A fila do serviço local '{nome_servico}' está cheia.")
+        self.retry_after = retry_after
+
+
+class TarefaGeracao:
+    def __init__(self, prompt: str, params: dict, loop: asyncio.AbstractEventLoop):
+        self.prompt = prompt
+        self.params = params
+        self.loop = loop
+        self.tokens: asyncio.Queue = asyncio.Queue()
+        self.cancelada = threading.Event()
+        self.enfileirada_em = time.monotonic()
+        # Conta na capacidade da fila até o modelo pegá-la ou o cliente desistir
+        self.na_fila = True
+
+    def entregar(self, item):
+        if self.loop.is_closed():
+            # O consumidor (e o seu loop) já foi embora; não há a quem entregar
+            return
+        self.loop.call_soon_threadsafe(self.tokens.put_nowait, item)
+
+
+class AgendadorModeloLocal:
+    """
+    Serializa o acesso a um objeto `Llama` (que não é thread-safe).
+
+    Uma única thread de trabalho atende as tarefas em ordem FIFO a partir de uma fila
+    limitada. Quando a fila enche, novas tarefas são recusadas com `FilaCheia` (429 no
+    gateway). A geração é feita em modo stream, o que permite interrompê-la entre dois
+    tokens assim que o cliente abandona a requisição. Os limites de tempo só começam a
+    contar quando o modelo pega a tarefa, não enquanto ela espera na fila.
+    """
+
+    _INICIO = object()
+    _FIM = object()
+
+    def __init__(self, nome_servico: str, modelo, params_inferencia: dict,
+                 capacidade_fila: int = CAPACIDADE_FILA_PADRAO, stop=("[/INST]", "</s>")):
+        self.nome_servico = nome_servico
+        self.modelo = modelo
+        self.params_inferencia = params_inferencia
+        self.capacidade_fila = capacidade_fila
+        self.stop = list(stop)
+        self._fila: "queue.Queue[TarefaGeracao]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._em_execucao: Optional[TarefaGeracao] = None
+        self._esperas = deque(maxlen=100)
+        self._duracoes = deque(maxlen=100)
+        self.concluidas = 0
+        self.canceladas = 0
+        self.recusadas = 0
+        self._thread = threading.Thread(target=self._trabalhar, name=f"agendador-{nome_servico}", daemon=True)
+        self._thread.start()
+
+    # --- Thread de trabalho ---
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self._fila.get()
+            self._retirar_da_fila(tarefa)
+            if tarefa.cancelada.is_set():
+                # Cliente desistiu enquanto esperava na fila: nem chega a ocupar o modelo
+                self.canceladas += 1
+                tarefa.entregar(self._FIM)
+                continue
+            self._esperas.append(time.monotonic() - tarefa.enfileirada_em)
+            with self._lock:
+                self._em_execucao = tarefa
+            tarefa.entregar(self._INICIO)
+            inicio = time.monotonic()
+            try:
+                for parte in self.modelo(tarefa.prompt, stop=self.stop, stream=True, **{**self.params_inferencia, **tarefa.params}):
+                    if tarefa.cancelada.is_set():
+                        self.canceladas += 1
+                        break
+                    tarefa.entregar(parte['choices'][0]['text'])
+                else:
+                    self.concluidas += 1
+            except Exception as e:
+                tarefa.entregar(e)
+            finally:
+                self._duracoes.append(time.monotonic() - inicio)
+                with self._lock:
+                    self._em_execucao = None
+                tarefa.entregar(self._FIM)
+
+    def _retirar_da_fila(self, tarefa: TarefaGeracao):
+        with self._lock:
+            if tarefa.na_fila:
+                tarefa.na_fila = False
+                self._pendentes -= 1
+
+    # --- API assíncrona ---
+
+    def _estimar_retry_after(self) -> int:
+        duracao_media = (sum(self._duracoes) / len(self._duracoes)) if self._duracoes else 30.0
+        return max(1, int(duracao_media * max(1, self._pendentes)))
+
+    def verificar_vaga(self):
+        """Levanta `FilaCheia` se uma tarefa submetida agora seria recusada (não reserva a vaga)."""
+        with self._lock:
+            cheia = self._pendentes >= self.capacidade_fila
+        if cheia:
+            self.recusadas += 1
+            raise FilaCheia(self.nome_servico, self._estimar_retry_after())
+
+    def submeter(self, prompt: str, **params) -> TarefaGeracao:
+        """Coloca uma geração na fila. Deve ser chamada dentro do loop assíncrono do gateway."""
+        tarefa = TarefaGeracao(prompt, params, asyncio.get_running_loop())
+        with self._lock:
+            # Tarefas canceladas ainda na fila já liberaram a vaga (ver `cancelar`)
+            cheia = self._pendentes >= self.capacidade_fila
+            if not cheia:
+                self._pendentes += 1
+        if cheia:
+            self.recusadas += 1
+            raise FilaCheia(self.nome_servico, self._estimar_retry_after())
+        self._fila.put(tarefa)
+        return tarefa
+
+    def cancelar(self, tarefa: TarefaGeracao):
+        """Interrompe a geração da tarefa; se ela ainda estiver na fila, a vaga é liberada na hora."""
+        self._retirar_da_fila(tarefa)
+        tarefa.cancelada.set()
+
+    async def consumir(self, tarefa: TarefaGeracao, tempo_maximo: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Entrega os tokens da tarefa; se o consumidor for cancelado ou abandonar o stream, a geração
+        é interrompida. Na fila não há limite de tempo; depois que o modelo pega a tarefa, cada token
+        tem até TIMEOUT_ENTRE_TOKENS segundos e a geração inteira até `tempo_maximo` (asyncio.TimeoutError).
+        """
+        try:
+            iniciada_em = None
+            while True:
+                timeout = None
+                if iniciada_em is not None:
+                    timeout = TIMEOUT_ENTRE_TOKENS
+                    if tempo_maximo is not None:
+                        timeout = min(timeout, max(0.0, iniciada_em + tempo_maximo - time.monotonic()))
+                item = await asyncio.wait_for(tarefa.tokens.get(), timeout=timeout)
+                if item is self._INICIO:
+                    iniciada_em = time.monotonic()
+                    continue
+                if item is self._FIM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.cancelar(tarefa)
+
+    async def gerar(self, prompt: str, tempo_maximo: Optional[float] = None, **params) -> str:
+        tarefa = self.submeter(prompt, **params)
+        partes = [token async for token in self.consumir(tarefa, tempo_maximo)]
+        return "".join(partes).strip()
+
+    def status(self) -> dict:
+        esperas = list(self._esperas)
+        with self._lock:
+            em_execucao = self._em_execucao
+        return {
+            "profundidade_fila": self._pendentes,
+            "capacidade_fila": self.capacidade_fila,
+            "gerando": em_execucao is not None,
+            "espera_media_s": round(sum(esperas) / len(esperas), 3) if esperas else 0.0,
+            "espera_maxima_s": round(max(esperas), 3) if esperas else 0.0,
+            "tempo_tarefa_atual_s": round(time.monotonic() - em_execucao.enfileirada_em, 3) if em_execucao else 0.0,
+            "concluidas": self.concluidas,
+            "canceladas": self.canceladas,
+            "recusadas": self.recusadas
+        }
@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+from construtor_contexto import dividir_em_pedacos, SEPARADOR_CHUNKS
+from compressor_extrativo import RESPOSTA_CONTEXTO_INSUFICIENTE
+
+PASTA_DOCUMENTOS = os.path.join("cache_analise", "documentos")
+CAMINHO_CACHE_MAPEAMENTO = os.path.join("cache_analise", "mapeamentos.json")
+CONCORRENCIA_PADRAO = 4
+TAMANHO_MAXIMO_JANELA_TOKENS = 6000
+SOBREPOSICAO_PEDACOS_PADRAO = 1
+MAX_RODADAS_REDUCAO = 3
+# Documentos não usados há mais que o TTL são apagados; acima da capacidade, os usados há mais tempo
+CAPACIDADE_DOCUMENTOS_BYTES = 500 * 1024 * 1024
+TTL_DOCUMENTOS_SEGUNDOS = 7 * 24 * 3600
+
+
+class RepositorioDocumentos:
+    """
+    Documentos enviados para análise, identificados pelo hash do texto. Ficam em disco
+    (um .txt por documento) para que o cliente envie cada arquivo uma única vez, e não
+    o texto inteiro a cada pergunta. A data de modificação do arquivo marca o último uso:
+    a cada envio, os documentos sem uso há mais de `ttl_segundos` são apagados e, se o
+    total passar de `capacidade_bytes`, os usados há mais tempo também (LRU).
+    """
+
+    def __init__(self, pasta: str = PASTA_DOCUMENTOS, capacidade_bytes: int = CAPACIDADE_DOCUMENTOS_BYTES,
+                 ttl_segundos: float = TTL_DOCUMENTOS_SEGUNDOS):
+        self.pasta = pasta
+        self.capacidade_bytes = capacidade_bytes
+        self.ttl_segundos = ttl_segundos
+        self._nomes = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def _caminho(self, id_documento: str) -> str:
+        return os.path.join(self.pasta, f"{id_documento}.txt")
+
+    @staticmethod
+    def _id_valido(id_documento: str) -> bool:
+        # O id é um hash hexadecimal; qualquer outra coisa não deve virar caminho de arquivo
+        return bool(id_documento) and all(c in "0123456789abcdef" for c in id_documento)
+
+    def _marcar_uso(self, caminho: str):
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            pass
+
+    def registrar(self, nome: str, texto: str) -> str:
+        id_documento = hashlib.sha256(texto.encode('utf-8')).hexdigest()
+        caminho = self._caminho(id_documento)
+        if os.path.exists(caminho):
+            self._marcar_uso(caminho)
+        else:
+            # Nome temporário único: dois envios simultâneos do mesmo documento não disputam o arquivo
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.pasta, prefix=f"{id_documento}.",
+                                             suffix=".tmp", delete=False) as f:
+                caminho_temporario = f.name
+                f.write(texto)
+            os.replace(caminho_temporario, caminho)
+        with self._lock:
+            self._nomes[id_documento] = nome
+        self.podar(manter=id_documento)
+        return id_documento
+
+    def obter(self, id_documento: str) -> Optional[dict]:
+        if not self._id_valido(id_documento):
+            return None
+        caminho = self._caminho(id_documento)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                texto = f.read()
+        except FileNotFoundError:
+            return None
+        self._marcar_uso(caminho)
+        with self._lock:
+            nome = self._nomes.get(id_documento, id_documento[:12])
+        return {"id": id_documento, "nome": nome, "texto": texto}
+
+    def remover(self, id_documento: str) -> bool:
+        if not self._id_valido(id_documento):
+            return False
+        with self._lock:
+            self._nomes.pop(id_documento, None)
+        try:
+            os.remove(self._caminho(id_documento))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def podar(self, manter: Optional[str] = None) -> List[str]:
+        """Apaga os documentos expirados e, acima da capacidade, os usados há mais tempo. Retorna os ids apagados."""
+        documentos = []
+        for nome_arquivo in os.listdir(self.pasta):
+            if not nome_arquivo.endswith(".txt"):
+                continue
+            try:
+                estado = os.stat(os.path.join(self.pasta, nome_arquivo))
+            except FileNotFoundError:
+                continue
+            documentos.append((estado.st_mtime, estado.st_size, nome_arquivo[:-len(".txt")]))
+        documentos.sort()
+        limite_uso = time.time() - self.ttl_segundos
+        total = sum(tamanho for _, tamanho, _ in documentos)
+        removidos = []
+        for ultimo_uso, tamanho, id_documento in documentos:
+            if id_documento == manter or (ultimo_uso >= limite_uso and total <= self.capacidade_bytes):
+                continue
+            if self.remover(id_documento):
+                removidos.append(id_documento)
+            total -= tamanho
+        return removidos
+
+
+def dividir_em_janelas(texto: str, orcamento_tokens: int, contar_tokens: Callable[[str], int],
+                       sobreposicao_pedacos: int = SOBREPOSICAO_PEDACOS_PADRAO) -> List[str]:
+    """
+    Agrupa os parágrafos do texto em janelas de até `orcamento_tokens` tokens. As últimas
+    `sobreposicao_pedacos` partes de uma janela são repetidas no início da seguinte, para
+    que uma informação na fronteira não fique cortada ao meio.
+    """
+    janelas, atual, tokens_atual = [], [], 0
+    custo_separador = contar_tokens(SEPARADOR_CHUNKS)
+    for pedaco in dividir_em_pedacos(texto):
+        custo = contar_tokens(pedaco) + custo_separador
+        if atual and tokens_atual + custo > orcamento_tokens:
+            janelas.append(SEPARADOR_CHUNKS.join(atual))
+            atual = atual[-sobreposicao_pedacos:] if sobreposicao_pedacos > 0 else []
+            tokens_atual = sum(contar_tokens(p) + custo_separador for p in atual)
+            # A sobreposição nunca pode impedir que o novo pedaço caiba
+            while atual and tokens_atual + custo > orcamento_tokens:
+                tokens_atual -= contar_tokens(atual.pop(0)) + custo_separador
+        atual.append(pedaco)
+        tokens_atual += custo
+    if atual:
+        janelas.append(SEPARADOR_CHUNKS.join(atual))
+    return janelas
+
+
+async def mapear_janelas(janelas: List[str], mapear: Callable[[str], Awaitable[str]],
+                         concorrencia: int = CONCORRENCIA_PADRAO) -> List[str]:
+    """Executa `mapear` em todas as janelas, com no máximo `concorrencia` chamadas simultâneas, preservando a ordem."""
+    semaforo = asyncio.Semaphore(max(1, concorrencia))
+
+    async def mapear_com_limite(janela: str) -> str:
+        async with semaforo:
+            return await mapear(janela)
+
+    return list(await asyncio.gather(*(mapear_com_limite(janela) for janela in janelas)))
+
+
+def parcial_relevante(parcial: str) -> bool:
+    texto = (parcial or "").strip().strip('"\'.')
+    return bool(texto) and texto != RESPOSTA_CONTEXTO_INSUFICIENTE
+
+
+def agrupar_parciais(parciais: List[str], orcamento_tokens: int, contar_tokens: Callable[[str], int]) -> List[str]:
+    """Junta respostas parciais consecutivas em grupos que caibam em `orcamento_tokens` (usado na redução em etapas)."""
+    grupos, atual, tokens_atual = [], [], 0
+    custo_separador = contar_tokens(SEPARADOR_CHUNKS)
+    for parcial in parciais:
+        custo = contar_tokens(parcial) + custo_separador
+        if atual and tokens_atual + custo > orcamento_tokens:
+            grupos.append(SEPARADOR_CHUNKS.join(atual))
+            atual, tokens_atual = [], 0
+        atual.append(parcial)
+        tokens_atual += custo
+    if atual:
+        grupos.append(SEPARADOR_CHUNKS.join(atual))
+    return grupos
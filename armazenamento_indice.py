@@ -0,0 +1,331 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from tipos_indice import construir_indice, ler_indice_mapeado
+
+# Formato alternativo ao par index.faiss/index.pkl: nada é desserializado com pickle e
+# os arquivos grandes são abertos com mmap, então vários processos compartilham as
+# mesmas páginas pelo cache do sistema operacional.
+ARQUIVO_INFO_MMAP = "indice_mmap.json"     # Escrito por último: marca o índice como completo
+ARQUIVO_VETORES = "vetores.f32"            # Matriz N x D em float32
+ARQUIVO_NORMAS = "normas.f32"              # ||v||^2 de cada vetor, para a distância L2
+ARQUIVO_TEXTOS = "textos.bin"              # Textos dos chunks em UTF-8, concatenados
+ARQUIVO_OFFSETS = "offsets.u64"            # N+1 posições de início de cada texto em textos.bin
+ARQUIVO_METADADOS = "metadados.sqlite"     # id e metadados (JSON) de cada chunk, por posição
+ARQUIVO_INDICE_ANN = "indice_ann.faiss"    # Opcional: índice aproximado (IVF/HNSW) sobre as mesmas posições
+VERSAO_FORMATO_MMAP = 1
+FORMATO_FAISS = "faiss"
+FORMATO_MMAP = "mmap"
+LINHAS_POR_BLOCO_BUSCA = 65536
+LINHAS_POR_LOTE_LEITURA = 1024
+
+
+def detectar_formato(pasta_indice: str) -> Optional[str]:
+    if os.path.isfile(os.path.join(pasta_indice, ARQUIVO_INFO_MMAP)):
+        return FORMATO_MMAP
+    if os.path.isfile(os.path.join(pasta_indice, "index.faiss")):
+        return FORMATO_FAISS
+    return None
+
+
+def _gravar_atomico(caminho: str, escrever):
+    caminho_temporario = caminho + ".tmp"
+    escrever(caminho_temporario)
+    os.replace(caminho_temporario, caminho)
+
+
+def salvar_indice_mmap(pasta_indice: str, db: FAISS, nome_modelo: str, indice_ann: Optional[faiss.Index] = None):
+    """
+    Exporta um índice FAISS do LangChain (com índice Flat, para que os vetores sejam
+    exatos) para o formato mmap em `pasta_indice`. `indice_ann`, se informado, é salvo
+    ao lado e passa a ser usado na busca no lugar da varredura completa.
+    """
+    total = db.index.ntotal
+    dimensao = db.index.d
+    vetores = db.index.reconstruct_n(0, total).astype(np.float32) if total else np.zeros((0, dimensao), dtype=np.float32)
+    ids = [db.index_to_docstore_id[posicao] for posicao in range(total)]
+    documentos = [db.docstore.search(id_chunk) for id_chunk in ids]
+
+    textos_codificados = [doc.page_content.encode('utf-8') for doc in documentos]
+    offsets = np.zeros(total + 1, dtype=np.uint64)
+    if total:
+        offsets[1:] = np.cumsum([len(t) for t in textos_codificados], dtype=np.uint64)
+
+    os.makedirs(pasta_indice, exist_ok=True)
+    caminho = lambda nome: os.path.join(pasta_indice, nome)
+    _gravar_atomico(caminho(ARQUIVO_VETORES), lambda c: vetores.tofile(c))
+    _gravar_atomico(caminho(ARQUIVO_NORMAS), lambda c: np.einsum('ij,ij->i', vetores, vetores).astype(np.float32).tofile(c))
+    _gravar_atomico(caminho(ARQUIVO_OFFSETS), lambda c: offsets.tofile(c))
+
+    def escrever_textos(c):
+        with open(c, 'wb') as f:
+            for texto in textos_codificados:
+                f.write(texto)
+    _gravar_atomico(caminho(ARQUIVO_TEXTOS), escrever_textos)
+
+    def escrever_metadados(c):
+        if os.path.exists(c):
+            os.remove(c)
+        conexao = sqlite3.connect(c)
+        try:
+            conexao.execute("CREATE TABLE chunks (posicao INTEGER PRIMARY KEY, id TEXT NOT NULL, source TEXT, metadados TEXT NOT NULL)")
+            conexao.execute("CREATE INDEX chunks_por_id ON chunks (id)")
+            conexao.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                ((posicao, ids[posicao], doc.metadata.get("source"), json.dumps(doc.metadata, ensure_ascii=False, default=str))
+                 for posicao, doc in enumerate(documentos))
+            )
+            conexao.commit()
+        finally:
+            conexao.close()
+    _gravar_atomico(caminho(ARQUIVO_METADADOS), escrever_metadados)
+    if indice_ann is not None:
+        _gravar_atomico(caminho(ARQUIVO_INDICE_ANN), lambda c: faiss.write_index(indice_ann, c))
+    elif os.path.exists(caminho(ARQUIVO_INDICE_ANN)):
+        os.remove(caminho(ARQUIVO_INDICE_ANN))
+
+    info = {"versao": VERSAO_FORMATO_MMAP, "total": total, "dimensao": dimensao,
+            "metrica": "l2", "modelo_embeddings": nome_modelo, "indice_ann": indice_ann is not None}
+
+    def escrever_info(c):
+        with open(c, 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+    _gravar_atomico(caminho(ARQUIVO_INFO_MMAP), escrever_info)
+
+    # O par index.faiss/index.pkl deixa de ser a fonte de verdade deste contexto
+    for nome in ("index.faiss", "index.pkl"):
+        if os.path.exists(caminho(nome)):
+            os.remove(caminho(nome))
+
+
+class GravadorIndiceMmap:
+    """
+    Grava um índice no formato mmap em lotes, para quem não tem (nem quer ter) o índice
+    inteiro em memória: cada `adicionar` acrescenta os vetores, normas, textos e metadados
+    ao fim dos arquivos. `concluir` treina o índice aproximado (se pedido) a partir dos
+    vetores já em disco e grava `indice_mmap.json` por último, como em `salvar_indice_mmap`.
+    A pasta deve ser nova (ex: a pasta de uma versão ainda não publicada).
+    """
+
+    def __init__(self, pasta_indice: str, nome_modelo: str):
+        os.makedirs(pasta_indice, exist_ok=True)
+        self.pasta_indice = pasta_indice
+        self.nome_modelo = nome_modelo
+        self.total = 0
+        self.dimensao = 0
+        self._fim_textos = 0
+        caminho = lambda nome: os.path.join(pasta_indice, nome)
+        self._vetores = open(caminho(ARQUIVO_VETORES), 'wb')
+        self._normas = open(caminho(ARQUIVO_NORMAS), 'wb')
+        self._textos = open(caminho(ARQUIVO_TEXTOS), 'wb')
+        self._offsets = open(caminho(ARQUIVO_OFFSETS), 'wb')
+        np.zeros(1, dtype=np.uint64).tofile(self._offsets)
+        self._conexao = sqlite3.connect(caminho(ARQUIVO_METADADOS))
+        self._conexao.execute("CREATE TABLE chunks (posicao INTEGER PRIMARY KEY, id TEXT NOT NULL, source TEXT, metadados TEXT NOT NULL)")
+
+    def __len__(self) -> int:
+        return self.total
+
+    def adicionar(self, ids: List[str], documentos: List[Document], vetores):
+        """Acrescenta um lote; as posições continuam a partir das já gravadas."""
+        if not ids:
+            return
+        vetores = np.asarray(vetores, dtype=np.float32).reshape(len(ids), -1)
+        self.dimensao = vetores.shape[1]
+        textos_codificados = [doc.page_content.encode('utf-8') for doc in documentos]
+        fins = self._fim_textos + np.cumsum([len(t) for t in textos_codificados], dtype=np.uint64)
+        vetores.tofile(self._vetores)
+        np.einsum('ij,ij->i', vetores, vetores).astype(np.float32).tofile(self._normas)
+        for texto in textos_codificados:
+            self._textos.write(texto)
+        fins.astype(np.uint64).tofile(self._offsets)
+        self._conexao.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            ((self.total + i, id_chunk, doc.metadata.get("source"), json.dumps(doc.metadata, ensure_ascii=False, default=str))
+             for i, (id_chunk, doc) in enumerate(zip(ids, documentos)))
+        )
+        self._conexao.commit()
+        self._fim_textos = int(fins[-1])
+        self.total += len(ids)
+
+    def concluir(self, config_indice: Optional[dict] = None):
+        """Fecha os arquivos, treina o índice aproximado sobre os vetores mapeados e marca o índice como completo."""
+        for arquivo in (self._vetores, self._normas, self._textos, self._offsets):
+            arquivo.close()
+        self._conexao.execute("CREATE INDEX chunks_por_id ON chunks (id)")
+        self._conexao.commit()
+        self._conexao.close()
+        caminho = lambda nome: os.path.join(self.pasta_indice, nome)
+        indice_ann = None
+        if self.total and config_indice and config_indice.get("tipo", "flat") != "flat":
+            vetores = np.memmap(caminho(ARQUIVO_VETORES), dtype=np.float32, mode='r', shape=(self.total, self.dimensao))
+            indice_ann = construir_indice(vetores, config_indice)
+            del vetores
+            _gravar_atomico(caminho(ARQUIVO_INDICE_ANN), lambda c: faiss.write_index(indice_ann, c))
+        info = {"versao": VERSAO_FORMATO_MMAP, "total": self.total, "dimensao": self.dimensao,
+                "metrica": "l2", "modelo_embeddings": self.nome_modelo, "indice_ann": indice_ann is not None}
+
+        def escrever_info(c):
+            with open(c, 'w', encoding='utf-8') as f:
+                json.dump(info, f, indent=2)
+        _gravar_atomico(caminho(ARQUIVO_INFO_MMAP), escrever_info)
+
+    def abortar(self):
+        """Fecha os arquivos sem concluir (quem chamou remove a pasta)."""
+        for arquivo in (self._vetores, self._normas, self._textos, self._offsets):
+            arquivo.close()
+        self._conexao.close()
+
+
+def remover_indice_mmap(pasta_indice: str):
+    # O arquivo de informações sai primeiro, para que ninguém abra um índice pela metade
+    for nome in (ARQUIVO_INFO_MMAP, ARQUIVO_VETORES, ARQUIVO_NORMAS, ARQUIVO_TEXTOS, ARQUIVO_OFFSETS, ARQUIVO_METADADOS,
+                 ARQUIVO_INDICE_ANN):
+        caminho = os.path.join(pasta_indice, nome)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+class IndiceMmap:
+    """
+    Índice somente leitura no formato mmap. Abrir custa O(1): os arquivos são apenas
+    mapeados, e a busca lê os vetores em blocos direto do cache de páginas. Somente os
+    top-k resultados têm texto e metadados materializados. Se houver um índice aproximado
+    (`indice_ann.faiss`), a busca passa por ele em vez da varredura. Expõe o mesmo
+    `similarity_search_with_score_by_vector` do FAISS do LangChain (distância L2 ao quadrado).
+    """
+
+    def __init__(self, pasta_indice: str):
+        self.pasta_indice = pasta_indice
+        with open(os.path.join(pasta_indice, ARQUIVO_INFO_MMAP), 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+        if self.info.get("versao") != VERSAO_FORMATO_MMAP:
+            raise ValueError(f"Versão do formato mmap não suportada: {self.info.get('versao')}")
+        self.total = self.info["total"]
+        self.dimensao = self.info["dimensao"]
+        self._vetores = self._mapear(ARQUIVO_VETORES, np.float32, (self.total, self.dimensao))
+        self._normas = self._mapear(ARQUIVO_NORMAS, np.float32, (self.total,))
+        self._offsets = self._mapear(ARQUIVO_OFFSETS, np.uint64, (self.total + 1,))
+        self._textos = self._mapear(ARQUIVO_TEXTOS, np.uint8, None)
+        caminho_metadados = os.path.abspath(os.path.join(pasta_indice, ARQUIVO_METADADOS))
+        self._conexao = sqlite3.connect(f"file:{caminho_metadados}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._indice_ann = None
+        if self.info.get("indice_ann"):
+            self._indice_ann = ler_indice_mapeado(os.path.join(pasta_indice, ARQUIVO_INDICE_ANN))
+
+    def _mapear(self, nome_arquivo: str, dtype, forma):
+        caminho = os.path.join(self.pasta_indice, nome_arquivo)
+        # np.memmap não aceita arquivos vazios (índice sem chunks)
+        if os.path.getsize(caminho) == 0:
+            return np.zeros(forma or (0,), dtype=dtype)
+        return np.memmap(caminho, dtype=dtype, mode='r', shape=forma)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def texto(self, posicao: int) -> str:
+        inicio, fim = int(self._offsets[posicao]), int(self._offsets[posicao + 1])
+        return self._textos[inicio:fim].tobytes().decode('utf-8')
+
+    def vetores(self) -> np.ndarray:
+        return self._vetores
+
+    def _registros(self, posicoes: List[int]) -> dict:
+        if not posicoes:
+            return {}
+        marcadores = ",".join("?" * len(posicoes))
+        with self._lock:
+            linhas = self._conexao.execute(
+                f"SELECT posicao, id, metadados FROM chunks WHERE posicao IN ({marcadores})", posicoes
+            ).fetchall()
+        return {posicao: (id_chunk, json.loads(metadados)) for posicao, id_chunk, metadados in linhas}
+
+    def buscar_posicoes(self, vetor: List[float], k: int) -> List[Tuple[int, float]]:
+        """Top-k por distância L2 ao quadrado, percorrendo os vetores mapeados em blocos."""
+        if not self.total or k <= 0:
+            return []
+        consulta = np.asarray(vetor, dtype=np.float32)
+        if self._indice_ann is not None:
+            distancias, posicoes = self._indice_ann.search(consulta[None, :], k)
+            return [(int(p), max(0.0, float(d))) for p, d in zip(posicoes[0], distancias[0]) if p >= 0]
+        norma_consulta = float(consulta @ consulta)
+        candidatas_pos, candidatas_dist = [], []
+        for inicio in range(0, self.total, LINHAS_POR_BLOCO_BUSCA):
+            fim = min(inicio + LINHAS_POR_BLOCO_BUSCA, self.total)
+            distancias = self._normas[inicio:fim] - 2.0 * (self._vetores[inicio:fim] @ consulta) + norma_consulta
+            if len(distancias) > k:
+                melhores = np.argpartition(distancias, k)[:k]
+            else:
+                melhores = np.arange(len(distancias))
+            candidatas_pos.append(melhores + inicio)
+            candidatas_dist.append(distancias[melhores])
+        posicoes = np.concatenate(candidatas_pos)
+        distancias = np.concatenate(candidatas_dist)
+        ordem = np.argsort(distancias)[:k]
+        return [(int(posicoes[i]), max(0.0, float(distancias[i]))) for i in ordem]
+
+    def materializar(self, posicoes: List[int]) -> List[Document]:
+        registros = self._registros(posicoes)
+        return [Document(page_content=self.texto(p), metadata=registros[p][1], id=registros[p][0]) for p in posicoes]
+
+    def documentos_por_ids(self, ids: List[str]) -> dict:
+        """Materializa os chunks com os IDs pedidos (ex: resultados da busca BM25)."""
+        if not ids:
+            return {}
+        marcadores = ",".join("?" * len(ids))
+        with self._lock:
+            linhas = self._conexao.execute(
+                f"SELECT posicao, id, metadados FROM chunks WHERE id IN ({marcadores})", list(ids)
+            ).fetchall()
+        return {id_chunk: Document(page_content=self.texto(posicao), metadata=json.loads(metadados), id=id_chunk)
+                for posicao, id_chunk, metadados in linhas}
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        resultados = self.buscar_posicoes(embedding, k)
+        documentos = self.materializar([posicao for posicao, _ in resultados])
+        return [(doc, distancia) for doc, (_, distancia) in zip(documentos, resultados)]
+
+    def iterar_lotes(self, tamanho_lote: int = LINHAS_POR_LOTE_LEITURA) -> Iterator[Tuple[List[str], List[Document], np.ndarray]]:
+        """Percorre todos os chunks em lotes (ids, documentos, vetores), lendo do disco um lote por vez."""
+        for inicio in range(0, self.total, tamanho_lote):
+            fim = min(inicio + tamanho_lote, self.total)
+            with self._lock:
+                linhas = self._conexao.execute(
+                    "SELECT posicao, id, metadados FROM chunks WHERE posicao >= ? AND posicao < ? ORDER BY posicao", (inicio, fim)
+                ).fetchall()
+            ids = [id_chunk for _, id_chunk, _ in linhas]
+            documentos = [Document(page_content=self.texto(posicao), metadata=json.loads(metadados)) for posicao, _, metadados in linhas]
+            yield ids, documentos, np.asarray(self._vetores[inicio:fim])
+
+    def iterar_documentos(self) -> Iterator[Tuple[str, Document, np.ndarray]]:
+        """Percorre todos os chunks (id, documento, vetor); usado para reabrir o índice como FAISS."""
+        for ids, documentos, vetores in self.iterar_lotes():
+            yield from zip(ids, documentos, vetores)
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+def carregar_faiss_de_mmap(pasta_indice: str, embeddings: Embeddings) -> FAISS:
+    """Reconstrói um FAISS em memória a partir do formato mmap, sem embutir nada de novo (usado na atualização incremental)."""
+    indice = IndiceMmap(pasta_indice)
+    try:
+        ids, textos_vetores, metadados = [], [], []
+        for id_chunk, documento, vetor in indice.iterar_documentos():
+            ids.append(id_chunk)
+            textos_vetores.append((documento.page_content, np.asarray(vetor, dtype=np.float32).tolist()))
+            metadados.append(documento.metadata)
+    finally:
+        indice.fechar()
+    return FAISS.from_embeddings(textos_vetores, embeddings, metadatas=metadados, ids=ids)
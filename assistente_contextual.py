@@ -3,135 +3,122 @@ import json
 import requests
 from dotenv import load_dotenv
 
-# Dependências para RAG e embeddings
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Novas dependências para manipulação de arquivos
-import fitz  # PyMuPDF
-import docx
-import openpyxl
+# Extração de texto de PDF/DOCX/XLSX em pool de processos, com cache em disco
+from extrator_documentos import extrair_documentos
 
 # --- SEÇÃO 1: FUNÇÃO DE COMUNICAÇÃO COM O GATEWAY ---
 
-def chamar_servidor_gateway(endpoint: str, payload: dict) -> str:
-    """Função centralizada para chamar endpoints do nosso servidor gateway."""
+URL_SERVIDOR_GATEWAY = "http://127.0.0.1:8000"
+
+def chamar_servidor_gateway_completo(endpoint: str, payload: dict) -> dict:
+    """Chama um endpoint do gateway e devolve o JSON completo da resposta."""
     try:
-        url = f"http://127.0.0.1:8000/{endpoint.strip('/')}"
+        url = f"{URL_SERVIDOR_GATEWAY}/{endpoint.strip('/')}"
         response = requests.post(url, json=payload, timeout=300)
         response.raise_for_status()
-        return response.json().get("texto_gerado", f"ERRO: Resposta inválida do endpoint /{endpoint}")
+        return response.json()
     except requests.exceptions.RequestException as e:
-        return f"ERRO DE CONEXÃO com o Servidor Gateway: {e}"
+        return {"texto_gerado": f"ERRO DE CONEXÃO com o Servidor Gateway: {e}"}
 
-# --- SEÇÃO 2: NOVAS FUNÇÕES PARA EXTRAÇÃO DE TEXTO ---
+def chamar_servidor_gateway(endpoint: str, payload: dict) -> str:
+    """Função centralizada para chamar endpoints do nosso servidor gateway."""
+    resposta = chamar_servidor_gateway_completo(endpoint, payload)
+    return resposta.get("texto_gerado", f"ERRO: Resposta inválida do endpoint /{endpoint}")
 
-def extrair_texto_de_pdf(caminho_arquivo: str) -> str:
+def chamar_servidor_gateway_stream(endpoint: str, payload: dict) -> dict:
+    """
+    Chama um endpoint de streaming (SSE) do gateway e imprime os tokens conforme chegam.
+    Retorna um dicionário com o texto completo e os eventos auxiliares recebidos (ex: fontes).
+    """
+    resultado = {"texto_gerado": ""}
     try:
-        with fitz.open(caminho_arquivo) as doc:
-            texto = "".join(page.get_text() for page in doc)
-        return texto
-    except Exception as e:
-        print(f"     ❌ ERRO ao ler PDF {caminho_arquivo}: {e}")
-        return ""
+        url = f"{URL_SERVIDOR_GATEWAY}/{endpoint.strip('/')}"
+        with requests.post(url, json=payload, stream=True, timeout=300) as response:
+            response.raise_for_status()
+            evento = None
+            for linha in response.iter_lines(decode_unicode=True):
+                if not linha:
+                    evento = None
+                    continue
+                if linha.startswith("event: "):
+                    evento = linha[len("event: "):]
+                    continue
+                if not linha.startswith("data: "):
+                    continue
+                dados = json.loads(linha[len("data: "):])
+                if evento == "erro":
+                    print(f"\n❌ {dados.get('detail')}")
+                elif evento == "progresso":
+                    fim_linha = "\n" if dados['janelas_concluidas'] >= dados['janelas'] else ""
+                    print(f"\r   -> Janelas analisadas: {dados['janelas_concluidas']}/{dados['janelas']}", end=fim_linha, flush=True)
+                elif evento == "fim":
+                    resultado["texto_gerado"] = dados.get("texto_gerado", resultado["texto_gerado"])
+                elif evento:
+                    resultado.update(dados)
+                else:
+                    resultado["texto_gerado"] += dados["token"]
+                    print(dados["token"], end="", flush=True)
+        print()
+    except requests.exceptions.RequestException as e:
+        print(f"ERRO DE CONEXÃO com o Servidor Gateway: {e}")
+    return resultado
 
-def extrair_texto_de_docx(caminho_arquivo: str) -> str:
+def listar_contextos_no_servidor():
+    """Retorna os contextos com índice carregado no gateway, ou None se o gateway não responder."""
     try:
-        doc = docx.Document(caminho_arquivo)
-        return "\n".join([para.text for para in doc.paragraphs])
-    except Exception as e:
-        print(f"     ❌ ERRO ao ler DOCX {caminho_arquivo}: {e}")
-        return ""
+        response = requests.get(f"{URL_SERVIDOR_GATEWAY}/contextos", timeout=10)
+        response.raise_for_status()
+        return response.json().get("contextos", [])
+    except requests.exceptions.RequestException:
+        return None
 
-def extrair_texto_de_xlsx(caminho_arquivo: str) -> str:
-    try:
-        workbook = openpyxl.load_workbook(caminho_arquivo)
-        texto_completo = []
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            texto_completo.append(f"--- Planilha: {sheet_name} ---\n")
-            for row in sheet.iter_rows(values_only=True):
-                texto_linha = "\t".join([str(cell) if cell is not None else "" for cell in row])
-                texto_completo.append(texto_linha)
-        return "\n".join(texto_completo)
-    except Exception as e:
-        print(f"     ❌ ERRO ao ler XLSX {caminho_arquivo}: {e}")
-        return ""
-        
-def extrair_texto_de_fontes(fontes: list) -> str:
+# --- SEÇÃO 2: EXTRAÇÃO DE TEXTO ---
+
+def extrair_texto_de_fontes(fontes: list) -> list:
     """
-    Lê uma lista de arquivos de diferentes formatos e retorna todo o conteúdo
-    como uma única string de texto.
+    Lê uma lista de arquivos de diferentes formatos e retorna o texto de cada um
+    como uma lista de dicionários {"nome", "texto"}.
     """
     print("\n-> Extraindo texto de todas as fontes...")
-    textos_completos = []
-    
-    for fonte in fontes:
-        print(f"   - Processando: {fonte}")
-        if not os.path.exists(fonte):
-            print(f"     ⚠️ AVISO: Arquivo não encontrado, será ignorado: {fonte}")
-            continue
-
-        extensao = os.path.splitext(fonte)[1].lower()
-        texto_extraido = ""
-
-        if extensao == ".pdf":
-            texto_extraido = extrair_texto_de_pdf(fonte)
-        elif extensao in [".txt", ".json"]:
-            try:
-                with open(fonte, 'r', encoding='utf-8') as f:
-                    texto_extraido = f.read()
-            except Exception as e:
-                print(f"     ❌ ERRO ao ler arquivo de texto {fonte}: {e}")
-        elif extensao == ".docx":
-            texto_extraido = extrair_texto_de_docx(fonte)
-        elif extensao == ".xlsx":
-            texto_extraido = extrair_texto_de_xlsx(fonte)
-        else:
-            print(f"     ⚠️ AVISO: Tipo de arquivo não suportado, será ignorado: {extensao}")
-            continue
-        
-        if texto_extraido:
-            header = f"\n\n--- INÍCIO DO DOCUMENTO: {os.path.basename(fonte)} ---\n\n"
-            footer = f"\n\n--- FIM DO DOCUMENTO: {os.path.basename(fonte)} ---\n\n"
-            textos_completos.append(header + texto_extraido + footer)
-
-    if not textos_completos:
+    documentos = extrair_documentos(fontes)
+    if not documentos:
         print("   ❌ ERRO: Nenhum texto pôde ser extraído dos arquivos fornecidos.")
-        return ""
-        
+        return []
     print("✅ Extração de texto concluída.")
-    return "".join(textos_completos)
+    return documentos
 
 
 # --- SEÇÃO 3: LÓGICA DE CHAT ---
 
-def loop_chat_rag(db: FAISS, nome_especialista: str):
-    # ... (lógica do RAG permanece idêntica) ...
+def exibir_uso_contexto(resposta: dict):
+    uso = resposta.get("uso_contexto")
+    if uso:
+        print(f"\n📏 Contexto: {uso['tokens_contexto']}/{uso['orcamento_tokens']} tokens, {uso['chunks_usados']} trechos "
+              f"({uso['chunks_descartados_duplicata']} duplicados e {uso['chunks_descartados_orcamento']} fora do orçamento descartados)")
+
+def loop_chat_rag(id_contexto: str, nome_especialista: str):
+    # A busca, a sumarização opcional e a geração acontecem no gateway, que mantém o índice carregado.
     print(f"\n✅ Especialista '{nome_especialista}' pronto! (Comunicação via Servidor Gateway)")
     usar_resumo = input("Deseja SUMARIZAR o contexto antes de enviar? (s/n, padrão 'n'): ").lower() == 's'
+    modo_resumo = "llm"
+    if usar_resumo:
+        escolha_modo = input("   Modo de sumarização: 1. Modelo sumarizador (LLM)  2. Extrativo rápido (sem LLM) (padrão 1): ")
+        modo_resumo = "extrativo" if escolha_modo.strip() == "2" else "llm"
     print("   Digite 'sair' a qualquer momento para terminar.")
     
     while True:
         pergunta = input(f"\n🤖 Você pergunta para '{nome_especialista}': ")
         if pergunta.strip().lower() == 'sair': break
-        print("   -> Fase 1: Buscando documentos...")
-        docs_relevantes = db.similarity_search(pergunta, k=15)
-        if not docs_relevantes: print("\n💡 Resposta: Não encontrei documentos relevantes."); continue
-        contexto_original = "\n\n".join([doc.page_content for doc in docs_relevantes])
-        contexto_para_geracao = contexto_original
-        
-        if usar_resumo:
-            print("   -> Fase 2a: Solicitando sumarização ao servidor...")
-            payload = {"contexto": contexto_original, "pergunta": pergunta}
-            contexto_para_geracao = chamar_servidor_gateway("sumarizar", payload)
-        
-        print("   -> Fase 2b: Solicitando geração RAG ao servidor...")
-        payload = {"contexto": contexto_para_geracao, "pergunta": pergunta}
-        resposta_final = chamar_servidor_gateway("gerar_rag", payload)
+        print("   -> Solicitando busca e geração RAG ao servidor...")
+        payload = {"contexto": id_contexto, "pergunta": pergunta, "k": 8, "usar_resumo": usar_resumo, "modo_resumo": modo_resumo}
         
         print("\n💡 Resposta do Especialista (via Servidor Gateway):")
-        print(resposta_final)
+        resposta = chamar_servidor_gateway_stream("rag_stream", payload)
+        exibir_uso_contexto(resposta)
+        if resposta.get("fontes"):
+            print("\n📚 Fontes consultadas:")
+            for fonte in resposta["fontes"]:
+                print(f"   - {fonte}")
 
 
 def loop_chat_puro():
@@ -140,34 +127,49 @@ def loop_chat_puro():
     while True:
         pergunta = input("\n🤖 Você pergunta: ")
         if pergunta.strip().lower() == 'sair': break
-        print("   ...pensando (via servidor gateway)...")
-        response = chamar_servidor_gateway("gerar", {"prompt": pergunta})
         print("\n💡 Resposta do Gateway:")
-        print(response)
+        chamar_servidor_gateway_stream("gerar_stream", {"prompt": pergunta})
+
+def registrar_documentos_no_servidor(documentos: list) -> list:
+    """Envia cada documento uma única vez ao gateway e retorna os ids usados nas perguntas."""
+    ids_documentos = []
+    for documento in documentos:
+        resposta = chamar_servidor_gateway_completo("documentos", {"nome": documento["nome"], "texto": documento["texto"]})
+        if resposta.get("id"):
+            ids_documentos.append(resposta["id"])
+        else:
+            print(f"   ⚠️ AVISO: '{documento['nome']}' não foi enviado: {resposta.get('texto_gerado')}")
+    return ids_documentos
 
-# ATUALIZADO: O loop de análise de arquivos agora se parece muito com o loop de RAG
+# O texto de cada arquivo é enviado uma única vez; o gateway faz a análise em map-reduce
 def loop_analise_de_arquivos():
     fontes = CONTEXTOS_DISPONIVEIS.get("pdf_openrouter", {}).get("fontes", [])
     if not fontes: print("ERRO: Nenhuma fonte definida para 'pdf_openrouter' em contexts.json."); return
     
-    # Extrai todo o texto dos arquivos para uma única variável
-    contexto_dos_arquivos = extrair_texto_de_fontes(fontes)
-    
-    if not contexto_dos_arquivos:
+    documentos = extrair_texto_de_fontes(fontes)
+    if not documentos:
         return # Encerra se nenhum texto foi extraído
+
+    print("-> Enviando os documentos ao Servidor Gateway...")
+    ids_documentos = registrar_documentos_no_servidor(documentos)
+    if not ids_documentos:
+        print("ERRO: O Servidor Gateway não aceitou os documentos.")
+        return
         
     print("\n✅ Documentos processados e prontos para análise.")
     while True:
         pergunta = input("\n🤖 Você pergunta sobre os documentos: ")
         if pergunta.lower() == 'sair': break
             
-        print("   ...solicitando análise ao servidor gateway (via RAG)...")
-        # Reutiliza o endpoint /gerar_rag, enviando todo o texto como contexto
-        payload = {"contexto": contexto_dos_arquivos, "pergunta": pergunta}
-        resposta = chamar_servidor_gateway("gerar_rag", payload)
-        
+        payload = {"ids_documentos": ids_documentos, "pergunta": pergunta}
+        print("   -> Analisando os documentos em janelas (map-reduce)...")
         print("\n💡 Resposta do Assistente de Documentos:")
-        print(resposta)
+        resposta = chamar_servidor_gateway_stream("analisar_documentos_stream", payload)
+        analise = resposta.get("analise")
+        if analise:
+            print(f"\n📑 {analise['documentos']} documento(s), {analise['janelas']} janelas "
+                  f"({analise['janelas_em_cache']} do cache), {analise['parciais_relevantes']} trechos relevantes")
+        exibir_uso_contexto(resposta)
 
 
 # --- EXECUÇÃO PRINCIPAL ---
@@ -186,8 +188,11 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"AVISO: Não foi possível ler todas as configurações: {e}")
 
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
     PASTA_BASE_INDICES = "indices_rag"
+    # Os índices ficam carregados no gateway; aqui só consultamos quais estão disponíveis
+    contextos_no_servidor = listar_contextos_no_servidor()
+    if contextos_no_servidor is None:
+        print("AVISO: Não foi possível consultar o Servidor Gateway; o status dos índices será lido do disco.")
     print("✅ Ambiente do cliente configurado.")
 
     print("\n--- Assistente de IA com Servidor Gateway ---")
@@ -199,37 +204,31 @@ if __name__ == "__main__":
     i = 3
     for id_ctx, definicao_ctx in CONTEXTOS_DISPONIVEIS.items():
         if id_ctx == "pdf_openrouter": continue # Não mostra a opção de PDF no menu RAG
-        status = "✅ Indexado" if os.path.exists(os.path.join(PASTA_BASE_INDICES, id_ctx)) else "❌ Não Indexado"
+        if contextos_no_servidor is not None:
+            indexado = id_ctx in contextos_no_servidor
+        else:
+            indexado = os.path.exists(os.path.join(PASTA_BASE_INDICES, id_ctx))
+        status = "✅ Indexado" if indexado else "❌ Não Indexado"
         opcoes_rag[str(i)] = {"id": id_ctx, "nome": definicao_ctx['nome_exibicao'], "status": status}
         print(f"  {i}. Especialista RAG: {definicao_ctx['nome_exibicao']} ({status})")
         i += 1
+    # Busca federada: uma única pergunta consultando todos os índices carregados no gateway
+    if any("✅" in opcao["status"] for opcao in opcoes_rag.values()):
+        opcoes_rag[str(i)] = {"id": "*", "nome": "Todos os especialistas", "status": "✅ Indexado"}
+        print(f"  {i}. Buscar em TODOS os especialistas (busca federada)")
 
     escolha_principal = input("\nDigite o número da sua opção: ")
 
     if escolha_principal == '1':
         loop_chat_puro()
     elif escolha_principal == '2':
-        # Verifica se o gerador principal está configurado para a nuvem
-        servico_principal_config = CONFIG.get("servicos", {}).get("gerador_principal", {})
-        if servico_principal_config.get("tipo") != "nuvem":
-            print("\n============================== AÇÃO NECESSÁRIA ==============================")
-            print("❌ ERRO: A funcionalidade 'Analisar Documentos' requer que o servidor")
-            print("   esteja configurado com um modelo de NUVEM como 'gerador_principal'.")
-            print(f"\n   O servidor está atualmente configurado para usar o modelo LOCAL:")
-            print(f"   '{nome_modelo_principal_ativo}'")
-            print("\n   Por favor, reinicie o 'servidor_modelo_local.py' e, na configuração")
-            print("   do serviço 'gerador_principal', escolha a opção 'Nuvem (via OpenRouter)'.")
-            print("===============================================================================")
-            exit()
         loop_analise_de_arquivos()
     elif escolha_principal in opcoes_rag:
         ctx_info = opcoes_rag[escolha_principal]
         if "❌" in ctx_info["status"]:
             print(f"\nERRO: O especialista '{ctx_info['nome']}' não foi indexado.")
             exit()
-        print(f"\n-> Carregando o conhecimento do '{ctx_info['nome']}'...")
-        db_contexto = FAISS.load_local(os.path.join(PASTA_BASE_INDICES, ctx_info["id"]), embeddings, allow_dangerous_deserialization=True)
-        loop_chat_rag(db_contexto, ctx_info["nome"])
+        loop_chat_rag(ctx_info["id"], ctx_info["nome"])
     else:
         print("Escolha inválida.")
         
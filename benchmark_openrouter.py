@@ -0,0 +1,73 @@
+# Arquivo: benchmark_openrouter.py
+# Compara a latência por requisição ao OpenRouter abrindo um httpx.AsyncClient novo a cada
+# chamada (comportamento antigo do gateway) com um cliente compartilhado com pool de conexões.
+import os
+import time
+import asyncio
+import argparse
+import statistics
+import importlib.util
+
+import httpx
+from dotenv import load_dotenv
+
+# Endpoint leve e sem custo de tokens: informa os dados da chave usada
+URL_PADRAO = "https://openrouter.ai/api/v1/auth/key"
+
+
+def resumir(nome: str, latencias: list):
+    latencias_ms = sorted(l * 1000 for l in latencias)
+    p95 = latencias_ms[max(0, int(len(latencias_ms) * 0.95) - 1)]
+    print(f"  {nome:<28} média={statistics.mean(latencias_ms):7.1f} ms | "
+          f"p50={statistics.median(latencias_ms):7.1f} ms | p95={p95:7.1f} ms | "
+          f"min={latencias_ms[0]:7.1f} ms")
+
+
+async def medir_cliente_por_requisicao(url: str, headers: dict, n: int) -> list:
+    latencias = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            resposta = await client.get(url, headers=headers, timeout=30)
+            resposta.raise_for_status()
+        latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+async def medir_cliente_compartilhado(url: str, headers: dict, n: int) -> list:
+    latencias = []
+    usar_http2 = importlib.util.find_spec("h2") is not None
+    limites = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+    async with httpx.AsyncClient(http2=usar_http2, limits=limites, timeout=30) as client:
+        for _ in range(n):
+            inicio = time.perf_counter()
+            resposta = await client.get(url, headers=headers)
+            resposta.raise_for_status()
+            latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latência: cliente HTTP por requisição vs. cliente compartilhado.")
+    parser.add_argument("--n", type=int, default=20, help="Número de requisições em cada modo (padrão: 20).")
+    parser.add_argument("--url", type=str, default=URL_PADRAO, help=f"URL consultada (padrão: {URL_PADRAO}).")
+    args = parser.parse_args()
+
+    load_dotenv()
+    chave = os.getenv("OPENROUTER_API_KEY")
+    if not chave:
+        print("❌ ERRO: OPENROUTER_API_KEY não encontrada. Configure-a no .env.")
+        return
+    headers = {"Authorization": f"Bearer {chave}"}
+
+    print(f"--- Benchmark OpenRouter ({args.n} requisições por modo) ---")
+    antes = await medir_cliente_por_requisicao(args.url, headers, args.n)
+    depois = await medir_cliente_compartilhado(args.url, headers, args.n)
+    resumir("Antes (cliente por req.)", antes)
+    resumir("Depois (cliente compartilhado)", depois)
+    ganho = statistics.mean(antes) / statistics.mean(depois)
+    print(f"✅ O cliente compartilhado foi {ganho:.1f}x mais rápido em média.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Pasta padrão do cache em disco (montada junto com o projeto no docker-compose)
+PASTA_CACHE_EMBEDDINGS = "cache_embeddings"
+# Limite de vetores armazenados por modelo. Com o all-MiniLM-L6-v2 (384 dimensões)
+# 100.000 vetores ocupam ~150 MB em disco.
+CAPACIDADE_MAXIMA_PADRAO = 100_000
+# Fração da capacidade liberada de uma vez quando o cache enche (evita despejar a cada inserção)
+FRACAO_DESPEJO = 0.1
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza o texto do chunk para que diferenças só de espaçamento gerem a mesma chave."""
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def calcular_chave(nome_modelo: str, texto: str) -> str:
+    base = f"{nome_modelo}\x00{normalizar_texto(texto)}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+class CacheEmbeddings:
+    """
+    Cache de embeddings em disco para um único modelo.
+
+    Os vetores ficam em um arquivo float32 memory-mapped ('vetores.f32') e o índice
+    chave -> (slot, último uso) em 'indice.json'. Quando a capacidade máxima é
+    atingida, os vetores usados há mais tempo são despejados (LRU).
+
+    Vários processos podem ler o cache, mas só um grava por vez: o primeiro `armazenar`
+    pega um flock exclusivo em '.lock' e só o solta em `salvar`. Um segundo construtor
+    rodando ao mesmo tempo continua lendo (e recarrega o índice quando ele muda em disco),
+    mas não grava; sem isso, os dois reservariam os mesmos slots livres e o último `salvar`
+    apontaria chaves para vetores do outro processo.
+    """
+
+    def __init__(self, nome_modelo: str, pasta_base: str = PASTA_CACHE_EMBEDDINGS,
+                 capacidade_maxima: int = CAPACIDADE_MAXIMA_PADRAO):
+        self.nome_modelo = nome_modelo
+        self.capacidade_maxima = capacidade_maxima
+        self.pasta = os.path.join(pasta_base, re.sub(r'[^\w.\-]', '_', nome_modelo))
+        self.caminho_vetores = os.path.join(self.pasta, "vetores.f32")
+        self.caminho_indice = os.path.join(self.pasta, "indice.json")
+        self.caminho_lock = os.path.join(self.pasta, ".lock")
+        self._lock = threading.Lock()
+        self._arquivo_lock = None
+        self._gravando = False
+        self._avisou_sem_escrita = False
+        self._usos_alterados = False
+        self._assinatura: Optional[tuple] = None
+        self._dimensao: Optional[int] = None
+        self._slots_alocados = 0
+        self._vetores: Optional[np.memmap] = None
+        self._indice: Dict[str, list] = {}
+        self._slots_livres: List[int] = []
+        self._carregar()
+
+    # --- Persistência ---
+
+    def _assinatura_em_disco(self) -> Optional[tuple]:
+        try:
+            estado = os.stat(self.caminho_indice)
+        except FileNotFoundError:
+            return None
+        return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+    def _carregar(self):
+        assinatura = self._assinatura_em_disco()
+        try:
+            with open(self.caminho_indice, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if not os.path.exists(self.caminho_vetores):
+            return
+        self._dimensao = dados["dimensao"]
+        self._slots_alocados = dados["slots_alocados"]
+        self._indice = dados["entradas"]
+        self._vetores = np.memmap(self.caminho_vetores, dtype=np.float32, mode='r+',
+                                  shape=(self._slots_alocados, self._dimensao))
+        slots_usados = {slot for slot, _ in self._indice.values()}
+        self._slots_livres = [s for s in range(self._slots_alocados) if s not in slots_usados]
+        self._assinatura = assinatura
+
+    def _recarregar_se_alterado(self):
+        """Relê o índice se outro processo o regravou desde a última leitura (ou gravação) deste."""
+        if self._assinatura_em_disco() in (None, self._assinatura):
+            return
+        self._dimensao, self._slots_alocados, self._vetores = None, 0, None
+        self._indice, self._slots_livres = {}, []
+        self._carregar()
+
+    def _gravar_indice(self):
+        if self._vetores is None:
+            return
+        self._vetores.flush()
+        dados = {
+            "modelo": self.nome_modelo,
+            "dimensao": self._dimensao,
+            "slots_alocados": self._slots_alocados,
+            "entradas": self._indice
+        }
+        # Nome temporário único: nunca colide com outra gravação em andamento
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.pasta, prefix="indice.",
+                                         suffix=".tmp", delete=False) as f:
+            caminho_temporario = f.name
+            json.dump(dados, f)
+        os.replace(caminho_temporario, self.caminho_indice)
+        self._assinatura = self._assinatura_em_disco()
+        self._usos_alterados = False
+
+    def salvar(self):
+        """Grava o índice (vetores novos e instantes de uso) e libera a escrita para outros processos."""
+        with self._lock:
+            if not self._gravando and not (self._usos_alterados and self._obter_escrita()):
+                return
+            try:
+                self._gravar_indice()
+            finally:
+                self._liberar_escrita()
+
+    # --- Bloqueio entre processos ---
+
+    def _obter_escrita(self) -> bool:
+        if self._gravando:
+            return True
+        os.makedirs(self.pasta, exist_ok=True)
+        if self._arquivo_lock is None:
+            self._arquivo_lock = open(self.caminho_lock, 'a')
+        try:
+            fcntl.flock(self._arquivo_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not self._avisou_sem_escrita:
+                print(f"⚠️ AVISO: Cache de embeddings '{self.pasta}' em uso por outro processo; "
+                      f"este vai apenas ler o cache.")
+                self._avisou_sem_escrita = True
+            return False
+        self._gravando = True
+        # O outro processo pode ter gravado (e crescido o arquivo de vetores) enquanto este só lia
+        self._recarregar_se_alterado()
+        return True
+
+    def _liberar_escrita(self):
+        self._gravando = False
+        if self._arquivo_lock is not None:
+            fcntl.flock(self._arquivo_lock, fcntl.LOCK_UN)
+
+    # --- Alocação de slots ---
+
+    def _crescer(self, slots_necessarios: int):
+        """Aumenta o arquivo memory-mapped (crescimento geométrico até a capacidade máxima)."""
+        novo_total = min(self.capacidade_maxima, max(self._slots_alocados * 2, self._slots_alocados + slots_necessarios, 1024))
+        if novo_total <= self._slots_alocados:
+            return
+        os.makedirs(self.pasta, exist_ok=True)
+        if self._vetores is not None:
+            self._vetores.flush()
+            del self._vetores
+        with open(self.caminho_vetores, 'ab') as f:
+            f.truncate(novo_total * self._dimensao * 4)
+        self._vetores = np.memmap(self.caminho_vetores, dtype=np.float32, mode='r+',
+                                  shape=(novo_total, self._dimensao))
+        self._slots_livres.extend(range(self._slots_alocados, novo_total))
+        self._slots_alocados = novo_total
+
+    def _despejar(self, quantidade: int):
+        """Remove as entradas usadas há mais tempo, liberando seus slots."""
+        quantidade = max(quantidade, int(self.capacidade_maxima * FRACAO_DESPEJO))
+        mais_antigas = sorted(self._indice.items(), key=lambda item: item[1][1])[:quantidade]
+        for chave, (slot, _) in mais_antigas:
+            del self._indice[chave]
+            self._slots_livres.append(slot)
+        # Grava o índice antes de reaproveitar os slots: quem só lê o cache recarrega e
+        # deixa de encontrar as chaves despejadas em vez de ler o vetor novo no lugar delas
+        self._gravar_indice()
+
+    def _reservar_slots(self, quantidade: int) -> List[int]:
+        if len(self._slots_livres) < quantidade:
+            self._crescer(quantidade - len(self._slots_livres))
+        if len(self._slots_livres) < quantidade:
+            self._despejar(quantidade - len(self._slots_livres))
+        reservados = self._slots_livres[:quantidade]
+        del self._slots_livres[:quantidade]
+        return reservados
+
+    # --- API pública ---
+
+    def buscar(self, chaves: List[str]) -> Dict[str, List[float]]:
+        """Retorna os vetores encontrados no cache, atualizando o instante do último uso."""
+        encontrados = {}
+        agora = time.time()
+        with self._lock:
+            if not self._gravando:
+                self._recarregar_se_alterado()
+            if self._vetores is None:
+                return encontrados
+            for chave in chaves:
+                entrada = self._indice.get(chave)
+                if entrada is None:
+                    continue
+                entrada[1] = agora
+                self._usos_alterados = True
+                encontrados[chave] = self._vetores[entrada[0]].tolist()
+        return encontrados
+
+    def armazenar(self, vetores_por_chave: Dict[str, List[float]]):
+        if not vetores_por_chave:
+            return
+        agora = time.time()
+        with self._lock:
+            novos = {c: v for c, v in vetores_por_chave.items() if c not in self._indice}
+            if not novos or not self._obter_escrita():
+                return
+            # Após recarregar, parte dos vetores pode já ter sido gravada pelo outro processo
+            novos = {c: v for c, v in novos.items() if c not in self._indice}
+            if not novos:
+                return
+            if self._dimensao is None:
+                self._dimensao = len(next(iter(novos.values())))
+            novos = dict(list(novos.items())[:self.capacidade_maxima])
+            slots = self._reservar_slots(len(novos))
+            for slot, (chave, vetor) in zip(slots, novos.items()):
+                self._vetores[slot] = np.asarray(vetor, dtype=np.float32)
+                self._indice[chave] = [slot, agora]
+
+    def __len__(self):
+        return len(self._indice)
+
+
+class EmbeddingsComCache(Embeddings):
+    """
+    Envolve um modelo de embeddings do Langchain consultando o `CacheEmbeddings`
+    antes de rodar o transformer. Chunks idênticos (mesmo entre contextos diferentes)
+    são embutidos uma única vez.
+
+    `embed_query` só lê o cache: o gateway fica no ar indefinidamente e, se gravasse
+    a pergunta, seguraria o lock de escrita e bloquearia os construtores de índice.
+    """
+
+    def __init__(self, embeddings_base: Embeddings, nome_modelo: str, cache: Optional[CacheEmbeddings] = None,
+                 salvar_a_cada_lote: bool = True):
+        self.embeddings_base = embeddings_base
+        self.nome_modelo = nome_modelo
+        self.cache = cache if cache is not None else CacheEmbeddings(nome_modelo)
+        # Com False, quem usa chama `cache.salvar()` ao final (evita regravar o índice do cache a cada lote)
+        self.salvar_a_cada_lote = salvar_a_cada_lote
+        self.acertos = 0
+        self.faltas = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        chaves = [calcular_chave(self.nome_modelo, texto) for texto in texts]
+        encontrados = self.cache.buscar(chaves)
+
+        # Textos ausentes são embutidos uma única vez, mesmo que se repitam na lista
+        pendentes = {}
+        for chave, texto in zip(chaves, texts):
+            if chave not in encontrados and chave not in pendentes:
+                pendentes[chave] = texto
+        if pendentes:
+            vetores_novos = self.embeddings_base.embed_documents(list(pendentes.values()))
+            calculados = dict(zip(pendentes.keys(), vetores_novos))
+            self.cache.armazenar(calculados)
+            if self.salvar_a_cada_lote:
+                self.cache.salvar()
+            encontrados.update(calculados)
+
+        self.acertos += len(texts) - len(pendentes)
+        self.faltas += len(pendentes)
+        return [encontrados[chave] for chave in chaves]
+
+    def embed_query(self, text: str) -> List[float]:
+        chave = calcular_chave(self.nome_modelo, text)
+        encontrado = self.cache.buscar([chave])
+        if chave in encontrado:
+            return encontrado[chave]
+        return self.embeddings_base.embed_query(text)
+
+    def resumo(self) -> str:
+        total = self.acertos + self.faltas
+        taxa = (self.acertos / total * 100) if total else 0.0
+        return f"{self.acertos}/{total} embeddings reaproveitados do cache ({taxa:.1f}%)"
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+import requests
+
+# Cache HTTP em disco compartilhado pelos coletores (gerenciador_indices.py e coletor_web_v2.py)
+PASTA_CACHE_HTTP = "cache_http"
+# Tempo (s) em que uma página é considerada fresca e reutilizada sem nenhuma requisição.
+# Depois disso ela é revalidada com If-None-Match / If-Modified-Since.
+TTL_PADRAO_SEGUNDOS = int(os.getenv("CACHE_HTTP_TTL_SEGUNDOS", 6 * 3600))
+# Entradas sem uso (nem coletadas, nem revalidadas) por este tempo são apagadas; acima da
+# capacidade, as usadas há mais tempo também. A data de modificação do arquivo marca o último uso.
+EXPIRACAO_PADRAO_SEGUNDOS = int(os.getenv("CACHE_HTTP_EXPIRACAO_SEGUNDOS", 30 * 24 * 3600))
+CAPACIDADE_PADRAO_BYTES = int(os.getenv("CACHE_HTTP_CAPACIDADE_MB", 1024)) * 1024 * 1024
+
+
+class CacheHTTP:
+    """
+    Guarda, por URL, o HTML bruto, os textos extraídos por cada coletor, os validadores
+    (ETag/Last-Modified) e o instante da coleta. Cada entrada é um JSON próprio em
+    `cache_http/`, escrito de forma atômica para poder ser usado a partir de várias threads.
+    Ao abrir o cache, e sempre que as páginas gravadas passam de `capacidade_bytes`, as
+    entradas sem uso há mais de `expiracao_segundos` e as usadas há mais tempo são apagadas.
+    """
+
+    def __init__(self, pasta: str = PASTA_CACHE_HTTP, ttl_segundos: int = TTL_PADRAO_SEGUNDOS,
+                 expiracao_segundos: int = EXPIRACAO_PADRAO_SEGUNDOS, capacidade_bytes: int = CAPACIDADE_PADRAO_BYTES):
+        self.pasta = pasta
+        self.ttl_segundos = ttl_segundos
+        self.expiracao_segundos = expiracao_segundos
+        self.capacidade_bytes = capacidade_bytes
+        self._lock = threading.Lock()
+        self._bytes_em_disco = 0
+        os.makedirs(self.pasta, exist_ok=True)
+        self.podar()
+
+    def _caminho(self, url: str) -> str:
+        return os.path.join(self.pasta, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+
+    # --- Leitura e escrita das entradas ---
+
+    def ler_entrada(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._caminho(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _gravar_entrada(self, entrada: dict):
+        caminho = self._caminho(entrada["url"])
+        caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(caminho_temporario, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False)
+        os.replace(caminho_temporario, caminho)
+
+    def podar(self) -> int:
+        """Apaga as entradas expiradas e, acima da capacidade, as usadas há mais tempo. Retorna quantas foram apagadas."""
+        with self._lock:
+            entradas = []
+            for nome in os.listdir(self.pasta):
+                if not nome.endswith(".json"):
+                    continue
+                try:
+                    estado = os.stat(os.path.join(self.pasta, nome))
+                except FileNotFoundError:
+                    continue
+                entradas.append((estado.st_mtime, estado.st_size, nome))
+            entradas.sort()
+            limite_uso = time.time() - self.expiracao_segundos
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            removidas = 0
+            for ultimo_uso, tamanho, nome in entradas:
+                if ultimo_uso >= limite_uso and total <= self.capacidade_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                    removidas += 1
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+            self._bytes_em_disco = total
+        if removidas:
+            print(f"   -> Cache HTTP: {removidas} página(s) antiga(s) removida(s) de '{self.pasta}'.")
+        return removidas
+
+    def registrar(self, url: str, html: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> dict:
+        """Grava uma nova versão da página. Textos extraídos de versões anteriores são descartados."""
+        entrada = {
+            "url": url,
+            "html": html,
+            "textos": {},
+            "etag": etag,
+            "last_modified": last_modified,
+            "buscado_em": time.time()
+        }
+        self._gravar_entrada(entrada)
+        with self._lock:
+            # Estimativa (o HTML domina o tamanho da entrada); a poda recalcula o total real
+            self._bytes_em_disco += len(html.encode('utf-8'))
+            cheio = self._bytes_em_disco > self.capacidade_bytes
+        if cheio:
+            self.podar()
+        return entrada
+
+    def salvar_texto(self, url: str, extrator: str, texto):
+        """Associa à versão atual da página o texto (ou estrutura JSON) produzido por um extrator."""
+        with self._lock:
+            entrada = self.ler_entrada(url)
+            if entrada is None:
+                return
+            entrada["textos"][extrator] = texto
+            self._gravar_entrada(entrada)
+
+    def _renovar(self, entrada: dict):
+        entrada["buscado_em"] = time.time()
+        self._gravar_entrada(entrada)
+
+    # --- Validação ---
+
+    def esta_fresca(self, entrada: Optional[dict]) -> bool:
+        return bool(entrada) and (time.time() - entrada.get("buscado_em", 0)) < self.ttl_segundos
+
+    @staticmethod
+    def _cabecalhos_condicionais(entrada: Optional[dict], cabecalhos: Optional[dict]) -> dict:
+        resultado = dict(cabecalhos or {})
+        if entrada:
+            if entrada.get("etag"):
+                resultado["If-None-Match"] = entrada["etag"]
+            if entrada.get("last_modified"):
+                resultado["If-Modified-Since"] = entrada["last_modified"]
+        return resultado
+
+    def buscar_html(self, url: str, cabecalhos: Optional[dict] = None, timeout: float = 20) -> Tuple[dict, str]:
+        """
+        Devolve (entrada, origem) para a URL, onde origem é:
+        - 'cache'      : entrada dentro do TTL, nenhuma requisição foi feita;
+        - 'revalidado' : o servidor respondeu 304, a entrada foi reaproveitada;
+        - 'rede'       : a página foi baixada por completo e gravada no cache.
+        Exceções de rede são propagadas (o chamador decide se tenta novamente).
+        """
+        entrada = self.ler_entrada(url)
+        if self.esta_fresca(entrada):
+            return entrada, 'cache'
+        resposta = requests.get(url, headers=self._cabecalhos_condicionais(entrada, cabecalhos), timeout=timeout)
+        if resposta.status_code == 304 and entrada:
+            self._renovar(entrada)
+            return entrada, 'revalidado'
+        resposta.raise_for_status()
+        entrada = self.registrar(url, resposta.text, resposta.headers.get("ETag"), resposta.headers.get("Last-Modified"))
+        return entrada, 'rede'
+
+    def revalidar(self, url: str, cabecalhos: Optional[dict] = None, timeout: float = 20) -> Optional[dict]:
+        """
+        Para coletores que não baixam via `requests` (ex: Selenium): devolve a entrada em
+        cache se ela ainda é válida (TTL ou 304), ou None se a página precisa ser coletada de novo.
+        """
+        entrada = self.ler_entrada(url)
+        if not entrada:
+            return None
+        if self.esta_fresca(entrada):
+            return entrada
+        if not (entrada.get("etag") or entrada.get("last_modified")):
+            return None
+        try:
+            resposta = requests.get(url, headers=self._cabecalhos_condicionais(entrada, cabecalhos), timeout=timeout, stream=True)
+            resposta.close()
+        except requests.exceptions.RequestException:
+            return None
+        if resposta.status_code == 304:
+            self._renovar(entrada)
+            return entrada
+        return None
+
+    def consultar_validadores(self, url: str, cabecalhos: Optional[dict] = None, timeout: float = 10) -> Tuple[Optional[str], Optional[str]]:
+        """Obtém ETag/Last-Modified com um HEAD (melhor esforço) para páginas renderizadas fora do `requests`."""
+        try:
+            resposta = requests.head(url, headers=cabecalhos or {}, timeout=timeout, allow_redirects=True)
+            return resposta.headers.get("ETag"), resposta.headers.get("Last-Modified")
+        except requests.exceptions.RequestException:
+            return None, None
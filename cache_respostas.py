@@ -0,0 +1,171 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+CAMINHO_CACHE_RESPOSTAS = os.path.join("cache_respostas", "respostas.json")
+CAPACIDADE_PADRAO = 1000
+TTL_PADRAO_SEGUNDOS = 24 * 3600
+# O JSON inteiro é regravado a cada salvamento: no caminho das requisições, no máximo uma vez por intervalo
+INTERVALO_SALVAMENTO_PADRAO = 30.0
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    pergunta = re.sub(r'\s+', ' ', pergunta.lower()).strip()
+    return pergunta.rstrip('?!. ')
+
+
+def _hash(*partes: str) -> str:
+    return hashlib.sha256("\x00".join(partes).encode('utf-8')).hexdigest()
+
+
+class CacheRespostas:
+    """
+    Cache de respostas do gateway.
+
+    O escopo de uma entrada é (serviço, id do modelo, template do prompt, IDs dos chunks
+    recuperados); dentro do escopo a chave exata é a pergunta normalizada. Se um
+    `limiar_similaridade` for configurado, uma pergunta diferente porém parecida (cosseno
+    entre os embeddings >= limiar) no mesmo escopo também é considerada um acerto.
+    Eviction por LRU (capacidade) e TTL (as entradas vencidas saem na busca ou no próximo
+    salvamento); o conteúdo é persistido em JSON por `salvar`, ou
+    por `talvez_salvar`, que só grava se houver mudanças e o último salvamento tiver mais de
+    `intervalo_salvamento` segundos.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CACHE_RESPOSTAS, capacidade: int = CAPACIDADE_PADRAO,
+                 ttl_segundos: float = TTL_PADRAO_SEGUNDOS, limiar_similaridade: Optional[float] = None,
+                 intervalo_salvamento: float = INTERVALO_SALVAMENTO_PADRAO):
+        self.caminho = caminho
+        self.capacidade = capacidade
+        self.ttl_segundos = ttl_segundos
+        self.limiar_similaridade = limiar_similaridade
+        self._entradas: "OrderedDict[str, dict]" = OrderedDict()
+        self.intervalo_salvamento = intervalo_salvamento
+        self._lock = threading.Lock()
+        # Serializa as gravações em disco (sem segurar o lock das buscas durante a escrita)
+        self._lock_gravacao = threading.Lock()
+        self._alteracoes = 0
+        self._alteracoes_salvas = 0
+        self._ultimo_salvamento = time.monotonic()
+        self.acertos = 0
+        self.acertos_semanticos = 0
+        self.faltas = 0
+        self._carregar()
+
+    @staticmethod
+    def calcular_escopo(servico: str, id_modelo: str, template: str, ids_chunks: List[str]) -> str:
+        return _hash(servico, id_modelo or "", _hash(template), *ids_chunks)
+
+    def _expirada(self, entrada: dict) -> bool:
+        return (time.time() - entrada["criada_em"]) > self.ttl_segundos
+
+    def _carregar(self):
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                entradas = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for chave, entrada in entradas:
+            if not self._expirada(entrada):
+                self._entradas[chave] = entrada
+
+    def salvar(self) -> bool:
+        """
+        Grava o cache se houver mudanças desde o último salvamento. Uma falha é registrada e
+        não propagada: a resposta já foi gerada e o cache em memória continua válido.
+        """
+        with self._lock_gravacao:
+            with self._lock:
+                # Entradas vencidas que ninguém buscou de novo saem da memória e do arquivo aqui
+                expiradas = [chave for chave, entrada in self._entradas.items() if self._expirada(entrada)]
+                for chave in expiradas:
+                    del self._entradas[chave]
+                self._alteracoes += bool(expiradas)
+                alteracoes = self._alteracoes
+                if alteracoes == self._alteracoes_salvas:
+                    return True
+                entradas = list(self._entradas.items())
+            pasta = os.path.dirname(self.caminho) or "."
+            caminho_temporario = None
+            try:
+                os.makedirs(pasta, exist_ok=True)
+                # Nome único na mesma pasta: o os.replace continua atômico mesmo entre processos
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=pasta, suffix=".tmp",
+                                                 prefix=os.path.basename(self.caminho) + ".", delete=False) as f:
+                    caminho_temporario = f.name
+                    json.dump(entradas, f, ensure_ascii=False)
+                os.replace(caminho_temporario, self.caminho)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️ AVISO: Não foi possível salvar o cache em '{self.caminho}': {e}")
+                if caminho_temporario and os.path.exists(caminho_temporario):
+                    os.remove(caminho_temporario)
+                return False
+            self._alteracoes_salvas = alteracoes
+            self._ultimo_salvamento = time.monotonic()
+            return True
+
+    def talvez_salvar(self) -> bool:
+        """Salva apenas se o intervalo desde o último salvamento já passou (chamado a cada resposta)."""
+        if time.monotonic() - self._ultimo_salvamento < self.intervalo_salvamento:
+            return False
+        return self.salvar()
+
+    def buscar(self, escopo: str, pergunta: str, vetor_pergunta: Optional[List[float]] = None) -> Optional[str]:
+        chave = _hash(escopo, normalizar_pergunta(pergunta))
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada and not self._expirada(entrada):
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada["resposta"]
+            if entrada:
+                del self._entradas[chave]
+
+            if self.limiar_similaridade is not None and vetor_pergunta is not None:
+                consulta = np.asarray(vetor_pergunta, dtype=np.float32)
+                consulta /= (np.linalg.norm(consulta) or 1.0)
+                melhor_chave, melhor_similaridade = None, self.limiar_similaridade
+                for chave_candidata, candidata in self._entradas.items():
+                    if candidata["escopo"] != escopo or candidata.get("vetor") is None or self._expirada(candidata):
+                        continue
+                    similaridade = float(np.dot(consulta, np.asarray(candidata["vetor"], dtype=np.float32)))
+                    if similaridade >= melhor_similaridade:
+                        melhor_chave, melhor_similaridade = chave_candidata, similaridade
+                if melhor_chave:
+                    self._entradas.move_to_end(melhor_chave)
+                    self.acertos_semanticos += 1
+                    return self._entradas[melhor_chave]["resposta"]
+
+            self.faltas += 1
+            return None
+
+    def armazenar(self, escopo: str, pergunta: str, resposta: str, vetor_pergunta: Optional[List[float]] = None):
+        vetor = None
+        if vetor_pergunta is not None:
+            vetor_np = np.asarray(vetor_pergunta, dtype=np.float32)
+            vetor = (vetor_np / (np.linalg.norm(vetor_np) or 1.0)).tolist()
+        chave = _hash(escopo, normalizar_pergunta(pergunta))
+        with self._lock:
+            self._entradas[chave] = {"escopo": escopo, "resposta": resposta, "vetor": vetor, "criada_em": time.time()}
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+            self._alteracoes += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "acertos_semanticos": self.acertos_semanticos,
+                "faltas": self.faltas
+            }
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+PASTA_CHECKPOINTS = "checkpoints_indices"
+ARQUIVO_ESTADO = "estado.json"
+VERSAO_CHECKPOINT = 1
+INTERVALO_CHECKPOINT_CHUNKS = 5000
+INTERVALO_CHECKPOINT_SEGUNDOS = 300.0
+
+
+class CheckpointIndexacao:
+    """
+    Checkpoints de uma criação de índice em andamento, em `checkpoints_indices/<contexto>/`.
+
+    Cada checkpoint grava só o que mudou desde o anterior, como um segmento (vetores em
+    .npy, textos/metadados em .jsonl e os registros de manifesto das fontes concluídas em
+    .fontes.json), e em seguida o `estado.json` com a lista de segmentos. Gravar o estado
+    por último faz dele o ponto de confirmação: um segmento órfão de uma interrupção no
+    meio da gravação é ignorado. O custo total é linear no número de chunks, em vez de
+    regravar o índice inteiro a cada checkpoint.
+    """
+
+    def __init__(self, id_contexto: str, nome_modelo: str, intervalo_chunks: int = INTERVALO_CHECKPOINT_CHUNKS,
+                 intervalo_segundos: float = INTERVALO_CHECKPOINT_SEGUNDOS, pasta_base: str = PASTA_CHECKPOINTS):
+        self.pasta = os.path.join(pasta_base, id_contexto)
+        self.nome_modelo = nome_modelo
+        self.intervalo_chunks = intervalo_chunks
+        self.intervalo_segundos = intervalo_segundos
+        self.segmentos: List[str] = []
+        self._pendentes: List[Tuple[str, str, dict, np.ndarray]] = []
+        self._fontes_pendentes: Dict[str, dict] = {}
+        self._ultimo = time.monotonic()
+
+    def _caminho(self, nome: str) -> str:
+        return os.path.join(self.pasta, nome)
+
+    def existe(self) -> bool:
+        return os.path.exists(self._caminho(ARQUIVO_ESTADO))
+
+    def carregar(self) -> Optional[Dict[str, dict]]:
+        """
+        Lê o estado confirmado e devolve os registros de manifesto das fontes concluídas; os
+        chunks são lidos depois, em fluxo, com `iterar_segmentos`. Retorna None se não houver
+        checkpoint compatível.
+        """
+        try:
+            with open(self._caminho(ARQUIVO_ESTADO), 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if estado.get("versao") != VERSAO_CHECKPOINT or estado.get("modelo_embeddings") != self.nome_modelo:
+            return None
+        fontes = {}
+        for nome in estado["segmentos"]:
+            with open(self._caminho(f"{nome}.fontes.json"), 'r', encoding='utf-8') as f:
+                fontes.update(json.load(f))
+        self.segmentos = list(estado["segmentos"])
+        self._ultimo = time.monotonic()
+        return fontes
+
+    def iterar_segmentos(self) -> Iterator[Tuple[List[str], List[str], List[dict], np.ndarray]]:
+        """Entrega os chunks já embutidos (ids, textos, metadados, vetores), um segmento confirmado por vez."""
+        for nome in self.segmentos:
+            ids, textos, metadados = [], [], []
+            with open(self._caminho(f"{nome}.jsonl"), 'r', encoding='utf-8') as f:
+                for linha in f:
+                    registro = json.loads(linha)
+                    ids.append(registro["id"])
+                    textos.append(registro["texto"])
+                    metadados.append(registro["metadados"])
+            if ids:
+                # Segmentos só de fontes concluídas não têm vetores (e um .npy vazio não pode ser mapeado)
+                yield ids, textos, metadados, np.load(self._caminho(f"{nome}.npy"), mmap_mode='r')
+
+    def acumular(self, ids: List[str], textos: List[str], metadados: List[dict], vetores: List[List[float]]):
+        # Guardados como float32 (e não listas de floats do Python) até o próximo checkpoint
+        self._pendentes.extend(zip(ids, textos, metadados, np.asarray(vetores, dtype=np.float32)))
+
+    def concluir_fonte(self, fonte: str, registro: dict):
+        """Registra uma fonte cujos chunks já foram todos acumulados (entra no próximo segmento)."""
+        self._fontes_pendentes[fonte] = registro
+
+    def talvez_salvar(self) -> bool:
+        """Grava um checkpoint se o intervalo (em chunks ou em segundos) foi atingido."""
+        pendente = self._pendentes or self._fontes_pendentes
+        if len(self._pendentes) >= self.intervalo_chunks or (
+                pendente and time.monotonic() - self._ultimo >= self.intervalo_segundos):
+            self.salvar()
+            return True
+        return False
+
+    def salvar(self):
+        if not self._pendentes and not self._fontes_pendentes:
+            return
+        os.makedirs(self.pasta, exist_ok=True)
+        nome = f"segmento_{len(self.segmentos) + 1:05d}"
+        np.save(self._caminho(f"{nome}.npy"), np.asarray([v for _, _, _, v in self._pendentes], dtype=np.float32))
+        with open(self._caminho(f"{nome}.jsonl"), 'w', encoding='utf-8') as f:
+            for id_chunk, texto, metadados, _ in self._pendentes:
+                f.write(json.dumps({"id": id_chunk, "texto": texto, "metadados": metadados}, ensure_ascii=False))
+                f.write("\n")
+        with open(self._caminho(f"{nome}.fontes.json"), 'w', encoding='utf-8') as f:
+            json.dump(self._fontes_pendentes, f, ensure_ascii=False)
+        self.segmentos.append(nome)
+        self._pendentes, self._fontes_pendentes = [], {}
+        estado = {"versao": VERSAO_CHECKPOINT, "modelo_embeddings": self.nome_modelo, "segmentos": self.segmentos}
+        caminho = self._caminho(ARQUIVO_ESTADO)
+        with open(caminho + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+        self._ultimo = time.monotonic()
+
+    def descartar(self):
+        self._pendentes, self._fontes_pendentes = [], {}
+        self.segmentos = []
+        shutil.rmtree(self.pasta, ignore_errors=True)
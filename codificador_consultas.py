@@ -0,0 +1,103 @@
+import asyncio
+from collections import OrderedDict
+from typing import List, Optional
+
+CAPACIDADE_CACHE_PADRAO = 2048
+JANELA_MS_PADRAO = 5.0
+TAMANHO_MAXIMO_LOTE_PADRAO = 32
+
+
+class CodificadorConsultas:
+    """
+    Embeddings de perguntas para o gateway.
+
+    - Um cache LRU devolve na hora o vetor de perguntas já vistas.
+    - As perguntas que faltam entram em uma fila; um único trabalhador espera até
+      `janela_ms` por outras perguntas simultâneas e codifica todas em um só lote, em vez
+      de um forward por requisição. Enquanto um lote está sendo codificado, as novas
+      perguntas se acumulam para o próximo.
+    - Perguntas idênticas em voo ao mesmo tempo compartilham o mesmo resultado.
+    """
+
+    def __init__(self, embeddings, capacidade_cache: int = CAPACIDADE_CACHE_PADRAO,
+                 janela_ms: float = JANELA_MS_PADRAO, tamanho_maximo_lote: int = TAMANHO_MAXIMO_LOTE_PADRAO):
+        self.embeddings = embeddings
+        self.capacidade_cache = capacidade_cache
+        self.janela_segundos = janela_ms / 1000.0
+        self.tamanho_maximo_lote = tamanho_maximo_lote
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._em_voo = {}
+        self._fila: Optional[asyncio.Queue] = None
+        self._trabalhador: Optional[asyncio.Task] = None
+        self.acertos = 0
+        self.faltas = 0
+        self.lotes = 0
+        self.consultas_codificadas = 0
+
+    def _iniciar(self):
+        # Criados sob demanda, dentro do loop de eventos do servidor
+        if self._trabalhador is None or self._trabalhador.done():
+            self._fila = asyncio.Queue()
+            self._trabalhador = asyncio.get_running_loop().create_task(self._trabalhar())
+
+    async def codificar(self, texto: str) -> List[float]:
+        chave = texto.strip()
+        vetor = self._cache.get(chave)
+        if vetor is not None:
+            self._cache.move_to_end(chave)
+            self.acertos += 1
+            return vetor
+        self.faltas += 1
+        futuro = self._em_voo.get(chave)
+        if futuro is None:
+            self._iniciar()
+            futuro = asyncio.get_running_loop().create_future()
+            self._em_voo[chave] = futuro
+            self._fila.put_nowait(chave)
+        # shield: se esta requisição for cancelada, as demais que esperam a mesma pergunta não são afetadas
+        return await asyncio.shield(futuro)
+
+    async def _coletar_lote(self) -> List[str]:
+        lote = [await self._fila.get()]
+        prazo = asyncio.get_running_loop().time() + self.janela_segundos
+        while len(lote) < self.tamanho_maximo_lote:
+            restante = prazo - asyncio.get_running_loop().time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._fila.get(), timeout=restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _trabalhar(self):
+        while True:
+            lote = await self._coletar_lote()
+            try:
+                vetores = await asyncio.to_thread(self.embeddings.embed_queries, lote)
+            except Exception as e:
+                for chave in lote:
+                    futuro = self._em_voo.pop(chave, None)
+                    if futuro and not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            self.lotes += 1
+            self.consultas_codificadas += len(lote)
+            for chave, vetor in zip(lote, vetores):
+                self._cache[chave] = vetor
+                self._cache.move_to_end(chave)
+                futuro = self._em_voo.pop(chave, None)
+                if futuro and not futuro.done():
+                    futuro.set_result(vetor)
+            while len(self._cache) > self.capacidade_cache:
+                self._cache.popitem(last=False)
+
+    def status(self) -> dict:
+        return {
+            "entradas": len(self._cache),
+            "capacidade": self.capacidade_cache,
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "lotes": self.lotes,
+            "tamanho_medio_lote": round(self.consultas_codificadas / self.lotes, 2) if self.lotes else 0.0
+        }
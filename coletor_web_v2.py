@@ -11,7 +11,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
-# --- CONFIGURAÇÃO E GERENCIAMENTO DO DRIVER (sem alterações) ---
+# Cache HTTP em disco compartilhado com o gerenciador_indices.py
+from cache_http import CacheHTTP
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+# Nome sob o qual o texto extraído por este coletor é guardado no cache HTTP
+EXTRATOR_CACHE = "selenium"
+
+# --- CONFIGURAÇÃO E GERENCIAMENTO DO DRIVER ---
 
 def setup_driver() -> uc.Chrome:
     print("-> Configurando o navegador em modo 'Stealth'...")
@@ -19,9 +26,7 @@ def setup_driver() -> uc.Chrome:
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-    )
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
     
     try:
         driver = uc.Chrome(options=chrome_options, use_subprocess=True)
@@ -140,21 +145,37 @@ def coletar_noticias_web() -> None:
         return
 
     all_articles_content = ""
+    cache = CacheHTTP()
+    driver = None
 
-    with setup_driver() as driver:
+    try:
         for i, url in enumerate(urls):
             if not url.startswith(('http://', 'https://')):
                 print(f"\n⚠️ Ignorando entrada inválida: '{url}'")
                 continue
 
             print(f"\n--- Processando URL {i+1}/{len(urls)} ---")
-            
-            html_content = get_page_content_selenium(driver, url)
-            cleaned_text = extract_text_from_html(html_content)
-            
-            if not cleaned_text or len(cleaned_text) < 200:
-                html_content_after_js = attempt_paywall_removal(driver)
-                cleaned_text = extract_text_from_html(html_content_after_js)
+
+            # Páginas ainda válidas no cache (TTL ou resposta 304) não são renderizadas de novo no Chrome
+            entrada = cache.revalidar(url, {"User-Agent": USER_AGENT})
+            cleaned_text = entrada["textos"].get(EXTRATOR_CACHE) if entrada else None
+            if cleaned_text:
+                print("♻️ Página inalterada, texto reaproveitado do cache HTTP.")
+            else:
+                # O navegador só é iniciado quando alguma URL realmente precisa ser renderizada
+                if driver is None:
+                    driver = setup_driver()
+                html_content = get_page_content_selenium(driver, url)
+                cleaned_text = extract_text_from_html(html_content)
+                
+                if not cleaned_text or len(cleaned_text) < 200:
+                    html_content = attempt_paywall_removal(driver)
+                    cleaned_text = extract_text_from_html(html_content)
+
+                if cleaned_text:
+                    etag, last_modified = cache.consultar_validadores(url, {"User-Agent": USER_AGENT})
+                    cache.registrar(url, html_content, etag, last_modified)
+                    cache.salvar_texto(url, EXTRATOR_CACHE, cleaned_text)
 
             if cleaned_text:
                 print("✅ Texto extraído com sucesso.")
@@ -166,6 +187,9 @@ def coletar_noticias_web() -> None:
                 all_articles_content += cleaned_text + "\n\n---\n\n" # Deixamos um espaçamento maior apenas no separador de artigos.
             else:
                 print("❌ Falha final: Não foi possível extrair texto significativo desta URL.")
+    finally:
+        if driver is not None:
+            driver.quit()
 
     save_content_to_file(all_articles_content)
 
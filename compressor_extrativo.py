@@ -0,0 +1,76 @@
+import re
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ORCAMENTO_TOKENS_PADRAO = 800
+LIMIAR_DUPLICATA_PADRAO = 0.9
+SCORE_MINIMO_PADRAO = 0.15
+RESPOSTA_CONTEXTO_INSUFICIENTE = "CONTEXTO_INSUFICIENTE"
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira (~4 caracteres por token) usada quando não há tokenizer do modelo."""
+    return max(1, len(texto) // 4)
+
+
+def dividir_sentencas(texto: str) -> List[str]:
+    """
+    Divide o texto em sentenças sem depender do NLTK. Blocos de código (```...```)
+    são mantidos inteiros para que comandos não sejam cortados ao meio.
+    """
+    sentencas = []
+    for parte in re.split(r'(```.*?```)', texto, flags=re.DOTALL):
+        if parte.startswith("```"):
+            sentencas.append(parte.strip())
+            continue
+        for linha in parte.split("\n"):
+            sentencas.extend(s.strip() for s in re.split(r'(?<=[.!?])\s+', linha) if s.strip())
+    return sentencas
+
+
+def _normalizar_linhas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def comprimir_contexto(contexto: str, pergunta: str, embeddings: Embeddings,
+                       orcamento_tokens: int = ORCAMENTO_TOKENS_PADRAO,
+                       limiar_duplicata: float = LIMIAR_DUPLICATA_PADRAO,
+                       score_minimo: float = SCORE_MINIMO_PADRAO,
+                       contar_tokens: Optional[Callable[[str], int]] = None,
+                       vetor_pergunta: Optional[List[float]] = None) -> str:
+    """
+    Alternativa sem LLM ao sumarizador: pontua cada sentença pela similaridade de cosseno
+    com a pergunta (usando o modelo de embeddings já carregado), descarta quase-duplicatas
+    e mantém as melhores até o orçamento de tokens, na ordem original do texto.
+    """
+    contar_tokens = contar_tokens or estimar_tokens
+    sentencas = list(dict.fromkeys(dividir_sentencas(contexto)))
+    if not sentencas:
+        return RESPOSTA_CONTEXTO_INSUFICIENTE
+
+    vetores = _normalizar_linhas(np.asarray(embeddings.embed_documents(sentencas), dtype=np.float32))
+    if vetor_pergunta is None:
+        vetor_pergunta = embeddings.embed_query(pergunta)
+    consulta = _normalizar_linhas(np.asarray([vetor_pergunta], dtype=np.float32))[0]
+    scores = vetores @ consulta
+
+    selecionadas: List[int] = []
+    tokens_usados = 0
+    for indice in np.argsort(-scores):
+        if scores[indice] < score_minimo:
+            break
+        if selecionadas and float(np.max(vetores[selecionadas] @ vetores[indice])) >= limiar_duplicata:
+            continue
+        custo = contar_tokens(sentencas[indice])
+        if tokens_usados + custo > orcamento_tokens:
+            continue
+        selecionadas.append(int(indice))
+        tokens_usados += custo
+
+    if not selecionadas:
+        return RESPOSTA_CONTEXTO_INSUFICIENTE
+    return "\n".join(sentencas[i] for i in sorted(selecionadas))
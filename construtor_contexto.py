@@ -0,0 +1,160 @@
+import re
+import math
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from compressor_extrativo import estimar_tokens
+
+# Tokenizer opcional para modelos de nuvem; sem ele usamos a estimativa por caracteres
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+LIMIAR_DUPLICATA_PADRAO = 0.8
+TAMANHO_SHINGLE = 5
+# Tamanho aproximado (em caracteres) dos pedaços quando um contexto longo chega como texto único
+TAMANHO_PEDACO_PADRAO = 1500
+SEPARADOR_CHUNKS = "\n\n"
+# Margens quando a contagem não vem do tokenizer do próprio modelo: a estimativa por caracteres
+# supõe ~4 caracteres por token, e textos em português ou com código chegam a ~3
+FATOR_MARGEM_ESTIMATIVA = 1.35
+FATOR_MARGEM_OUTRO_TOKENIZADOR = 1.15
+
+
+def _contador_tiktoken(codificador) -> Callable[[str], int]:
+    return lambda texto: len(codificador.encode(texto, disallowed_special=()))
+
+
+def _com_margem(contar: Callable[[str], int], fator: float) -> Callable[[str], int]:
+    return lambda texto: math.ceil(contar(texto) * fator)
+
+
+def _contador_por_nome(tokenizador: str) -> Optional[Callable[[str], int]]:
+    """Codificação do tiktoken (ex: "o200k_base") ou tokenizer do Hugging Face (ex: "Qwen/Qwen3-32B")."""
+    try:
+        if tiktoken is not None and tokenizador in tiktoken.list_encoding_names():
+            return _contador_tiktoken(tiktoken.get_encoding(tokenizador))
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizador)
+        return lambda texto: len(tokenizer.encode(texto, add_special_tokens=False))
+    except Exception as e:
+        print(f"⚠️ AVISO: Não foi possível carregar o tokenizador '{tokenizador}' ({e}). Usando uma estimativa com margem.")
+        return None
+
+
+def _contador_tiktoken_do_modelo(modelo_nuvem: str) -> Optional[Callable[[str], int]]:
+    """Codificação do tiktoken para o modelo (ex: "openai/gpt-4o-mini"), se ele for conhecido."""
+    if tiktoken is None:
+        return None
+    nome = modelo_nuvem.split("/")[-1].split(":")[0]
+    try:
+        return _contador_tiktoken(tiktoken.encoding_for_model(nome))
+    except KeyError:
+        return None
+    except Exception as e:
+        print(f"⚠️ AVISO: Não foi possível carregar a codificação do tiktoken para '{modelo_nuvem}' ({e}).")
+        return None
+
+
+def criar_contador_tokens(modelo_llama=None, modelo_nuvem: Optional[str] = None,
+                          tokenizador: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Retorna uma função que conta tokens com o tokenizer do modelo de destino: o do próprio
+    GGUF para modelos locais; para a nuvem, o `tokenizador` configurado no serviço (codificação
+    do tiktoken ou tokenizer do Hugging Face) ou a codificação que o tiktoken associa ao
+    modelo. Sem o tokenizer do modelo, a contagem é aproximada (cl100k_base, ou ~4 caracteres
+    por token sem o tiktoken) e multiplicada por uma margem, para que um tokenizer mais denso
+    não estoure a janela.
+    """
+    if modelo_llama is not None:
+        return lambda texto: len(modelo_llama.tokenize(texto.encode('utf-8'), add_bos=False))
+    contador = _contador_por_nome(tokenizador) if tokenizador else None
+    if contador is None and modelo_nuvem:
+        contador = _contador_tiktoken_do_modelo(modelo_nuvem)
+    if contador is not None:
+        return contador
+    if tiktoken is not None:
+        try:
+            return _com_margem(_contador_tiktoken(tiktoken.get_encoding("cl100k_base")), FATOR_MARGEM_OUTRO_TOKENIZADOR)
+        except Exception:
+            pass
+    return _com_margem(estimar_tokens, FATOR_MARGEM_ESTIMATIVA)
+
+
+def dividir_em_pedacos(texto: str, tamanho_alvo: int = TAMANHO_PEDACO_PADRAO) -> List[str]:
+    """Agrupa parágrafos em pedaços de ~`tamanho_alvo` caracteres (parágrafos enormes são cortados)."""
+    pedacos, atual = [], ""
+    for paragrafo in re.split(r'\n\s*\n', texto):
+        paragrafo = paragrafo.strip()
+        if not paragrafo:
+            continue
+        while len(paragrafo) > tamanho_alvo * 2:
+            pedacos.append(paragrafo[:tamanho_alvo])
+            paragrafo = paragrafo[tamanho_alvo:]
+        if atual and len(atual) + len(paragrafo) > tamanho_alvo:
+            pedacos.append(atual)
+            atual = ""
+        atual = f"{atual}\n\n{paragrafo}" if atual else paragrafo
+    if atual:
+        pedacos.append(atual)
+    return pedacos
+
+
+def _shingles(texto: str) -> set:
+    palavras = re.findall(r'\w+', texto.lower())
+    if len(palavras) < TAMANHO_SHINGLE:
+        return {" ".join(palavras)}
+    return {" ".join(palavras[i:i + TAMANHO_SHINGLE]) for i in range(len(palavras) - TAMANHO_SHINGLE + 1)}
+
+
+def ranquear_por_similaridade(chunks: Sequence[str], pergunta: str, embeddings: Embeddings,
+                              vetor_pergunta: Optional[List[float]] = None) -> List[int]:
+    """Ordena os chunks (índices) pela similaridade de cosseno com a pergunta."""
+    vetores = np.asarray(embeddings.embed_documents(list(chunks)), dtype=np.float32)
+    consulta = np.asarray(vetor_pergunta if vetor_pergunta is not None else embeddings.embed_query(pergunta), dtype=np.float32)
+    normas = np.linalg.norm(vetores, axis=1) * (np.linalg.norm(consulta) or 1.0)
+    normas[normas == 0] = 1.0
+    return [int(i) for i in np.argsort(-(vetores @ consulta) / normas)]
+
+
+def construir_contexto(chunks: Sequence[str], orcamento_tokens: int, contar_tokens: Callable[[str], int],
+                       ordem: Optional[Sequence[int]] = None,
+                       limiar_duplicata: float = LIMIAR_DUPLICATA_PADRAO) -> dict:
+    """
+    Monta o contexto percorrendo os chunks em ordem de relevância (`ordem`, ou a ordem
+    recebida), descartando quase-duplicatas (Jaccard de shingles de palavras) e parando
+    de incluir chunks quando o orçamento de tokens acaba.
+    """
+    ordem = list(ordem) if ordem is not None else list(range(len(chunks)))
+    custo_separador = contar_tokens(SEPARADOR_CHUNKS)
+    selecionados, shingles_selecionados = [], []
+    tokens_usados = 0
+    descartados_duplicata, descartados_orcamento = 0, 0
+
+    for indice in ordem:
+        chunk = chunks[indice].strip()
+        if not chunk:
+            continue
+        shingles = _shingles(chunk)
+        if any(len(shingles & outro) / (len(shingles | outro) or 1) >= limiar_duplicata for outro in shingles_selecionados):
+            descartados_duplicata += 1
+            continue
+        custo = contar_tokens(chunk) + (custo_separador if selecionados else 0)
+        if tokens_usados + custo > orcamento_tokens:
+            descartados_orcamento += 1
+            continue
+        selecionados.append(chunk)
+        shingles_selecionados.append(shingles)
+        tokens_usados += custo
+
+    return {
+        "contexto": SEPARADOR_CHUNKS.join(selecionados),
+        "tokens_contexto": tokens_usados,
+        "orcamento_tokens": orcamento_tokens,
+        "chunks_usados": len(selecionados),
+        "chunks_descartados_duplicata": descartados_duplicata,
+        "chunks_descartados_orcamento": descartados_orcamento
+    }
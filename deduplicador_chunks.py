@@ -0,0 +1,132 @@
+import re
+import zlib
+import hashlib
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Mesmos shingles (5 palavras) e limiar de Jaccard usados na montagem do contexto
+from construtor_contexto import TAMANHO_SHINGLE, LIMIAR_DUPLICATA_PADRAO
+
+NUM_PERMUTACOES = 64
+NUM_BANDAS = 16                 # 16 bandas x 4 linhas: candidatos a partir de Jaccard ~0.5
+PRIMO_HASH = 4294967311         # Primo logo acima de 2^32 (os shingles são hasheados com crc32)
+SEMENTE_PERMUTACOES = 1234
+
+MOTIVO_EXATA = "exata"
+MOTIVO_QUASE = "quase"
+
+
+def _normalizar(texto: str) -> str:
+    return " ".join(texto.lower().split())
+
+
+def _hashes_shingles(texto: str) -> np.ndarray:
+    palavras = re.findall(r'\w+', texto.lower())
+    if len(palavras) < TAMANHO_SHINGLE:
+        shingles = {" ".join(palavras)}
+    else:
+        shingles = {" ".join(palavras[i:i + TAMANHO_SHINGLE]) for i in range(len(palavras) - TAMANHO_SHINGLE + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class DeduplicadorChunks:
+    """
+    Descarta chunks repetidos durante a indexação: duplicatas exatas (hash do texto
+    normalizado) e quase-duplicatas por MinHash + LSH sobre shingles de palavras.
+
+    Cada chunk aceito é registrado pelo seu id. Um chunk novo só é comparado com os
+    candidatos que caem no mesmo balde de alguma banda da assinatura, e o Jaccard
+    estimado pelas assinaturas decide se ele é uma quase-duplicata. Assim o custo por
+    chunk não depende do tamanho do índice. `remover` tira um id do registro, para
+    que a atualização incremental não compare uma fonte com a sua própria versão antiga.
+    """
+
+    def __init__(self, limiar_jaccard: float = LIMIAR_DUPLICATA_PADRAO, num_permutacoes: int = NUM_PERMUTACOES,
+                 num_bandas: int = NUM_BANDAS):
+        if num_permutacoes % num_bandas != 0:
+            raise ValueError("O número de permutações precisa ser múltiplo do número de bandas.")
+        self.limiar_jaccard = limiar_jaccard
+        self.num_bandas = num_bandas
+        self.linhas_por_banda = num_permutacoes // num_bandas
+        gerador = np.random.default_rng(SEMENTE_PERMUTACOES)
+        # a < 2^31 e shingle < 2^32 mantêm a * x + b dentro de 64 bits
+        self._a = gerador.integers(1, 2 ** 31, size=num_permutacoes, dtype=np.uint64)
+        self._b = gerador.integers(0, 2 ** 32, size=num_permutacoes, dtype=np.uint64)
+        self._exatas: Dict[bytes, str] = {}
+        self._registros: Dict[str, Tuple[bytes, np.ndarray]] = {}
+        self._baldes = [defaultdict(set) for _ in range(num_bandas)]
+        self.descartados_exatos = 0
+        self.descartados_quase = 0
+
+    def _assinatura(self, texto: str) -> np.ndarray:
+        hashes = _hashes_shingles(texto)
+        if not len(hashes):
+            return np.zeros(len(self._a), dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) % PRIMO_HASH).min(axis=0)
+
+    def _chaves_bandas(self, assinatura: np.ndarray):
+        for banda in range(self.num_bandas):
+            inicio = banda * self.linhas_por_banda
+            yield banda, assinatura[inicio:inicio + self.linhas_por_banda].tobytes()
+
+    def verificar(self, id_chunk: str, texto: str) -> Optional[str]:
+        """
+        Retorna None e registra o chunk se ele for novo; caso contrário retorna o motivo
+        do descarte (MOTIVO_EXATA ou MOTIVO_QUASE) e não registra nada.
+        """
+        duplicata = self.encontrar_original(id_chunk, texto)
+        return duplicata[0] if duplicata else None
+
+    def encontrar_original(self, id_chunk: str, texto: str) -> Optional[Tuple[str, str]]:
+        """Como `verificar`, mas devolve (motivo, id do chunk registrado de que este é cópia)."""
+        digest = hashlib.sha1(_normalizar(texto).encode('utf-8')).digest()
+        if digest in self._exatas:
+            self.descartados_exatos += 1
+            return MOTIVO_EXATA, self._exatas[digest]
+        assinatura = self._assinatura(texto)
+        if self.limiar_jaccard is not None:
+            candidatos = set()
+            for banda, chave in self._chaves_bandas(assinatura):
+                candidatos.update(self._baldes[banda].get(chave, ()))
+            for candidato in sorted(candidatos):
+                if np.mean(self._registros[candidato][1] == assinatura) >= self.limiar_jaccard:
+                    self.descartados_quase += 1
+                    return MOTIVO_QUASE, candidato
+        self._exatas[digest] = id_chunk
+        self._registros[id_chunk] = (digest, assinatura)
+        for banda, chave in self._chaves_bandas(assinatura):
+            self._baldes[banda][chave].add(id_chunk)
+        return None
+
+    def registrar(self, id_chunk: str, texto: str):
+        """Registra um chunk que já está no índice, sem verificar se ele é duplicado."""
+        digest = hashlib.sha1(_normalizar(texto).encode('utf-8')).digest()
+        assinatura = self._assinatura(texto)
+        self._exatas.setdefault(digest, id_chunk)
+        self._registros[id_chunk] = (digest, assinatura)
+        for banda, chave in self._chaves_bandas(assinatura):
+            self._baldes[banda][chave].add(id_chunk)
+
+    def remover(self, id_chunk: str):
+        registro = self._registros.pop(id_chunk, None)
+        if registro is None:
+            return
+        digest, assinatura = registro
+        if self._exatas.get(digest) == id_chunk:
+            del self._exatas[digest]
+        for banda, chave in self._chaves_bandas(assinatura):
+            balde = self._baldes[banda].get(chave)
+            if balde is not None:
+                balde.discard(id_chunk)
+                if not balde:
+                    del self._baldes[banda][chave]
+
+    @property
+    def total_descartados(self) -> int:
+        return self.descartados_exatos + self.descartados_quase
+
+    def resumo(self) -> str:
+        return (f"{self.total_descartados} chunks duplicados removidos "
+                f"({self.descartados_exatos} exatos, {self.descartados_quase} quase-duplicatas)")
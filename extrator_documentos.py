@@ -0,0 +1,183 @@
+import io
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import docx
+import openpyxl
+
+PASTA_CACHE_EXTRACAO = "cache_extracao"
+ARQUIVO_INDICE_CACHE = "indice.json"
+# Incrementar quando a forma de extrair mudar, para invalidar os textos já em cache
+VERSAO_EXTRATOR = 1
+EXTENSOES_TEXTO = {".txt", ".json"}
+EXTENSOES_SUPORTADAS = EXTENSOES_TEXTO | {".pdf", ".docx", ".xlsx"}
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+
+# --- Extratores (executados nos processos de trabalho) ---
+
+def extrair_texto_de_pdf(caminho_arquivo: str) -> str:
+    """Extrai página a página, sem manter o documento inteiro em memória como lista de páginas."""
+    saida = io.StringIO()
+    with fitz.open(caminho_arquivo) as doc:
+        for numero_pagina in range(doc.page_count):
+            saida.write(doc.load_page(numero_pagina).get_text())
+    return saida.getvalue()
+
+def extrair_texto_de_docx(caminho_arquivo: str) -> str:
+    doc = docx.Document(caminho_arquivo)
+    return "\n".join(para.text for para in doc.paragraphs)
+
+def extrair_texto_de_xlsx(caminho_arquivo: str) -> str:
+    """Lê as linhas em modo read_only (streaming), sem carregar a planilha inteira na memória."""
+    workbook = openpyxl.load_workbook(caminho_arquivo, read_only=True, data_only=True)
+    try:
+        saida = io.StringIO()
+        for sheet in workbook.worksheets:
+            saida.write(f"--- Planilha: {sheet.title} ---\n\n")
+            for row in sheet.iter_rows(values_only=True):
+                saida.write("\t".join(str(cell) if cell is not None else "" for cell in row))
+                saida.write("\n")
+        return saida.getvalue()
+    finally:
+        # Em modo read_only o arquivo fica aberto até o close explícito
+        workbook.close()
+
+def extrair_texto_de_arquivo(caminho_arquivo: str) -> Tuple[str, Optional[str]]:
+    """Devolve (texto, erro). Os erros voltam como texto para serem exibidos pelo processo principal."""
+    extensao = os.path.splitext(caminho_arquivo)[1].lower()
+    try:
+        if extensao == ".pdf":
+            return extrair_texto_de_pdf(caminho_arquivo), None
+        if extensao == ".docx":
+            return extrair_texto_de_docx(caminho_arquivo), None
+        if extensao == ".xlsx":
+            return extrair_texto_de_xlsx(caminho_arquivo), None
+        with open(caminho_arquivo, 'r', encoding='utf-8') as f:
+            return f.read(), None
+    except Exception as e:
+        return "", f"ERRO ao ler {extensao.lstrip('.').upper()} {caminho_arquivo}: {e}"
+
+
+# --- Cache em disco ---
+
+def calcular_hash_arquivo(caminho_arquivo: str) -> str:
+    sha = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class CacheExtracao:
+    """
+    Textos extraídos, guardados por hash do conteúdo do arquivo (um .txt por hash).
+
+    Um índice caminho -> (tamanho, mtime, hash) evita recalcular o hash de arquivos que
+    não mudaram: se tamanho e mtime conferem, o hash anterior é reaproveitado sem ler o
+    arquivo. Arquivos alterados (ou copiados) têm o hash recalculado, e um conteúdo já
+    visto em outro caminho não é extraído de novo.
+    """
+
+    def __init__(self, pasta: str = PASTA_CACHE_EXTRACAO):
+        self.pasta = pasta
+        self.caminho_indice = os.path.join(pasta, ARQUIVO_INDICE_CACHE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.caminho_indice, 'r', encoding='utf-8') as f:
+                self._indice = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._indice = {}
+
+    def _caminho_texto(self, hash_conteudo: str) -> str:
+        return os.path.join(self.pasta, f"{hash_conteudo}.v{VERSAO_EXTRATOR}.txt")
+
+    def identificar(self, caminho_arquivo: str) -> str:
+        """Hash do conteúdo do arquivo, reaproveitado do índice quando tamanho e mtime não mudaram."""
+        caminho_absoluto = os.path.abspath(caminho_arquivo)
+        estado = os.stat(caminho_absoluto)
+        with self._lock:
+            registro = self._indice.get(caminho_absoluto)
+        if registro and registro["tamanho"] == estado.st_size and registro["mtime_ns"] == estado.st_mtime_ns:
+            return registro["hash"]
+        hash_conteudo = calcular_hash_arquivo(caminho_absoluto)
+        with self._lock:
+            self._indice[caminho_absoluto] = {"tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns, "hash": hash_conteudo}
+        return hash_conteudo
+
+    def buscar(self, hash_conteudo: str) -> Optional[str]:
+        try:
+            with open(self._caminho_texto(hash_conteudo), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def armazenar(self, hash_conteudo: str, texto: str):
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self._caminho_texto(hash_conteudo)
+        with open(caminho + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(texto)
+        os.replace(caminho + ".tmp", caminho)
+
+    def salvar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        with self._lock:
+            indice = dict(self._indice)
+        with open(self.caminho_indice + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(indice, f, ensure_ascii=False)
+        os.replace(self.caminho_indice + ".tmp", self.caminho_indice)
+
+
+# --- API principal ---
+
+def extrair_documentos(fontes: List[str], processos: int = 0, cache: Optional[CacheExtracao] = None) -> List[dict]:
+    """
+    Extrai o texto de uma lista de arquivos e devolve [{"nome", "caminho", "texto"}] na
+    ordem das fontes. Arquivos já extraídos vêm do cache; os demais são processados em
+    paralelo por um pool de processos (`processos = 0` usa todos os núcleos).
+    """
+    cache = cache or CacheExtracao()
+    textos, pendentes = {}, []
+
+    for fonte in fontes:
+        if not os.path.exists(fonte):
+            print(f"     ⚠️ AVISO: Arquivo não encontrado, será ignorado: {fonte}")
+            continue
+        extensao = os.path.splitext(fonte)[1].lower()
+        if extensao not in EXTENSOES_SUPORTADAS:
+            print(f"     ⚠️ AVISO: Tipo de arquivo não suportado, será ignorado: {extensao}")
+            continue
+        hash_conteudo = cache.identificar(fonte)
+        texto = cache.buscar(hash_conteudo)
+        if texto is not None:
+            print(f"   - {fonte} (cache)")
+            textos[fonte] = texto
+        else:
+            pendentes.append((fonte, hash_conteudo))
+
+    if pendentes:
+        max_processos = processos if processos > 0 else (os.cpu_count() or 1)
+        max_processos = min(max_processos, len(pendentes))
+        print(f"   -> Extraindo {len(pendentes)} arquivo(s) com {max_processos} processo(s)...")
+        caminhos = [fonte for fonte, _ in pendentes]
+        if max_processos > 1:
+            with ProcessPoolExecutor(max_workers=max_processos) as executor:
+                resultados = list(executor.map(extrair_texto_de_arquivo, caminhos))
+        else:
+            resultados = [extrair_texto_de_arquivo(caminho) for caminho in caminhos]
+        for (fonte, hash_conteudo), (texto, erro) in zip(pendentes, resultados):
+            if erro:
+                print(f"     ❌ {erro}")
+                continue
+            print(f"   - {fonte} (extraído)")
+            cache.armazenar(hash_conteudo, texto)
+            textos[fonte] = texto
+    cache.salvar()
+
+    return [{"nome": os.path.basename(fonte), "caminho": fonte, "texto": textos[fonte]}
+            for fonte in fontes if textos.get(fonte)]
@@ -3,129 +3,207 @@ import json
 import shutil
 import argparse
 import re # Importado para expressões regulares
-import nltk # Importado para tokenização de sentenças
-from typing import List
+import hashlib
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 # Dependências Langchain
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
+# Motor de embeddings em lotes (com pool multiprocesso opcional) e cache em disco compartilhado entre contextos
+from motor_embeddings import MotorEmbeddings, TAMANHO_LOTE_PADRAO, MINIMO_TEXTOS_MULTIPROCESSO
+from cache_embeddings import EmbeddingsComCache
+
 # Dependência para extração de conteúdo web
 from newspaper import Article, Config
 
+# Cache HTTP em disco compartilhado com o coletor_web_v2.py
+from cache_http import CacheHTTP
+
+# Pasta dos índices e modelo de embeddings compartilhados com o servidor gateway
+from repositorio_indices import PASTA_BASE_INDICES, NOME_MODELO_EMBEDDINGS
+
+# Versões do índice publicadas atomicamente (o gateway as recarrega sem reiniciar)
+from repositorio_indices import resolver_pasta_indice, nova_pasta_versao, publicar_versao
+
+# Formato de armazenamento alternativo (mmap + SQLite, sem pickle)
+from armazenamento_indice import (GravadorIndiceMmap, IndiceMmap, remover_indice_mmap, carregar_faiss_de_mmap, detectar_formato,
+                                  ARQUIVO_INDICE_ANN, FORMATO_FAISS, FORMATO_MMAP)
+
+# Índice esparso (BM25) salvo ao lado do índice vetorial para a busca híbrida
+from indice_bm25 import IndiceBM25, ARQUIVO_BM25
+
+# Tipos de índice aproximado (IVF-Flat, IVF-PQ, HNSW) configuráveis por contexto
+from tipos_indice import normalizar_config_indice, avaliar_tipos_indice, TIPOS_INDICE
+
+# Motor de chunking único (sentenças por offset, IDs estáveis derivados do conteúdo)
+from motor_chunking import iterar_chunks, aplicar_formatacao_inline, transformar_fora_do_codigo
+
+# Checkpoints incrementais da criação de índices (retomada após interrupção)
+from checkpoint_indexacao import CheckpointIndexacao, INTERVALO_CHECKPOINT_CHUNKS
+
+# Descarte de chunks duplicados (hash exato + MinHash/LSH) antes do embedding
+from deduplicador_chunks import DeduplicadorChunks
+
+# Manifesto salvo ao lado dos arquivos do índice com o estado de cada fonte indexada.
+ARQUIVO_MANIFESTO = "manifesto.json"
+VERSAO_MANIFESTO = 1
+
+# Parâmetros da coleta concorrente de URLs
+MAX_TRABALHADORES_COLETA = 8      # Tamanho do pool de downloads simultâneos
+MAX_CONEXOES_POR_HOST = 2         # Limite de downloads simultâneos para um mesmo domínio
+TENTATIVAS_POR_URL = 3            # Número máximo de tentativas por URL
+ESPERA_BASE_RETENTATIVA = 1.0     # Segundos; dobra a cada nova tentativa (com jitter)
+ORCAMENTO_TEMPO_POR_FONTE = 60.0  # Tempo total (s) que uma URL pode consumir somando todas as tentativas
+MAX_DOCUMENTOS_PENDENTES = 2 * MAX_TRABALHADORES_COLETA  # Fontes carregadas (ou em coleta) à espera do chunking
+
+# Parâmetros do pipeline de ingestão (fontes -> chunks -> embeddings -> índice)
+CHUNKS_POR_LOTE = 256             # Chunks embutidos e adicionados ao índice de cada vez
+LOTES_DO_MODELO_POR_PROCESSO = 4  # Com o pool multiprocesso, o lote cresce para dar trabalho a todos os processos
+
+# Tamanho mínimo (em caracteres) de um chunk de texto
+TAMANHO_MINIMO_CHUNK = 250
+
 # --- INÍCIO DA NOVA SEÇÃO DE PROCESSAMENTO DE DOCUMENTOS ---
 
-# Garante que o 'punkt' do NLTK esteja disponível
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    print("-> Pacote 'punkt' do NLTK não encontrado. Baixando agora...")
-    nltk.download('punkt', quiet=True)
-    print("✅ Pacote 'punkt' pronto.")
+def _limpar_trecho(texto: str) -> str:
+    # Remove múltiplos espaços, deixando apenas um
+    texto = re.sub(r' +', ' ', texto)
+    # Remove múltiplas quebras de linha, deixando no máximo duas
+    texto = re.sub(r'\n{3,}', '\n\n', texto)
+    # Aplica formatação inline (` `) para elementos técnicos (do refatorador_rag.py)
+    return aplicar_formatacao_inline(texto)
 
 def aplicar_limpeza_e_formatacao(texto: str) -> str:
     """
     Combina as melhores técnicas de limpeza e formatação dos seus scripts.
     - Remove espaços excessivos e linhas em branco.
     - Aplica formatação inline para caminhos e variáveis.
+    Os blocos de código (```) são mantidos intactos.
     """
-    # Remove múltiplos espaços, deixando apenas um
-    texto = re.sub(r' +', ' ', texto)
-    # Remove múltiplas quebras de linha, deixando no máximo duas
-    texto = re.sub(r'\n{3,}', '\n\n', texto)
-    
-    # Aplica formatação inline (` `) para elementos técnicos (do refatorador_rag.py)
-    texto = re.sub(r'((?<=[\s,(])(/|./)[\w./\-_]+)', r'`\1`', texto) # Caminhos de arquivo
-    texto = re.sub(r'(\$\w+)', r'`\1`', texto) # Variáveis de ambiente
-    texto = re.sub(r'(\b[A-Z_]{3,}=[\w"\./\-_]+)', r'`\1`', texto) # Constantes
-    return texto.strip()
+    return transformar_fora_do_codigo(texto, _limpar_trecho).strip()
 
-def chunkificar_texto_aprimorado(texto_completo: str, metadados_origem: dict) -> List[Document]:
+def iterar_chunks_aprimorados(texto_completo: str, metadados_origem: dict, fonte: Optional[str] = None) -> Iterator[Document]:
     """
-    Função de chunking que une as lógicas do chunker_customizado.py e refatorador_rag.py.
-    - Protege blocos de código.
-    - Divide o texto em sentenças.
-    - Agrupa sentenças até atingir um tamanho mínimo.
-    - Retorna uma lista de `Document` do Langchain.
+    Limpa o texto e o divide com o motor_chunking.py: sentenças agrupadas até um tamanho
+    mínimo, fechando em pontuação final. Blocos de código ficam inteiros dentro do seu
+    chunk (não são mais repetidos como chunks isolados, o que duplicava cada bloco no
+    índice). Cada `Document` leva nos metadados o ID estável do chunk ('id_chunk') e a
+    sua posição ('inicio'/'fim') no texto já limpo.
     """
-    TAMANHO_MINIMO_CHUNK = 250 # Um bom ponto de partida
+    texto_processado = aplicar_limpeza_e_formatacao(texto_completo)
+    for chunk in iterar_chunks(texto_processado, tamanho_minimo=TAMANHO_MINIMO_CHUNK,
+                               namespace=fonte or metadados_origem.get("source", "")):
+        yield Document(page_content=chunk["texto"],
+                       metadata={**metadados_origem, "id_chunk": chunk["id"], "inicio": chunk["inicio"], "fim": chunk["fim"]})
 
-    # 1. Proteger blocos de código
-    blocos_codigo = re.findall(r'(```.*?```)', texto_completo, re.DOTALL)
-    placeholder_template = "__CODE_BLOCK_PLACEHOLDER_{}__"
-    for i, bloco in enumerate(blocos_codigo):
-        texto_completo = texto_completo.replace(bloco, placeholder_template.format(i), 1)
+def chunkificar_texto_aprimorado(texto_completo: str, metadados_origem: dict, fonte: Optional[str] = None) -> List[Document]:
+    return list(iterar_chunks_aprimorados(texto_completo, metadados_origem, fonte))
 
-    # 2. Limpeza do texto principal
-    texto_processado = aplicar_limpeza_e_formatacao(texto_completo)
-    
-    # 3. Chunking baseado em sentenças
-    sentencas = nltk.sent_tokenize(texto_processado, language='portuguese')
-    
-    chunks_texto = []
-    chunk_temporario = []
-    char_count_temporario = 0
-
-    for sentenca in sentencas:
-        chunk_temporario.append(sentenca)
-        char_count_temporario += len(sentenca)
-        # Se o chunk atingiu o tamanho mínimo E termina com pontuação final, nós o fechamos.
-        if char_count_temporario >= TAMANHO_MINIMO_CHUNK and sentenca.strip().endswith(('.', '!', '?')):
-            chunks_texto.append(" ".join(chunk_temporario).strip())
-            chunk_temporario = []
-            char_count_temporario = 0
-    
-    # Adiciona o último chunk se sobrou algum
-    if chunk_temporario:
-        chunks_texto.append(" ".join(chunk_temporario).strip())
-
-    # 4. Restaurar blocos de código e criar os Documentos finais
-    documentos_finais = []
-    for chunk in chunks_texto:
-        # Verifica se algum placeholder está no chunk e o substitui
-        for i, bloco in enumerate(blocos_codigo):
-            placeholder = placeholder_template.format(i)
-            if placeholder in chunk:
-                chunk = chunk.replace(placeholder, bloco)
-        documentos_finais.append(Document(page_content=chunk, metadata=metadados_origem.copy()))
-
-    # 5. Adicionar os blocos de código como Documentos individuais para garantir a indexação
-    for bloco in blocos_codigo:
-        documentos_finais.append(Document(page_content=bloco, metadata=metadados_origem.copy()))
-        
-    return documentos_finais
+def carregar_documento_bruto(fonte: str, config_coletor: Optional[Config] = None) -> Optional[Document]:
+    """Carrega uma única fonte (URL ou arquivo) sem dividi-la em chunks."""
+    if fonte.startswith("http://") or fonte.startswith("https://"):
+        return raspar_conteudo_url(fonte, config_coletor or configurar_coletor_web())
+    elif os.path.isfile(fonte):
+        try:
+            with open(fonte, 'r', encoding='utf-8') as f:
+                conteudo = f.read()
+                return Document(page_content=conteudo, metadata={"source": fonte})
+        except Exception as e:
+            print(f"  ❌ ERRO ao ler o arquivo {fonte}: {e}")
+    else:
+        print(f"  ⚠️ AVISO: A fonte '{fonte}' não é uma URL válida nem um arquivo encontrado. Será ignorada.")
+    return None
 
-def carregar_e_dividir_documentos(fontes: List[str]) -> List[Document]:
+def iterar_documentos_brutos(fontes: List[str]) -> Iterator[Tuple[str, Optional[Document]]]:
     """
-    Função totalmente refeita para carregar, pré-processar e dividir documentos
-    usando a lógica de chunking aprimorada.
+    Carrega as fontes em um pool de threads e entrega cada (fonte, documento) assim
+    que fica pronto, para que o chunking/embedding de uma fonte aconteça enquanto
+    as demais ainda estão sendo baixadas. No máximo MAX_DOCUMENTOS_PENDENTES fontes
+    ficam carregadas à espera do consumidor, então a memória não cresce com o número
+    de fontes quando a coleta é mais rápida que o embedding.
     """
-    todos_os_chunks = []
-    config_coletor = configurar_coletor_web()
+    limitador = LimitadorPorHost(MAX_CONEXOES_POR_HOST)
 
-    for fonte in fontes:
-        documento_bruto = None
+    def carregar(fonte: str) -> Optional[Document]:
         if fonte.startswith("http://") or fonte.startswith("https://"):
-            documento_bruto = raspar_conteudo_url(fonte, config_coletor)
-        elif os.path.isfile(fonte):
-            try:
-                with open(fonte, 'r', encoding='utf-8') as f:
-                    conteudo = f.read()
-                    documento_bruto = Document(page_content=conteudo, metadata={"source": fonte})
-            except Exception as e:
-                print(f"  ❌ ERRO ao ler o arquivo {fonte}: {e}")
-        else:
-            print(f"  ⚠️ AVISO: A fonte '{fonte}' não é uma URL válida nem um arquivo encontrado. Será ignorada.")
-
-        if documento_bruto:
-            # Em vez de usar um splitter genérico, aplicamos nossa lógica robusta
-            chunks_do_documento = chunkificar_texto_aprimorado(
-                documento_bruto.page_content, 
-                documento_bruto.metadata
-            )
-            todos_os_chunks.extend(chunks_do_documento)
-    
+            return raspar_com_retentativas(fonte, limitador)
+        return carregar_documento_bruto(fonte)
+
+    restantes = iter(fontes)
+    with ThreadPoolExecutor(max_workers=MAX_TRABALHADORES_COLETA) as executor:
+        futuros = {}
+        for fonte in islice(restantes, MAX_DOCUMENTOS_PENDENTES):
+            futuros[executor.submit(carregar, fonte)] = fonte
+        while futuros:
+            prontos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                fonte = futuros.pop(futuro)
+                # Uma nova fonte só entra no pool quando outra sai
+                for proxima in islice(restantes, 1):
+                    futuros[executor.submit(carregar, proxima)] = proxima
+                yield fonte, futuro.result()
+
+def iterar_lotes_de_chunks(fontes: List[str], tamanho_lote: int = CHUNKS_POR_LOTE,
+                           deduplicador: Optional[DeduplicadorChunks] = None) -> Iterator[dict]:
+    """
+    Pipeline de ingestão: fontes -> chunks -> lotes de até `tamanho_lote` chunks, sem
+    materializar a lista de todos os chunks. Cada lote traz {"chunks", "ids",
+    "fontes_concluidas"}, onde `fontes_concluidas` são (fonte, hash, ids, duplicados) das
+    fontes cujo último chunk já está neste lote ou em um anterior. Os chunks que o
+    `deduplicador` aponta como duplicatas são descartados antes do embedding, e
+    `duplicados` mapeia cada um deles para o id do chunk mantido no seu lugar.
+    """
+    chunks, ids, fontes_concluidas = [], [], []
+    for fonte, documento_bruto in iterar_documentos_brutos(fontes):
+        if not documento_bruto:
+            continue
+        hash_conteudo = calcular_hash_conteudo(documento_bruto.page_content)
+        ids_fonte, duplicados = [], {}
+        for chunk in iterar_chunks_aprimorados(documento_bruto.page_content, documento_bruto.metadata, fonte):
+            id_chunk = chunk.metadata["id_chunk"]
+            duplicata = deduplicador.encontrar_original(id_chunk, chunk.page_content) if deduplicador is not None else None
+            if duplicata:
+                duplicados[id_chunk] = duplicata[1]
+                continue
+            ids_fonte.append(id_chunk)
+            chunks.append(chunk)
+            ids.append(id_chunk)
+            if len(chunks) >= tamanho_lote:
+                yield {"chunks": chunks, "ids": ids, "fontes_concluidas": fontes_concluidas}
+                chunks, ids, fontes_concluidas = [], [], []
+        fontes_concluidas.append((fonte, hash_conteudo, ids_fonte, duplicados))
+    if chunks or fontes_concluidas:
+        yield {"chunks": chunks, "ids": ids, "fontes_concluidas": fontes_concluidas}
+
+def calcular_chunks_por_lote(embeddings_model) -> int:
+    """
+    Tamanho dos lotes do pipeline. Com o pool multiprocesso do MotorEmbeddings, um lote de
+    CHUNKS_POR_LOTE (menos os acertos do cache de embeddings) ficaria abaixo de
+    MINIMO_TEXTOS_MULTIPROCESSO e iria para um único processo; o lote então cresce para
+    alguns lotes do modelo por processo.
+    """
+    motor = getattr(embeddings_model, "embeddings_base", embeddings_model)
+    processos = getattr(motor, "processos", 1)
+    if processos <= 1:
+        return CHUNKS_POR_LOTE
+    return max(CHUNKS_POR_LOTE, 2 * MINIMO_TEXTOS_MULTIPROCESSO,
+               processos * motor.tamanho_lote * LOTES_DO_MODELO_POR_PROCESSO)
+
+def carregar_e_dividir_documentos(fontes: List[str]) -> List[Document]:
+    """Carrega e divide todas as fontes em memória (para a indexação use `iterar_lotes_de_chunks`)."""
+    todos_os_chunks = []
+    for lote in iterar_lotes_de_chunks(fontes):
+        todos_os_chunks.extend(lote["chunks"])
     print(f"\n  -> Total de fontes processadas: {len(fontes)}")
     print(f"  -> Total de chunks gerados após o processamento: {len(todos_os_chunks)}")
     return todos_os_chunks
@@ -133,7 +211,7 @@ def carregar_e_dividir_documentos(fontes: List[str]) -> List[Document]:
 # --- FIM DA NOVA SEÇÃO ---
 
 
-# --- SEÇÃO DE COLETA WEB (sem alterações) ---
+# --- SEÇÃO DE COLETA WEB ---
 
 def configurar_coletor_web() -> Config:
     config = Config()
@@ -141,51 +219,539 @@ def configurar_coletor_web() -> Config:
     config.request_timeout = 20
     return config
 
-def raspar_conteudo_url(url: str, config: Config) -> Document:
-    try:
-        print(f"      -> Processando URL: {url}")
+_cache_http: Optional[CacheHTTP] = None
+
+def obter_cache_http() -> CacheHTTP:
+    global _cache_http
+    if _cache_http is None:
+        _cache_http = CacheHTTP()
+    return _cache_http
+
+def extrair_documento_url(url: str, config: Config) -> Document:
+    """
+    Baixa e extrai o artigo de uma URL. Propaga exceções para permitir retentativas.
+    O HTML e o texto extraído ficam no cache HTTP: uma página fresca não gera requisição
+    e uma página revalidada (304) não é baixada nem parseada de novo.
+    """
+    cache = obter_cache_http()
+    entrada, origem = cache.buscar_html(url, {"User-Agent": config.browser_user_agent}, timeout=config.request_timeout)
+    extraido = entrada["textos"].get("newspaper")
+    if origem != 'rede' and extraido:
+        print(f"      -> Conteúdo reaproveitado do cache HTTP ({origem}): {url}")
+    else:
         article = Article(url, config=config)
-        article.download()
+        article.download(input_html=entrada["html"])
         article.parse()
-        texto_limpo = article.text
-        titulo = article.title
         data_publicacao = article.publish_date
-        page_content = f"Título: {titulo}\n\n{texto_limpo}"
-        metadata = {
-            "source": url,
-            "title": titulo,
+        extraido = {
+            "title": article.title,
+            "text": article.text,
             "publish_date": data_publicacao.strftime("%Y-%m-%d") if data_publicacao else "N/A"
         }
-        print(f"      -> Título encontrado: '{titulo}'")
-        return Document(page_content=page_content, metadata=metadata)
+        cache.salvar_texto(url, "newspaper", extraido)
+    page_content = f"Título: {extraido['title']}\n\n{extraido['text']}"
+    metadata = {
+        "source": url,
+        "title": extraido["title"],
+        "publish_date": extraido["publish_date"]
+    }
+    return Document(page_content=page_content, metadata=metadata)
+
+def raspar_conteudo_url(url: str, config: Config) -> Document:
+    try:
+        print(f"      -> Processando URL: {url}")
+        documento = extrair_documento_url(url, config)
+        print(f"      -> Título encontrado: '{documento.metadata['title']}'")
+        return documento
     except Exception as e:
         print(f"      ❌ ERRO ao processar a URL {url}: {e}")
         return None
 
-# --- SEÇÃO DE GERENCIAMENTO DE ÍNDICES (sem alterações) ---
+class LimitadorPorHost:
+    """Mantém um semáforo por domínio para não abrir conexões demais com o mesmo site."""
+
+    def __init__(self, maximo_por_host: int):
+        self.maximo_por_host = maximo_por_host
+        self._semaforos: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def semaforo(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.Semaphore(self.maximo_por_host)
+            return self._semaforos[host]
+
+def raspar_com_retentativas(url: str, limitador: LimitadorPorHost) -> Optional[Document]:
+    """
+    Versão de `raspar_conteudo_url` para o pool de coleta: respeita o limite por host,
+    refaz a tentativa com backoff exponencial e nunca ultrapassa o orçamento de tempo da fonte.
+    """
+    inicio = time.monotonic()
+    for tentativa in range(1, TENTATIVAS_POR_URL + 1):
+        restante = ORCAMENTO_TEMPO_POR_FONTE - (time.monotonic() - inicio)
+        if restante <= 1:
+            break
+        # A espera por uma vaga no host também consome o orçamento: uma fila de hosts lentos não segura a fonte
+        semaforo = limitador.semaforo(url)
+        if not semaforo.acquire(timeout=restante):
+            print(f"      ⚠️ Orçamento de tempo esgotado esperando uma vaga no host de {url}.")
+            break
+        try:
+            try:
+                config = configurar_coletor_web()
+                config.request_timeout = min(config.request_timeout,
+                                             max(1, ORCAMENTO_TEMPO_POR_FONTE - (time.monotonic() - inicio)))
+                print(f"      -> Processando URL (tentativa {tentativa}/{TENTATIVAS_POR_URL}): {url}")
+                documento = extrair_documento_url(url, config)
+            finally:
+                semaforo.release()
+            print(f"      -> Título encontrado: '{documento.metadata['title']}'")
+            return documento
+        except Exception as e:
+            print(f"      ⚠️ Falha na tentativa {tentativa} para {url}: {e}")
+            espera = ESPERA_BASE_RETENTATIVA * (2 ** (tentativa - 1)) * random.uniform(0.5, 1.5)
+            if tentativa < TENTATIVAS_POR_URL and (time.monotonic() - inicio) + espera < ORCAMENTO_TEMPO_POR_FONTE:
+                time.sleep(espera)
+    print(f"      ❌ ERRO ao processar a URL {url}: tentativas ou orçamento de tempo esgotados.")
+    return None
+
+# --- SEÇÃO DE MANIFESTO (INDEXAÇÃO INCREMENTAL) ---
+
+def calcular_hash_conteudo(texto: str) -> str:
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+def gerar_ids_chunks(chunks: List[Document]) -> List[str]:
+    """
+    IDs determinísticos dos chunks, gerados pelo motor de chunking a partir do conteúdo
+    (e da fonte). Como não dependem da posição, um chunk que não mudou mantém o seu ID
+    quando outra parte da fonte é editada.
+    """
+    return [chunk.metadata["id_chunk"] for chunk in chunks]
+
+def carregar_manifesto(pasta_indice: str) -> Optional[dict]:
+    caminho = os.path.join(pasta_indice, ARQUIVO_MANIFESTO)
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifesto.get("versao") != VERSAO_MANIFESTO:
+        return None
+    return manifesto
+
+def salvar_manifesto(pasta_indice: str, manifesto: dict):
+    caminho = os.path.join(pasta_indice, ARQUIVO_MANIFESTO)
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(caminho_temporario, caminho)
+
+def novo_manifesto() -> dict:
+    return {"versao": VERSAO_MANIFESTO, "modelo_embeddings": NOME_MODELO_EMBEDDINGS, "fontes": {}}
+
+def registrar_fonte_no_manifesto(manifesto: dict, fonte: str, hash_conteudo: str, ids_chunks: List[str],
+                                 duplicados: Optional[Dict[str, str]] = None):
+    """`duplicados` mapeia os chunks descartados pelo deduplicador para o id do chunk (de qualquer fonte) que ficou no índice."""
+    manifesto["fontes"][fonte] = {
+        "hash": hash_conteudo,
+        "ids_chunks": ids_chunks,
+        "duplicados": duplicados or {},
+        "atualizado_em": datetime.now().isoformat(timespec='seconds')
+    }
+
+def fontes_dependentes(manifesto: dict, ids_ausentes) -> List[str]:
+    """Fontes com chunks descartados como duplicatas de um chunk que não está (mais) no índice."""
+    return [fonte for fonte, registro in manifesto["fontes"].items()
+            if any(id_original in ids_ausentes for id_original in registro.get("duplicados", {}).values())]
+
+def preparar_fonte(fonte: str, documento_bruto: Document) -> Tuple[str, List[Document], List[str]]:
+    """Divide uma fonte já carregada, devolvendo (hash do conteúdo bruto, chunks, ids dos chunks)."""
+    hash_conteudo = calcular_hash_conteudo(documento_bruto.page_content)
+    chunks = chunkificar_texto_aprimorado(documento_bruto.page_content, documento_bruto.metadata, fonte)
+    return hash_conteudo, chunks, gerar_ids_chunks(chunks)
 
-def criar_ou_atualizar_indice(id_contexto: str, definicao_contexto: dict, embeddings_model):
-    pasta_base_indices = "indices_rag"
-    pasta_indice_final = os.path.join(pasta_base_indices, id_contexto)
+def registrar_no_deduplicador(deduplicador: DeduplicadorChunks, lotes: Iterator[Tuple[List[str], List[Document], np.ndarray]]):
+    """Registra os chunks que já estão no índice, para que os novos sejam comparados com eles."""
+    for ids, documentos, _ in lotes:
+        for id_chunk, documento in zip(ids, documentos):
+            deduplicador.registrar(id_chunk, documento.page_content)
+
+# --- SEÇÃO DE GERENCIAMENTO DE ÍNDICES ---
+
+class GravacaoIndice:
+    """
+    Versão nova do índice de um contexto, gravada em fluxo: cada lote de chunks vai direto
+    para os arquivos do formato mmap e para o BM25 em SQLite, na pasta de uma versão ainda
+    não publicada. Vetores e textos não ficam acumulados em memória; `publicar` treina o
+    índice aproximado a partir dos vetores já em disco e só então troca a versão atual.
+    """
+
+    def __init__(self, pasta_contexto: str):
+        self.pasta_contexto = pasta_contexto
+        self.pasta_versao = nova_pasta_versao(pasta_contexto)
+        self.gravador = GravadorIndiceMmap(self.pasta_versao, NOME_MODELO_EMBEDDINGS)
+        self.indice_bm25 = IndiceBM25(os.path.join(self.pasta_versao, ARQUIVO_BM25))
+
+    def __len__(self) -> int:
+        return len(self.gravador)
+
+    def adicionar(self, ids: List[str], documentos: List[Document], vetores):
+        self.gravador.adicionar(ids, documentos, vetores)
+        self.indice_bm25.adicionar(ids, [documento.page_content for documento in documentos])
+
+    def publicar(self, manifesto: dict, formato: str, config_indice: dict, embeddings_model) -> str:
+        """Conclui o índice no formato pedido, grava o manifesto e publica a versão (o gateway a recarrega em segundo plano)."""
+        self.indice_bm25.finalizar()
+        self.indice_bm25.fechar()
+        if config_indice["tipo"] != "flat" and len(self):
+            print(f"  -> Treinando índice '{config_indice['tipo']}' com {len(self)} vetores...")
+        self.gravador.concluir(config_indice)
+        if formato == FORMATO_FAISS:
+            converter_para_faiss(self.pasta_versao, embeddings_model)
+        salvar_manifesto(self.pasta_versao, manifesto)
+        publicar_versao(self.pasta_contexto, self.pasta_versao)
+        return self.pasta_versao
+
+    def descartar(self):
+        # Uma versão incompleta nunca chega a ser apontada por 'ATUAL'
+        self.gravador.abortar()
+        self.indice_bm25.fechar()
+        shutil.rmtree(self.pasta_versao, ignore_errors=True)
+
+def converter_para_faiss(pasta_indice: str, embeddings_model):
+    """
+    Regrava como index.faiss + index.pkl um índice mmap recém-gravado. O FAISS do LangChain
+    só é salvo a partir do índice inteiro em memória, então esta etapa (e só ela) usa
+    memória proporcional ao índice; o formato mmap não passa por aqui.
+    """
+    db = carregar_faiss_de_mmap(pasta_indice, embeddings_model)
+    caminho_ann = os.path.join(pasta_indice, ARQUIVO_INDICE_ANN)
+    if os.path.exists(caminho_ann):
+        db.index = faiss.read_index(caminho_ann)
+    db.save_local(pasta_indice)
+    remover_indice_mmap(pasta_indice)
+
+def reconstruir_como_flat(db: FAISS, embeddings_model) -> FAISS:
+    """
+    Índices aproximados não suportam bem remoções (HNSW) nem devolvem os vetores exatos
+    (PQ). Os textos do docstore são embutidos de novo (em geral acertos no cache de
+    embeddings) para voltar a um índice Flat antes de atualizar e retreinar.
+    """
+    ids = [db.index_to_docstore_id[posicao] for posicao in range(db.index.ntotal)]
+    documentos = [db.docstore.search(id_chunk) for id_chunk in ids]
+    textos = [doc.page_content for doc in documentos]
+    vetores = embeddings_model.embed_documents(textos)
+    return FAISS.from_embeddings(list(zip(textos, vetores)), embeddings_model,
+                                 metadatas=[doc.metadata for doc in documentos], ids=ids)
+
+def abrir_indice_anterior(pasta_indice: str, embeddings_model) -> Union[IndiceMmap, FAISS]:
+    """
+    Abre o índice salvo para ser lido com `iterar_lotes_do_indice`. O formato mmap é lido
+    do disco em lotes; o FAISS (pickle) só pode ser carregado inteiro, e um índice
+    aproximado nesse formato é reconstruído como Flat para ter os vetores exatos.
+    """
+    if detectar_formato(pasta_indice) == FORMATO_MMAP:
+        return IndiceMmap(pasta_indice)
+    db = FAISS.load_local(pasta_indice, embeddings_model, allow_dangerous_deserialization=True)
+    if not isinstance(db.index, faiss.IndexFlat):
+        print("  -> Índice aproximado detectado. Reconstruindo a versão exata (Flat) para a atualização...")
+        db = reconstruir_como_flat(db, embeddings_model)
+    return db
+
+def iterar_lotes_do_indice(indice: Union[IndiceMmap, FAISS], tamanho_lote: int = CHUNKS_POR_LOTE
+                           ) -> Iterator[Tuple[List[str], List[Document], np.ndarray]]:
+    """Percorre um índice aberto com `abrir_indice_anterior` em lotes (ids, documentos, vetores exatos)."""
+    if isinstance(indice, IndiceMmap):
+        yield from indice.iterar_lotes(tamanho_lote)
+        return
+    ids = [indice.index_to_docstore_id[posicao] for posicao in range(indice.index.ntotal)]
+    for inicio in range(0, len(ids), tamanho_lote):
+        lote = ids[inicio:inicio + tamanho_lote]
+        yield lote, [indice.docstore.search(id_chunk) for id_chunk in lote], indice.index.reconstruct_n(inicio, len(lote))
+
+def retomar_checkpoint(checkpoint: CheckpointIndexacao, fontes_concluidas: Dict[str, dict], fontes: List[str],
+                       manifesto: dict, gravacao: GravacaoIndice,
+                       deduplicador: Optional[DeduplicadorChunks]) -> Dict[str, np.ndarray]:
+    """
+    Regrava na versão nova, direto dos segmentos do checkpoint, os chunks das fontes que
+    foram concluídas antes da interrupção (fontes que saíram do contexto desde então ficam
+    de fora). Devolve os vetores já embutidos das fontes ainda pendentes, por id, para que
+    sejam reaproveitados quando essas fontes forem processadas de novo (o que inclui as
+    concluídas com duplicados de chunks que ficaram de fora).
+    """
+    concluidas = {fonte: registro for fonte, registro in fontes_concluidas.items() if fonte in fontes}
+    while True:
+        # Uma fonte com duplicados de chunks que não serão regravados volta a ser pendente
+        ids_validos = {id_chunk for registro in concluidas.values() for id_chunk in registro["ids_chunks"]}
+        invalidas = [fonte for fonte, registro in concluidas.items()
+                     if any(id_original not in ids_validos for id_original in registro.get("duplicados", {}).values())]
+        if not invalidas:
+            break
+        for fonte in invalidas:
+            del concluidas[fonte]
+    manifesto["fontes"].update(concluidas)
+    restantes = set(ids_validos)
+    pendentes = set(fontes) - set(concluidas)
+    reaproveitados = {}
+    for ids, textos, metadados, vetores in checkpoint.iterar_segmentos():
+        posicoes = [i for i, id_chunk in enumerate(ids) if id_chunk in restantes]
+        if posicoes:
+            ids_lote = [ids[i] for i in posicoes]
+            documentos = [Document(page_content=textos[i], metadata=metadados[i]) for i in posicoes]
+            gravacao.adicionar(ids_lote, documentos, vetores[posicoes])
+            restantes.difference_update(ids_lote)
+            if deduplicador is not None:
+                for id_chunk, documento in zip(ids_lote, documentos):
+                    deduplicador.registrar(id_chunk, documento.page_content)
+        for i, id_chunk in enumerate(ids):
+            if metadados[i].get("source") in pendentes:
+                reaproveitados[id_chunk] = np.array(vetores[i])
+    return reaproveitados
+
+def criar_ou_atualizar_indice(id_contexto: str, definicao_contexto: dict, embeddings_model, formato: Optional[str] = None,
+                              checkpoint_a_cada: int = INTERVALO_CHECKPOINT_CHUNKS, retomar: bool = True,
+                              deduplicar: bool = True):
+    pasta_indice_final = os.path.join(PASTA_BASE_INDICES, id_contexto)
     print(f"\n--- Processando Contexto: '{definicao_contexto['nome_exibicao']}' (ID: {id_contexto}) ---")
     fontes = definicao_contexto.get("fontes", [])
     if not fontes:
         print("  ⚠️ AVISO: Nenhuma fonte definida para este contexto. Pulando.")
         return
-    print("  -> Fase 1: Carregando e dividindo documentos das fontes...")
-    documentos_divididos = carregar_e_dividir_documentos(fontes)
-    if not documentos_divididos:
-        print("  ❌ ERRO: Nenhum documento pôde ser carregado. O índice não será criado.")
-        return
-    print("\n  -> Fase 2: Gerando embeddings e criando o índice FAISS...")
-    db = FAISS.from_documents(documentos_divididos, embeddings_model)
-    os.makedirs(pasta_indice_final, exist_ok=True)
-    db.save_local(pasta_indice_final)
+    # Valida o tipo de índice antes de gastar tempo com coleta e embeddings
+    config_indice = normalizar_config_indice(definicao_contexto.get("indice"))
+    # Sem formato explícito, recriar mantém o formato atual; índices novos usam o mmap
+    formato = formato or detectar_formato(resolver_pasta_indice(pasta_indice_final)) or FORMATO_MMAP
+    manifesto = novo_manifesto()
+    manifesto["indice"] = config_indice
+    deduplicador = DeduplicadorChunks() if deduplicar else None
+
+    checkpoint = CheckpointIndexacao(id_contexto, NOME_MODELO_EMBEDDINGS, intervalo_chunks=checkpoint_a_cada)
+    if checkpoint.existe() and not retomar:
+        print("  -> Descartando o checkpoint de uma criação anterior.")
+        checkpoint.descartar()
+    gravacao = GravacaoIndice(pasta_indice_final)
+    try:
+        # Retoma uma criação interrompida a partir do último checkpoint, sem embutir de novo o que já estava salvo
+        reaproveitados = {}
+        if checkpoint.existe():
+            fontes_concluidas = checkpoint.carregar()
+            if fontes_concluidas is None:
+                print("  -> Checkpoint incompatível (outro modelo de embeddings ou versão). Começando do zero.")
+                checkpoint.descartar()
+            else:
+                reaproveitados = retomar_checkpoint(checkpoint, fontes_concluidas, fontes, manifesto, gravacao, deduplicador)
+                print(f"  -> Retomando do checkpoint: {len(manifesto['fontes'])} fonte(s) concluída(s), "
+                      f"{len(gravacao)} chunks regravados e {len(reaproveitados)} já embutidos para reaproveitar.")
+
+        # Pipeline em fluxo: coleta, chunking, embedding em lotes e gravação acontecem juntos.
+        # Cada lote vai direto para a versão nova em disco (vetores, textos, metadados e BM25),
+        # e um checkpoint é gravado a cada `checkpoint_a_cada` chunks. Em memória ficam só o
+        # lote atual, os ids do manifesto e as assinaturas do deduplicador.
+        print("  -> Carregando, dividindo e embutindo documentos conforme as fontes chegam...")
+        fontes_pendentes = [fonte for fonte in fontes if fonte not in manifesto["fontes"]]
+        for lote in iterar_lotes_de_chunks(fontes_pendentes, calcular_chunks_por_lote(embeddings_model),
+                                           deduplicador=deduplicador):
+            if lote["chunks"]:
+                textos = [chunk.page_content for chunk in lote["chunks"]]
+                metadados = [chunk.metadata for chunk in lote["chunks"]]
+                faltantes = [i for i, id_chunk in enumerate(lote["ids"]) if id_chunk not in reaproveitados]
+                embutidos = iter(embeddings_model.embed_documents([textos[i] for i in faltantes]) if faltantes else [])
+                vetores = [reaproveitados.pop(id_chunk) if id_chunk in reaproveitados else next(embutidos)
+                           for id_chunk in lote["ids"]]
+                gravacao.adicionar(lote["ids"], lote["chunks"], vetores)
+                # Os reaproveitados já estão em um segmento anterior do checkpoint
+                checkpoint.acumular([lote["ids"][i] for i in faltantes], [textos[i] for i in faltantes],
+                                    [metadados[i] for i in faltantes], [vetores[i] for i in faltantes])
+            for fonte, hash_conteudo, ids_chunks, duplicados in lote["fontes_concluidas"]:
+                registrar_fonte_no_manifesto(manifesto, fonte, hash_conteudo, ids_chunks, duplicados)
+                checkpoint.concluir_fonte(fonte, manifesto["fontes"][fonte])
+                print(f"  -> Fonte indexada: {fonte} ({len(ids_chunks)} chunks"
+                      f"{f', {len(duplicados)} duplicados descartados' if duplicados else ''})")
+            if checkpoint.talvez_salvar():
+                print(f"  -> Checkpoint salvo ({len(gravacao)} chunks gravados até agora).")
+        print(f"\n  -> Total de fontes processadas: {len(fontes)}")
+        print(f"  -> Total de chunks gerados após o processamento: {len(gravacao)}")
+        if deduplicador is not None:
+            print(f"  -> Deduplicação: {deduplicador.resumo()}")
+        if not len(gravacao):
+            print("  ❌ ERRO: Nenhum documento pôde ser carregado. O índice não será criado.")
+            gravacao.descartar()
+            checkpoint.descartar()
+            return
+        gravacao.publicar(manifesto, formato, config_indice, embeddings_model)
+    except BaseException:
+        gravacao.descartar()
+        raise
+    # O índice final já está salvo; o checkpoint não é mais necessário
+    checkpoint.descartar()
     print(f"✅ Índice para '{definicao_contexto['nome_exibicao']}' salvo com sucesso em '{pasta_indice_final}'")
 
+def atualizar_indice_incremental(id_contexto: str, definicao_contexto: dict, embeddings_model, formato: Optional[str] = None,
+                                 deduplicar: bool = True):
+    """
+    Atualiza um índice existente embutindo apenas as fontes novas ou alteradas e
+    removendo os vetores das fontes que saíram do 'contexts.json'. Se não houver
+    índice/manifesto compatível, recai na criação completa. A versão nova é gravada em
+    fluxo: os chunks novos à medida que são embutidos e, no fim, os que continuam no
+    índice, copiados em lotes da versão anterior com os vetores exatos.
+    """
+    pasta_indice_final = os.path.join(PASTA_BASE_INDICES, id_contexto)
+    pasta_versao_atual = resolver_pasta_indice(pasta_indice_final)
+    manifesto = carregar_manifesto(pasta_versao_atual)
+    formato_atual = detectar_formato(pasta_versao_atual)
+    if not manifesto or formato_atual is None:
+        print("  -> Nenhum manifesto compatível encontrado. Será feita a criação completa do índice.")
+        return criar_ou_atualizar_indice(id_contexto, definicao_contexto, embeddings_model, formato, deduplicar=deduplicar)
+    if manifesto.get("modelo_embeddings") != NOME_MODELO_EMBEDDINGS:
+        print(f"  -> O índice foi gerado com '{manifesto.get('modelo_embeddings')}'. Recriando com '{NOME_MODELO_EMBEDDINGS}'.")
+        return criar_ou_atualizar_indice(id_contexto, definicao_contexto, embeddings_model, formato, deduplicar=deduplicar)
+
+    print(f"\n--- Atualizando Contexto: '{definicao_contexto['nome_exibicao']}' (ID: {id_contexto}) ---")
+    fontes = definicao_contexto.get("fontes", [])
+    if not fontes:
+        print("  ⚠️ AVISO: Nenhuma fonte definida para este contexto. Pulando.")
+        return
+    config_indice = normalizar_config_indice(definicao_contexto.get("indice"))
+    mudou_tipo_indice = manifesto.get("indice", normalizar_config_indice(None)) != config_indice
+    formato = formato or formato_atual
+    indice_anterior = abrir_indice_anterior(pasta_versao_atual, embeddings_model)
+    gravacao = GravacaoIndice(pasta_indice_final)
+    try:
+        # Os chunks novos são comparados com tudo o que já está no índice
+        deduplicador = None
+        if deduplicar:
+            deduplicador = DeduplicadorChunks()
+            registrar_no_deduplicador(deduplicador, iterar_lotes_do_indice(indice_anterior))
+        chunks_por_lote = calcular_chunks_por_lote(embeddings_model)
+        # Chunks da versão anterior que não vão para a nova, e metadados novos dos que continuam
+        ids_apagados, metadados_atualizados = set(), {}
+
+        # 1. Remove os vetores das fontes que não existem mais no contexto
+        fontes_removidas = [fonte for fonte in manifesto["fontes"] if fonte not in fontes]
+        for fonte in fontes_removidas:
+            ids_antigos = manifesto["fontes"].pop(fonte)["ids_chunks"]
+            ids_apagados.update(ids_antigos)
+            if deduplicador is not None:
+                for id_chunk in ids_antigos:
+                    deduplicador.remover(id_chunk)
+            print(f"  -> Fonte removida do índice: {fonte} ({len(ids_antigos)} chunks)")
+
+        def reprocessar(fonte: str, documento_bruto: Document, registro_atual: Optional[dict]) -> str:
+            hash_conteudo, chunks, ids_chunks = preparar_fonte(fonte, documento_bruto)
+            # Os IDs vêm do conteúdo: só saem os chunks que mudaram e só entram os novos
+            ids_antigos = set(registro_atual["ids_chunks"]) if registro_atual else set()
+            ids_atuais = set(ids_chunks)
+            ids_removidos = [id_chunk for id_chunk in ids_antigos if id_chunk not in ids_atuais]
+            ids_apagados.update(ids_removidos)
+            if deduplicador is not None:
+                for id_chunk in ids_removidos:
+                    deduplicador.remover(id_chunk)
+            # O vetor dos mantidos continua válido; só a posição ('inicio'/'fim') nos metadados pode ter mudado
+            mantidos = {id_chunk: chunk.metadata for chunk, id_chunk in zip(chunks, ids_chunks) if id_chunk in ids_antigos}
+            metadados_atualizados.update(mantidos)
+            novos, duplicados = [], {}
+            for chunk, id_chunk in zip(chunks, ids_chunks):
+                if id_chunk in ids_antigos:
+                    continue
+                duplicata = deduplicador.encontrar_original(id_chunk, chunk.page_content) if deduplicador is not None else None
+                if duplicata:
+                    duplicados[id_chunk] = duplicata[1]
+                    continue
+                novos.append((chunk, id_chunk))
+            for inicio in range(0, len(novos), chunks_por_lote):
+                lote = novos[inicio:inicio + chunks_por_lote]
+                gravacao.adicionar([id_chunk for _, id_chunk in lote], [chunk for chunk, _ in lote],
+                                   embeddings_model.embed_documents([chunk.page_content for chunk, _ in lote]))
+            # O manifesto guarda só os chunks que estão de fato no índice
+            ids_novos = {id_chunk for _, id_chunk in novos}
+            ids_chunks = [id_chunk for id_chunk in ids_chunks if id_chunk in mantidos or id_chunk in ids_novos]
+            registrar_fonte_no_manifesto(manifesto, fonte, hash_conteudo, ids_chunks, duplicados)
+            return (f"{len(novos)} chunks embutidos, {len(ids_removidos)} removidos, {len(mantidos)} mantidos"
+                    f"{f', {len(duplicados)} duplicados descartados' if duplicados else ''}")
+
+        # 2. Reprocessa apenas as fontes novas ou cujo conteúdo mudou
+        fontes_inalteradas, fontes_atualizadas = 0, 0
+        for fonte, documento_bruto in iterar_documentos_brutos(fontes):
+            if not documento_bruto:
+                print(f"  ⚠️ AVISO: Não foi possível carregar '{fonte}'. A versão já indexada (se houver) será mantida.")
+                continue
+            registro_atual = manifesto["fontes"].get(fonte)
+            if registro_atual and registro_atual["hash"] == calcular_hash_conteudo(documento_bruto.page_content):
+                fontes_inalteradas += 1
+                continue
+            resumo = reprocessar(fonte, documento_bruto, registro_atual)
+            fontes_atualizadas += 1
+            print(f"  -> Fonte {'atualizada' if registro_atual else 'adicionada'}: {fonte} ({resumo})")
+
+        # 3. Fontes com chunks descartados como duplicatas de chunks que saíram do índice: os
+        #    descartados são verificados de novo e entram no índice se não houver outra cópia
+        for fonte, documento_bruto in iterar_documentos_brutos(fontes_dependentes(manifesto, ids_apagados)):
+            if not documento_bruto:
+                print(f"  ⚠️ AVISO: Não foi possível carregar '{fonte}'. Os seus trechos duplicados de chunks removidos "
+                      f"ficam fora do índice até a próxima atualização.")
+                continue
+            resumo = reprocessar(fonte, documento_bruto, manifesto["fontes"][fonte])
+            fontes_atualizadas += 1
+            print(f"  -> Fonte reprocessada (duplicava chunks removidos): {fonte} ({resumo})")
+
+        print(f"\n  -> Fontes inalteradas: {fontes_inalteradas} | atualizadas/novas: {fontes_atualizadas} | removidas: {len(fontes_removidas)}")
+        if deduplicador is not None:
+            print(f"  -> Deduplicação: {deduplicador.resumo()}")
+        mudou_formato = formato != formato_atual
+        falta_bm25 = not os.path.exists(os.path.join(pasta_versao_atual, ARQUIVO_BM25))
+        if not fontes_atualizadas and not fontes_removidas and not mudou_formato and not mudou_tipo_indice and not falta_bm25:
+            gravacao.descartar()
+            print(f"✅ Índice '{pasta_indice_final}' já está atualizado. Nada a fazer.")
+            return
+
+        # 4. Copia da versão anterior os chunks que continuam no índice, sem embutir de novo
+        for ids, documentos, vetores in iterar_lotes_do_indice(indice_anterior):
+            posicoes = [i for i, id_chunk in enumerate(ids) if id_chunk not in ids_apagados]
+            if posicoes:
+                gravacao.adicionar([ids[i] for i in posicoes],
+                                   [Document(page_content=documentos[i].page_content,
+                                             metadata=metadados_atualizados.get(ids[i], documentos[i].metadata))
+                                    for i in posicoes],
+                                   vetores[posicoes])
+        manifesto["indice"] = config_indice
+        gravacao.publicar(manifesto, formato, config_indice, embeddings_model)
+    except BaseException:
+        gravacao.descartar()
+        raise
+    finally:
+        if isinstance(indice_anterior, IndiceMmap):
+            indice_anterior.fechar()
+    print(f"✅ Índice para '{definicao_contexto['nome_exibicao']}' atualizado com sucesso em '{pasta_indice_final}'")
+
+def avaliar_indice(id_contexto: str, definicao_contexto: dict, embeddings_model, amostras: int, k: int):
+    """Relatório de recall@k e latência de cada tipo de índice contra a busca exata, usando os vetores do contexto."""
+    pasta_indice_final = resolver_pasta_indice(os.path.join(PASTA_BASE_INDICES, id_contexto))
+    if detectar_formato(pasta_indice_final) is None:
+        print(f"❌ ERRO: O contexto '{id_contexto}' ainda não foi indexado. Rode '--acao criar' antes.")
+        return
+    print(f"\n--- Avaliando tipos de índice para '{definicao_contexto['nome_exibicao']}' (ID: {id_contexto}) ---")
+    indice = abrir_indice_anterior(pasta_indice_final, embeddings_model)
+    if isinstance(indice, IndiceMmap):
+        vetores = np.array(indice.vetores())
+        indice.fechar()
+    else:
+        vetores = indice.index.reconstruct_n(0, indice.index.ntotal)
+    # O tipo configurado no contexto entra com os seus parâmetros; os demais com os padrões
+    config_contexto = normalizar_config_indice(definicao_contexto.get("indice"))
+    configs = [config_contexto if tipo == config_contexto["tipo"] else {"tipo": tipo} for tipo in TIPOS_INDICE]
+    print(f"  -> {len(vetores)} vetores, {min(amostras, len(vetores))} consultas, k={k}")
+    relatorio = avaliar_tipos_indice(vetores, configs, amostras=amostras, k=k)
+
+    print(f"\n  {'tipo':<10} {'recall@' + str(k):>9} {'média(ms)':>10} {'p95(ms)':>9} {'treino(s)':>10} {'tamanho(MB)':>12}  parâmetros")
+    for linha in relatorio:
+        marcador = " *" if linha["tipo"] == config_contexto["tipo"] else ""
+        print(f"  {linha['tipo']:<10} {linha['recall']:>9.3f} {linha['latencia_media_ms']:>10.3f} {linha['latencia_p95_ms']:>9.3f} "
+              f"{linha['construcao_s']:>10.2f} {linha['tamanho_mb']:>12.2f}  {linha['parametros']}{marcador}")
+    print("\n  (*) tipo configurado atualmente em 'contexts.json'")
+
 def deletar_indice(id_contexto: str):
-    pasta_base_indices = "indices_rag"
-    pasta_indice_final = os.path.join(pasta_base_indices, id_contexto)
+    pasta_indice_final = os.path.join(PASTA_BASE_INDICES, id_contexto)
     print(f"\n--- Tentando deletar o índice para o contexto: '{id_contexto}' ---")
     
     if os.path.isdir(pasta_indice_final):
@@ -198,7 +764,60 @@ def deletar_indice(id_contexto: str):
         print(f"⚠️ AVISO: Nenhum índice encontrado para '{id_contexto}' em '{pasta_indice_final}'. Nada a ser feito.")
 
 
-# --- BLOCO PRINCIPAL DE EXECUÇÃO (sem alterações) ---
+# --- SEÇÃO DE EXECUÇÃO EM LOTE ---
+
+TRABALHADORES_LOTE_PADRAO = 2     # Contextos processados ao mesmo tempo no modo em lote
+
+def executar_acao_contexto(acao: str, id_contexto: str, definicao_contexto: dict, embeddings_model, args) -> dict:
+    """Executa a ação em um contexto e devolve {contexto, segundos, status}; um erro não interrompe os demais contextos."""
+    inicio = time.perf_counter()
+    try:
+        if acao == 'criar':
+            criar_ou_atualizar_indice(id_contexto, definicao_contexto, embeddings_model, args.formato,
+                                      checkpoint_a_cada=args.checkpoint_a_cada, retomar=not args.recomecar,
+                                      deduplicar=not args.sem_deduplicacao)
+        elif acao == 'avaliar':
+            avaliar_indice(id_contexto, definicao_contexto, embeddings_model, args.amostras, args.k)
+        else:
+            atualizar_indice_incremental(id_contexto, definicao_contexto, embeddings_model, args.formato,
+                                         deduplicar=not args.sem_deduplicacao)
+        status = "ok"
+    except Exception as e:
+        print(f"❌ ERRO ao processar o contexto '{id_contexto}': {e}")
+        status = f"erro: {e}"
+    return {"contexto": id_contexto, "segundos": time.perf_counter() - inicio, "status": status}
+
+def processar_contextos_em_lote(acao: str, ids_contextos: List[str], contextos: dict, embeddings_model,
+                                args, trabalhadores: int) -> List[dict]:
+    """
+    Processa vários contextos no mesmo processo, compartilhando o modelo de embeddings (e o
+    seu cache) já carregado. Com `trabalhadores > 1` os contextos rodam em paralelo em um
+    pool de threads: coleta, chunking e gravação de um contexto avançam enquanto outro usa
+    o modelo. A ação 'avaliar' mede latência e por isso roda sempre um contexto por vez.
+    """
+    if acao == 'avaliar':
+        trabalhadores = 1
+    trabalhadores = max(1, min(trabalhadores, len(ids_contextos)))
+    if trabalhadores == 1:
+        return [executar_acao_contexto(acao, id_contexto, contextos[id_contexto], embeddings_model, args)
+                for id_contexto in ids_contextos]
+    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+        futuros = [executor.submit(executar_acao_contexto, acao, id_contexto, contextos[id_contexto], embeddings_model, args)
+                   for id_contexto in ids_contextos]
+        return [futuro.result() for futuro in futuros]
+
+def exibir_resumo_lote(resultados: List[dict], segundos_totais: float):
+    print(f"\n--- Resumo do lote ({len(resultados)} contextos) ---")
+    largura = max(len("contexto"), *(len(r["contexto"]) for r in resultados))
+    print(f"  {'contexto':<{largura}} {'tempo(s)':>9}  status")
+    for resultado in resultados:
+        print(f"  {resultado['contexto']:<{largura}} {resultado['segundos']:>9.1f}  {resultado['status']}")
+    soma = sum(r["segundos"] for r in resultados)
+    falhas = sum(1 for r in resultados if r["status"] != "ok")
+    print(f"  Tempo total: {segundos_totais:.1f}s (soma dos contextos: {soma:.1f}s) | com erro: {falhas}")
+
+
+# --- BLOCO PRINCIPAL DE EXECUÇÃO ---
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -209,14 +828,73 @@ if __name__ == "__main__":
         "--acao",
         type=str,
         required=True,
-        choices=["criar", "deletar"],
-        help="A ação a ser executada:\n'criar'   - Cria um novo índice ou atualiza um existente.\n'deletar' - Deleta um índice existente."
+        choices=["criar", "atualizar", "avaliar", "deletar"],
+        help="A ação a ser executada:\n'criar'     - Cria um novo índice (ou recria um existente do zero).\n'atualizar' - Atualiza um índice existente reprocessando apenas fontes novas/alteradas.\n'avaliar'   - Compara recall e latência dos tipos de índice (flat, ivf_flat, ivf_pq, hnsw).\n'deletar'   - Deleta um índice existente."
     )
-    parser.add_argument(
+    grupo_contextos = parser.add_mutually_exclusive_group(required=True)
+    grupo_contextos.add_argument(
         "--contexto",
         type=str,
-        required=True,
-        help="O ID do contexto a ser processado (deve ser uma chave do arquivo 'contexts.json')."
+        nargs="+",
+        help="O ID do contexto a ser processado (deve ser uma chave do arquivo 'contexts.json').\nAceita vários IDs separados por espaço para processá-los em lote."
+    )
+    grupo_contextos.add_argument(
+        "--todos",
+        action="store_true",
+        help="Processa todos os contextos do arquivo 'contexts.json' em lote."
+    )
+    parser.add_argument(
+        "--trabalhadores",
+        type=int,
+        default=TRABALHADORES_LOTE_PADRAO,
+        help=f"Quantidade de contextos processados ao mesmo tempo no modo em lote (padrão: {TRABALHADORES_LOTE_PADRAO})."
+    )
+    parser.add_argument(
+        "--tamanho-lote",
+        type=int,
+        default=TAMANHO_LOTE_PADRAO,
+        help=f"Quantidade de chunks embutidos por lote (padrão: {TAMANHO_LOTE_PADRAO})."
+    )
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=1,
+        help="Número de processos para gerar embeddings (padrão: 1; use 0 para todos os núcleos da CPU)."
+    )
+    parser.add_argument(
+        "--formato",
+        type=str,
+        choices=[FORMATO_FAISS, FORMATO_MMAP],
+        default=None,
+        help="Formato de armazenamento do índice:\n'mmap'  - vetores/textos mapeados em memória + metadados em SQLite, carregamento O(1) sem pickle (padrão para índices novos).\n'faiss' - index.faiss + index.pkl (pickle); a conversão final carrega o índice inteiro em memória.\nSem a opção, 'criar' e 'atualizar' mantêm o formato de um índice existente."
+    )
+    parser.add_argument(
+        "--checkpoint-a-cada",
+        type=int,
+        default=INTERVALO_CHECKPOINT_CHUNKS,
+        help=f"Na ação 'criar', grava um checkpoint a cada N chunks embutidos (padrão: {INTERVALO_CHECKPOINT_CHUNKS}).\nUma criação interrompida é retomada do último checkpoint ao rodar 'criar' de novo."
+    )
+    parser.add_argument(
+        "--recomecar",
+        action="store_true",
+        help="Na ação 'criar', ignora (e apaga) o checkpoint de uma criação interrompida e começa do zero."
+    )
+    parser.add_argument(
+        "--sem-deduplicacao",
+        action="store_true",
+        help="Nas ações 'criar' e 'atualizar', mantém chunks duplicados ou quase duplicados (por padrão eles são descartados)."
+    )
+    parser.add_argument(
+        "--amostras",
+        type=int,
+        default=200,
+        help="Número de consultas usadas pela ação 'avaliar' (padrão: 200)."
+    )
+    parser.add_argument(
+        "--k",
+        type=int,
+        default=10,
+        help="Quantidade de vizinhos considerada no recall da ação 'avaliar' (padrão: 10)."
     )
     
     args = parser.parse_args()
@@ -228,22 +906,36 @@ if __name__ == "__main__":
         print("ERRO CRÍTICO: Arquivo 'contexts.json' não encontrado.")
         exit()
         
-    if args.contexto not in CONTEXTOS_DISPONIVEIS:
-        print(f"❌ ERRO: O contexto com ID '{args.contexto}' não foi encontrado em 'contexts.json'.")
+    ids_contextos = list(CONTEXTOS_DISPONIVEIS) if args.todos else list(dict.fromkeys(args.contexto))
+    desconhecidos = [id_contexto for id_contexto in ids_contextos if id_contexto not in CONTEXTOS_DISPONIVEIS]
+    if desconhecidos:
+        print(f"❌ ERRO: Contexto(s) não encontrado(s) em 'contexts.json': {', '.join(desconhecidos)}")
         print("   Contextos disponíveis:", list(CONTEXTOS_DISPONIVEIS.keys()))
         exit()
 
-    print(f"--- Gerenciador de Índices RAG (Ação: {args.acao.upper()}, Contexto: {args.contexto}) ---")
+    print(f"--- Gerenciador de Índices RAG (Ação: {args.acao.upper()}, Contexto(s): {', '.join(ids_contextos)}) ---")
     
-    if args.acao == 'criar':
+    if args.acao in ('criar', 'atualizar', 'avaliar'):
         print("-> Carregando o modelo de embeddings (pode levar um momento)...")
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        print("✅ Modelo de embeddings carregado.")
+        motor = MotorEmbeddings(NOME_MODELO_EMBEDDINGS, tamanho_lote=args.tamanho_lote, processos=args.processos)
+        # O pipeline embute em muitos lotes pequenos; o cache é salvo uma única vez, ao final
+        embeddings = EmbeddingsComCache(motor, NOME_MODELO_EMBEDDINGS, salvar_a_cada_lote=False)
+        print(f"✅ Modelo de embeddings carregado ({len(embeddings.cache)} vetores já em cache).")
         
-        definicao_especifica = CONTEXTOS_DISPONIVEIS[args.contexto]
-        criar_ou_atualizar_indice(args.contexto, definicao_especifica, embeddings)
+        inicio_lote = time.perf_counter()
+        try:
+            resultados = processar_contextos_em_lote(args.acao, ids_contextos, CONTEXTOS_DISPONIVEIS, embeddings,
+                                                     args, args.trabalhadores)
+        finally:
+            embeddings.cache.salvar()
+            motor.encerrar()
+        if len(ids_contextos) > 1:
+            exibir_resumo_lote(resultados, time.perf_counter() - inicio_lote)
+        print(f"  -> Cache de embeddings: {embeddings.resumo()}")
+        print(f"  -> Vazão de embeddings: {motor.resumo()}")
         
     elif args.acao == 'deletar':
-        deletar_indice(args.contexto)
+        for id_contexto in ids_contextos:
+            deletar_indice(id_contexto)
         
-    print("\n--- Operação concluída. ---")
\ No newline at end of file
+    print("\n--- Operação concluída. ---")
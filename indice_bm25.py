@@ -0,0 +1,197 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ARQUIVO_BM25 = "bm25.sqlite"
+VERSAO_BM25 = 2
+K1_PADRAO = 1.5
+B_PADRAO = 0.75
+# Constante do reciprocal rank fusion (valor usual da literatura)
+K_RRF_PADRAO = 60
+
+# Os mesmos elementos técnicos que `aplicar_limpeza_e_formatacao` envolve em crases:
+# caminhos, variáveis de ambiente e CONSTANTES=valor. Eles viram um token inteiro, além
+# das palavras que os compõem, para que uma pergunta com o valor exato o encontre.
+PADRAO_CRASES = re.compile(r'`([^`\n]+)`')
+PADROES_TECNICOS = [
+    re.compile(r'(?:(?<=[\s,(])|^)(?:\.?/)[\w./\-]+'),   # Caminhos de arquivo
+    re.compile(r'\$\w+'),                                 # Variáveis de ambiente
+    re.compile(r'\b[A-Z_]{3,}=[\w"./\-]+'),              # Constantes
+]
+PADRAO_PALAVRA = re.compile(r'\w+')
+STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "é", "em", "no", "na", "nos", "nas",
+    "um", "uma", "uns", "umas", "para", "por", "com", "que", "se", "ao", "aos", "à", "às", "ou",
+    "como", "mais", "mas", "não", "sua", "seu", "suas", "seus", "the", "of", "and", "to", "in", "is"
+}
+
+
+def tokenizar(texto: str) -> List[str]:
+    tokens = [encontrado.group(1).strip().lower() for encontrado in PADRAO_CRASES.finditer(texto)]
+    # Fora das crases (ex: na pergunta do usuário) os mesmos elementos são reconhecidos pelos padrões
+    sem_crases = PADRAO_CRASES.sub(' ', texto)
+    for padrao in PADROES_TECNICOS:
+        tokens.extend(encontrado.group(0).lower() for encontrado in padrao.finditer(sem_crases))
+    tokens.extend(p for p in (m.group(0).lower() for m in PADRAO_PALAVRA.finditer(texto))
+                  if len(p) > 1 and p not in STOPWORDS)
+    return tokens
+
+
+class IndiceBM25:
+    """
+    Índice invertido (BM25 Okapi) sobre os chunks de um contexto, guardado em SQLite.
+    Guarda os IDs dos chunks (os mesmos do índice vetorial) para que os dois resultados
+    possam ser fundidos.
+
+    Os chunks entram em lotes com `adicionar` (só as postings vão para o banco, os textos
+    não ficam em memória) e `finalizar` calcula as estatísticas e cria o índice por termo.
+    Abrir um índice salvo (`carregar`) só abre a conexão: cada busca lê do disco apenas as
+    postings dos termos da consulta.
+    """
+
+    def __init__(self, caminho: str = ":memory:", k1: float = K1_PADRAO, b: float = B_PADRAO,
+                 somente_leitura: bool = False):
+        self.caminho = caminho
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._vocabulario: Dict[str, List[int]] = {}   # termo -> [id do termo, documentos com o termo]
+        self._total = 0
+        self._soma_comprimentos = 0
+        self._comprimento_medio = 0.0
+        if somente_leitura:
+            uri = f"file:{os.path.abspath(caminho)}?mode=ro"
+            self._conexao = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.executescript("""
+            CREATE TABLE info (chave TEXT PRIMARY KEY, valor);
+            CREATE TABLE documentos (posicao INTEGER PRIMARY KEY, id TEXT NOT NULL, comprimento INTEGER NOT NULL);
+            CREATE TABLE termos (id_termo INTEGER PRIMARY KEY, termo TEXT NOT NULL, documentos INTEGER NOT NULL);
+            CREATE TABLE postings (id_termo INTEGER NOT NULL, posicao INTEGER NOT NULL, frequencia INTEGER NOT NULL);
+        """)
+
+    @classmethod
+    def construir(cls, ids: Sequence[str], textos: Sequence[str], **parametros) -> "IndiceBM25":
+        """Monta o índice inteiro em memória (use `salvar` para gravá-lo)."""
+        indice = cls(**parametros)
+        indice.adicionar(ids, textos)
+        indice.finalizar()
+        return indice
+
+    def adicionar(self, ids: Sequence[str], textos: Sequence[str]):
+        """Acrescenta um lote de chunks, nas posições seguintes às já adicionadas."""
+        documentos, postings = [], []
+        for id_chunk, texto in zip(ids, textos):
+            frequencias = Counter(tokenizar(texto))
+            comprimento = sum(frequencias.values())
+            documentos.append((self._total, id_chunk, comprimento))
+            for termo, frequencia in frequencias.items():
+                registro = self._vocabulario.get(termo)
+                if registro is None:
+                    registro = self._vocabulario[termo] = [len(self._vocabulario), 0]
+                registro[1] += 1
+                postings.append((registro[0], self._total, frequencia))
+            self._total += 1
+            self._soma_comprimentos += comprimento
+        with self._lock:
+            self._conexao.executemany("INSERT INTO documentos VALUES (?, ?, ?)", documentos)
+            self._conexao.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            self._conexao.commit()
+
+    def finalizar(self):
+        """Grava o vocabulário e as estatísticas e indexa as postings por termo (uma ordenação feita pelo SQLite, em disco)."""
+        with self._lock:
+            self._conexao.executemany("INSERT INTO termos VALUES (?, ?, ?)",
+                                      ((id_termo, termo, documentos) for termo, (id_termo, documentos) in self._vocabulario.items()))
+            self._conexao.execute("CREATE UNIQUE INDEX termos_por_termo ON termos (termo)")
+            self._conexao.execute("CREATE INDEX postings_por_termo ON postings (id_termo, posicao, frequencia)")
+            self._conexao.executemany("INSERT INTO info VALUES (?, ?)", [
+                ("versao", VERSAO_BM25), ("k1", self.k1), ("b", self.b),
+                ("total", self._total), ("soma_comprimentos", self._soma_comprimentos)])
+            self._conexao.commit()
+        self._vocabulario = {}
+        self._preparar()
+
+    def _preparar(self):
+        self._comprimento_medio = (self._soma_comprimentos / self._total) if self._total else 0.0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def buscar(self, consulta: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (id do chunk, score BM25), maior é melhor."""
+        termos = list(set(tokenizar(consulta)))
+        if not termos or not self._total or k <= 0:
+            return []
+        marcadores = ",".join("?" * len(termos))
+        with self._lock:
+            encontrados = self._conexao.execute(
+                f"SELECT id_termo, documentos FROM termos WHERE termo IN ({marcadores})", termos).fetchall()
+            if not encontrados:
+                return []
+            idf = {id_termo: math.log(1 + (self._total - documentos + 0.5) / (documentos + 0.5))
+                   for id_termo, documentos in encontrados}
+            marcadores = ",".join("?" * len(idf))
+            linhas = self._conexao.execute(
+                f"SELECT p.id_termo, p.posicao, p.frequencia, d.comprimento FROM postings p "
+                f"JOIN documentos d ON d.posicao = p.posicao WHERE p.id_termo IN ({marcadores})", list(idf)).fetchall()
+        scores = defaultdict(float)
+        for id_termo, posicao, frequencia, comprimento in linhas:
+            normalizacao = self.k1 * (1 - self.b + self.b * comprimento / (self._comprimento_medio or 1.0))
+            scores[posicao] += idf[id_termo] * frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+        melhores = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        marcadores = ",".join("?" * len(melhores))
+        with self._lock:
+            ids = dict(self._conexao.execute(
+                f"SELECT posicao, id FROM documentos WHERE posicao IN ({marcadores})", [p for p, _ in melhores]).fetchall())
+        return [(ids[posicao], score) for posicao, score in melhores]
+
+    def salvar(self, pasta_indice: str):
+        """Grava uma cópia do índice em `pasta_indice` (para índices montados em memória com `construir`)."""
+        caminho = os.path.join(pasta_indice, ARQUIVO_BM25)
+        if os.path.exists(caminho + ".tmp"):
+            os.remove(caminho + ".tmp")
+        destino = sqlite3.connect(caminho + ".tmp")
+        try:
+            with self._lock:
+                self._conexao.backup(destino)
+        finally:
+            destino.close()
+        os.replace(caminho + ".tmp", caminho)
+
+    @classmethod
+    def carregar(cls, pasta_indice: str) -> Optional["IndiceBM25"]:
+        """Abre o índice salvo sem ler as postings (O(1)); None se não houver um índice compatível."""
+        caminho = os.path.join(pasta_indice, ARQUIVO_BM25)
+        if not os.path.isfile(caminho):
+            return None
+        indice = cls(caminho, somente_leitura=True)
+        try:
+            info = dict(indice._conexao.execute("SELECT chave, valor FROM info").fetchall())
+        except sqlite3.DatabaseError:
+            info = {}
+        if info.get("versao") != VERSAO_BM25:
+            indice.fechar()
+            return None
+        indice.k1, indice.b = info["k1"], info["b"]
+        indice._total, indice._soma_comprimentos = info["total"], info["soma_comprimentos"]
+        indice._preparar()
+        return indice
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+def fundir_rrf(*rankings: Sequence[str], k_rrf: int = K_RRF_PADRAO) -> List[Tuple[str, float]]:
+    """Reciprocal rank fusion: cada lista contribui 1/(k_rrf + posição) para cada id que contém."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for posicao, id_chunk in enumerate(ranking, start=1):
+            scores[id_chunk] += 1.0 / (k_rrf + posicao)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
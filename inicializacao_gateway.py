@@ -0,0 +1,163 @@
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Modos de carregamento dos componentes pesados (modelos GGUF, embeddings e índices)
+CARREGAMENTO_IMEDIATO = "imediato"        # Tudo carregado antes de o servidor aceitar requisições (comportamento antigo)
+CARREGAMENTO_SEGUNDO_PLANO = "segundo_plano"  # O servidor sobe na hora e os componentes aquecem em uma thread
+CARREGAMENTO_SOB_DEMANDA = "sob_demanda"  # Modelos locais só são carregados na primeira requisição que os usa
+MODOS_CARREGAMENTO = (CARREGAMENTO_IMEDIATO, CARREGAMENTO_SEGUNDO_PLANO, CARREGAMENTO_SOB_DEMANDA)
+ESPERA_COMPONENTE_PADRAO = 60.0           # Segundos que uma requisição espera por um componente ainda carregando
+
+ESTADO_PENDENTE = "pendente"
+ESTADO_CARREGANDO = "carregando"
+ESTADO_PRONTO = "pronto"
+ESTADO_ERRO = "erro"
+
+
+class ComponenteIndisponivel(Exception):
+    """O componente falhou ao carregar ou não ficou pronto dentro da espera; o cliente pode tentar de novo."""
+
+    def __init__(self, nome: str, motivo: str, retry_after: int = 5):
+        super().__init__(f"'{nome}' indisponível: {motivo}")
+        self.retry_after = retry_after
+
+
+class Componente:
+    def __init__(self, nome: str, carregar: Callable[[], object], obrigatorio: bool):
+        self.nome = nome
+        self.carregar = carregar
+        self.obrigatorio = obrigatorio
+        self.estado = ESTADO_PENDENTE
+        self.erro: Optional[str] = None
+        self.segundos: Optional[float] = None
+        self.resultado = None
+        self.tentativas = 0
+        self.concluido = threading.Event()
+        self.lock = threading.Lock()
+
+
+class InicializacaoGateway:
+    """
+    Mede cada etapa da subida do gateway e carrega os componentes pesados fora dela.
+
+    As etapas síncronas (ler a configuração, montar os caches...) são cronometradas com
+    `etapa`. Os componentes pesados são registrados com uma função de carga e ficam
+    `pendente` até que alguém os carregue: a thread de aquecimento (`aquecer_em_segundo_plano`)
+    ou a primeira requisição que precisar deles (`aguardar`). Cada componente é carregado
+    uma única vez, mesmo com vários pedidos simultâneos. O gateway está pronto (readiness)
+    quando todos os componentes obrigatórios estão prontos.
+    """
+
+    def __init__(self):
+        self._inicio = time.monotonic()
+        self.etapas: List[Tuple[str, float]] = []
+        self.componentes: Dict[str, Componente] = {}
+        self.aceitando_requisicoes_em: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def decorrido(self) -> float:
+        return time.monotonic() - self._inicio
+
+    @contextmanager
+    def etapa(self, nome: str):
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.etapas.append((nome, time.monotonic() - inicio))
+
+    def registrar(self, nome: str, carregar: Callable[[], object], obrigatorio: bool = True) -> Componente:
+        self.componentes[nome] = Componente(nome, carregar, obrigatorio)
+        return self.componentes[nome]
+
+    def marcar_aceitando_requisicoes(self):
+        self.aceitando_requisicoes_em = self.decorrido()
+        print(f"✅ Gateway aceitando requisições {self.aceitando_requisicoes_em:.2f}s após o início.")
+
+    def carregar(self, nome: str):
+        """Carrega o componente (bloqueante) se ainda não foi carregado; quem chegar durante a carga espera por ela."""
+        componente = self.componentes[nome]
+        tentativas = componente.tentativas
+        with componente.lock:
+            if componente.estado == ESTADO_PRONTO:
+                return componente.resultado
+            if componente.tentativas != tentativas:
+                # Outra thread acabou de tentar enquanto esta esperava: não repete uma carga que falhou
+                raise ComponenteIndisponivel(nome, componente.erro or "falha ao carregar", retry_after=30)
+            componente.estado, componente.erro = ESTADO_CARREGANDO, None
+            componente.concluido.clear()
+            inicio = time.monotonic()
+            try:
+                componente.resultado = componente.carregar()
+                componente.estado = ESTADO_PRONTO
+                return componente.resultado
+            except Exception as e:
+                componente.estado, componente.erro = ESTADO_ERRO, str(e)
+                print(f"❌ ERRO ao carregar '{nome}': {e}")
+                raise
+            finally:
+                componente.segundos = time.monotonic() - inicio
+                componente.tentativas += 1
+                componente.concluido.set()
+
+    def aquecer_em_segundo_plano(self, nomes: Iterable[str]):
+        """Carrega os componentes em ordem, um de cada vez, em uma thread que não segura a subida do servidor."""
+        nomes = list(nomes)
+
+        def aquecer():
+            for nome in nomes:
+                try:
+                    self.carregar(nome)
+                    print(f"✅ '{nome}' pronto em {self.componentes[nome].segundos:.2f}s "
+                          f"({self.decorrido():.2f}s após o início).")
+                except Exception:
+                    # O erro fica registrado no componente e aparece em /status/pronto; os demais seguem
+                    continue
+
+        self._thread = threading.Thread(target=aquecer, name="aquecimento-gateway", daemon=True)
+        self._thread.start()
+
+    async def aguardar(self, nome: str, timeout: float = ESPERA_COMPONENTE_PADRAO):
+        """
+        Devolve o componente carregado. Se ele ainda estiver pendente (modo sob demanda), a carga
+        começa agora, em uma thread; se não ficar pronto em `timeout` segundos, ou tiver falhado,
+        levanta `ComponenteIndisponivel`. Um componente que falhou não é recarregado a cada
+        requisição (ex: um GGUF que não cabe na memória).
+        """
+        componente = self.componentes[nome]
+        if componente.estado == ESTADO_PRONTO:
+            return componente.resultado
+        if componente.estado == ESTADO_PENDENTE:
+            threading.Thread(target=self._carregar_sem_erro, args=(nome,), name=f"carga-{nome}", daemon=True).start()
+        await asyncio.to_thread(componente.concluido.wait, timeout)
+        if componente.estado == ESTADO_PRONTO:
+            return componente.resultado
+        if componente.estado == ESTADO_ERRO:
+            raise ComponenteIndisponivel(nome, componente.erro or "falha ao carregar", retry_after=30)
+        raise ComponenteIndisponivel(nome, "ainda carregando")
+
+    def _carregar_sem_erro(self, nome: str):
+        # O erro já fica registrado no componente por `carregar`
+        try:
+            self.carregar(nome)
+        except Exception:
+            pass
+
+    def pronto(self) -> bool:
+        return all(c.estado == ESTADO_PRONTO for c in self.componentes.values() if c.obrigatorio)
+
+    def status(self) -> dict:
+        return {
+            "pronto": self.pronto(),
+            "segundos_desde_inicio": round(self.decorrido(), 3),
+            "aceitando_requisicoes_em": round(self.aceitando_requisicoes_em, 3) if self.aceitando_requisicoes_em is not None else None,
+            "etapas": [{"etapa": nome, "segundos": round(segundos, 3)} for nome, segundos in self.etapas],
+            "componentes": {
+                nome: {"estado": c.estado, "obrigatorio": c.obrigatorio,
+                       "segundos": round(c.segundos, 3) if c.segundos is not None else None, "erro": c.erro}
+                for nome, c in self.componentes.items()
+            }
+        }
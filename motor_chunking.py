@@ -0,0 +1,177 @@
+import re
+import hashlib
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import nltk
+
+# Motor de chunking único, usado pelo gerenciador_indices.py, chunker_customizado.py e refatorador_rag.py.
+# Trabalha sobre os offsets das sentenças (sem placeholders nem substituições no texto), em uma única
+# passada, e emite cada chunk com um ID derivado do conteúdo e a sua posição (inicio/fim) no texto.
+
+PADRAO_BLOCO_CODIGO = re.compile(r'```.*?```', re.DOTALL)
+# Quebra forte: item de lista principal (1., 2., etc.), mas não um sub-item (1.1., 2.3.1., etc.)
+PADRAO_ITEM_LISTA = re.compile(r'\s*\d+\.\s')
+TERMINADORES_PADRAO = ('.', '!', '?')
+IDIOMA_PADRAO = 'portuguese'
+
+# Garante que o 'punkt' (tokenizador de sentenças) esteja disponível.
+# NLTK >= 3.8.2 usa o pacote em formato tabular ('punkt_tab'); versões anteriores, o pickle ('punkt').
+PACOTE_PUNKT = 'punkt_tab' if hasattr(nltk.tokenize, "_get_punkt_tokenizer") else 'punkt'
+try:
+    nltk.data.find(f'tokenizers/{PACOTE_PUNKT}')
+except LookupError:
+    print(f"-> Pacote '{PACOTE_PUNKT}' do NLTK não encontrado. Baixando agora...")
+    nltk.download(PACOTE_PUNKT, quiet=True)
+    print(f"✅ Pacote '{PACOTE_PUNKT}' pronto.")
+
+
+@lru_cache(maxsize=None)
+def _tokenizador_sentencas(idioma: str):
+    if hasattr(nltk.tokenize, "_get_punkt_tokenizer"):
+        return nltk.tokenize._get_punkt_tokenizer(idioma)
+    return nltk.data.load(f'tokenizers/punkt/{idioma}.pickle')
+
+
+def aplicar_formatacao_inline(texto: str) -> str:
+    """Aplica formatação inline (`) em elementos específicos do texto."""
+    texto = re.sub(r'((?<=[\s,(])(/|./)[\w./\-_]+)', r'`\1`', texto)  # Caminhos de arquivo
+    texto = re.sub(r'(\$\w+)', r'`\1`', texto)  # Variáveis de ambiente
+    texto = re.sub(r'(\b[A-Z_]{3,}=[\w"\./\-_]+)', r'`\1`', texto)  # Constantes
+    return texto
+
+
+def transformar_fora_do_codigo(texto: str, transformar: Callable[[str], str]) -> str:
+    """Aplica `transformar` apenas aos trechos fora dos blocos de código (```), que são mantidos intactos."""
+    partes, posicao = [], 0
+    for bloco in PADRAO_BLOCO_CODIGO.finditer(texto):
+        partes.append(transformar(texto[posicao:bloco.start()]))
+        partes.append(bloco.group(0))
+        posicao = bloco.end()
+    partes.append(transformar(texto[posicao:]))
+    return "".join(partes)
+
+
+def gerar_id_chunk(conteudo: str, namespace: str = "", ocorrencia: int = 0) -> str:
+    """
+    ID estável derivado do conteúdo. Não depende da posição do chunk: editar outra parte da
+    fonte não muda o ID dos chunks que ficaram iguais. `ocorrencia` diferencia trechos
+    idênticos dentro da mesma fonte (ex: um bloco de código repetido).
+    """
+    return hashlib.sha1(f"{namespace}\x00{ocorrencia}\x00{conteudo}".encode('utf-8')).hexdigest()
+
+
+def iterar_unidades(texto: str, quebras: Sequence[re.Pattern] = (), separador: Optional[re.Pattern] = None,
+                    quebrar_em_codigo: bool = False, idioma: str = IDIOMA_PADRAO) -> Iterator[Tuple[int, int, bool, bool]]:
+    """
+    Divide o texto em unidades (inicio, fim, eh_codigo, quebra_antes), na ordem em que aparecem.
+    Blocos de código são unidades atômicas; o restante é dividido em sentenças pelo punkt.
+    `quebra_antes` indica que a unidade não pode ser agrupada com a anterior: depois de um
+    `separador` (que é descartado), antes/depois de código com `quebrar_em_codigo` e nas
+    sentenças que começam com um dos padrões de `quebras`.
+    """
+    tokenizador = _tokenizador_sentencas(idioma)
+    quebra_pendente = False
+
+    def sentencas(inicio_trecho: int, fim_trecho: int):
+        nonlocal quebra_pendente
+        trecho = texto[inicio_trecho:fim_trecho]
+        for inicio, fim in tokenizador.span_tokenize(trecho):
+            # O punkt pode incluir o espaço em branco do início do trecho na primeira sentença
+            sentenca = trecho[inicio:fim]
+            fim = inicio_trecho + inicio + len(sentenca.rstrip())
+            inicio = inicio_trecho + inicio + len(sentenca) - len(sentenca.lstrip())
+            if inicio >= fim:
+                continue
+            quebra = quebra_pendente or any(padrao.match(texto, inicio) for padrao in quebras)
+            quebra_pendente = False
+            yield (inicio, fim, False, quebra)
+
+    def trecho(inicio_trecho: int, fim_trecho: int):
+        nonlocal quebra_pendente
+        if separador is None:
+            yield from sentencas(inicio_trecho, fim_trecho)
+            return
+        posicao = inicio_trecho
+        for encontrado in separador.finditer(texto, inicio_trecho, fim_trecho):
+            yield from sentencas(posicao, encontrado.start())
+            quebra_pendente = True
+            posicao = encontrado.end()
+        yield from sentencas(posicao, fim_trecho)
+
+    posicao = 0
+    for bloco in PADRAO_BLOCO_CODIGO.finditer(texto):
+        yield from trecho(posicao, bloco.start())
+        yield (bloco.start(), bloco.end(), True, quebra_pendente or quebrar_em_codigo)
+        quebra_pendente = quebrar_em_codigo
+        posicao = bloco.end()
+    yield from trecho(posicao, len(texto))
+
+
+def segmentar(texto: str, **parametros) -> List[Tuple[int, int, bool, bool]]:
+    return list(iterar_unidades(texto, **parametros))
+
+
+def iterar_chunks(texto: str, tamanho_minimo: int = 250, sobreposicao: int = 0,
+                  quebras: Sequence[re.Pattern] = (), separador: Optional[re.Pattern] = None,
+                  terminadores: Optional[Tuple[str, ...]] = TERMINADORES_PADRAO,
+                  quebrar_em_codigo: bool = False, blocos_codigo_isolados: bool = False,
+                  namespace: str = "", idioma: str = IDIOMA_PADRAO) -> Iterator[dict]:
+    """
+    Agrupa as unidades de `iterar_unidades` em chunks de pelo menos `tamanho_minimo` caracteres,
+    fechando-os apenas em uma sentença que termine com um dos `terminadores` (None fecha em
+    qualquer sentença). As últimas `sobreposicao` sentenças de um chunk são repetidas no
+    início do seguinte, exceto após uma quebra forte. Com `blocos_codigo_isolados`, cada
+    bloco de código também é emitido como um chunk próprio, ao final.
+
+    Gera {"id", "texto", "inicio", "fim"}, onde texto == texto_original[inicio:fim], à medida
+    que cada chunk fecha. O custo é linear no tamanho do texto e a memória se limita às
+    unidades do chunk em construção: só as `sobreposicao` unidades carregadas são
+    revisitadas ao abrir o chunk seguinte.
+    """
+    ocorrencias: Dict[bytes, int] = {}
+    blocos_codigo = []
+
+    def emitir(inicio: int, fim: int) -> dict:
+        conteudo = texto[inicio:fim]
+        # A chave é o digest, e não o texto, para não guardar uma segunda cópia de cada chunk
+        chave = hashlib.sha1(conteudo.encode('utf-8')).digest()
+        ocorrencia = ocorrencias.get(chave, 0)
+        ocorrencias[chave] = ocorrencia + 1
+        return {"id": gerar_id_chunk(conteudo, namespace, ocorrencia), "texto": conteudo, "inicio": inicio, "fim": fim}
+
+    atual = deque()         # Unidades (inicio, fim) do chunk em construção
+    novas = 0               # Quantas delas ainda não entraram em nenhum chunk
+    tamanho = 0
+    for inicio, fim, eh_codigo, quebra in iterar_unidades(texto, quebras, separador, quebrar_em_codigo, idioma):
+        if eh_codigo and blocos_codigo_isolados:
+            blocos_codigo.append((inicio, fim))
+        if quebra and atual:
+            # Só fecha se o chunk tiver algo além da sobreposição herdada do anterior
+            if novas:
+                yield emitir(atual[0][0], atual[-1][1])
+            atual.clear()
+            novas, tamanho = 0, 0
+        atual.append((inicio, fim))
+        novas += 1
+        tamanho += fim - inicio
+        pode_fechar = eh_codigo or not terminadores or texto[fim - 1] in terminadores
+        if tamanho >= tamanho_minimo and pode_fechar:
+            yield emitir(atual[0][0], fim)
+            # Mantém as últimas `sobreposicao` unidades (sempre descartando ao menos a primeira)
+            manter = min(sobreposicao, len(atual) - 1)
+            while len(atual) > manter:
+                atual.popleft()
+            novas = 0
+            tamanho = sum(f - i for i, f in atual)
+
+    if novas:
+        yield emitir(atual[0][0], atual[-1][1])
+    for inicio, fim in blocos_codigo:
+        yield emitir(inicio, fim)
+
+
+def chunkificar(texto: str, **parametros) -> List[dict]:
+    """Versão em lista de `iterar_chunks`; retorna [{"id", "texto", "inicio", "fim"}]."""
+    return list(iterar_chunks(texto, **parametros))
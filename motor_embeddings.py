@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+TAMANHO_LOTE_PADRAO = 64
+# Abaixo desta quantidade de textos não compensa distribuir o trabalho entre processos
+MINIMO_TEXTOS_MULTIPROCESSO = 256
+
+
+class MotorEmbeddings(Embeddings):
+    """
+    Motor de embeddings com controle explícito de lote e paralelismo.
+
+    - Os textos são ordenados por tamanho antes de formar os lotes, para que cada lote
+      tenha sequências de comprimento parecido e desperdice menos com padding.
+    - Com `processos > 1` um pool de processos (um por núcleo) divide os lotes entre si.
+    - Cada chamada registra a vazão em chunks/s (ver `resumo`); com `verboso=True` ela
+      também é impressa a cada chamada.
+    - Pode ser compartilhado entre threads (ex: vários contextos indexados em lote): as
+      chamadas ao modelo são serializadas, já que cada uma usa todos os núcleos.
+    - Com `carregar_agora=False` o modelo só é carregado no primeiro uso (ou em
+      `carregar_modelo`), para que o gateway suba sem esperar por ele.
+    """
+
+    def __init__(self, nome_modelo: str, tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                 processos: int = 1, dispositivo: Optional[str] = None, verboso: bool = True,
+                 carregar_agora: bool = True):
+        self.nome_modelo = nome_modelo
+        self.verboso = verboso
+        self.tamanho_lote = tamanho_lote
+        # processos = 0 significa "usar todos os núcleos disponíveis"
+        self.processos = processos if processos > 0 else (os.cpu_count() or 1)
+        self.dispositivo = dispositivo
+        self._modelo = None
+        self._lock_carga = threading.Lock()
+        self._pool = None
+        self._lock = threading.Lock()
+        self.total_textos = 0
+        self.total_segundos = 0.0
+        if carregar_agora:
+            self.carregar_modelo()
+
+    def carregar_modelo(self):
+        """Carrega o SentenceTransformer uma única vez, mesmo que várias threads peçam ao mesmo tempo."""
+        with self._lock_carga:
+            if self._modelo is None:
+                # Importado aqui: adiar a carga do modelo também adia o import (lento) do torch
+                from sentence_transformers import SentenceTransformer
+                self._modelo = SentenceTransformer(self.nome_modelo, device=self.dispositivo)
+        return self._modelo
+
+    @property
+    def modelo(self):
+        return self._modelo if self._modelo is not None else self.carregar_modelo()
+
+    def _obter_pool(self):
+        if self._pool is None:
+            print(f"  -> Iniciando pool de {self.processos} processos para embeddings...")
+            self._pool = self.modelo.start_multi_process_pool(target_devices=["cpu"] * self.processos)
+        return self._pool
+
+    def encerrar(self):
+        if self._pool is not None:
+            self.modelo.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        ordem = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        ordenados = [texts[i] for i in ordem]
+
+        with self._lock:
+            inicio = time.perf_counter()
+            if self.processos > 1 and len(texts) >= MINIMO_TEXTOS_MULTIPROCESSO:
+                vetores_ordenados = self.modelo.encode_multi_process(
+                    ordenados, self._obter_pool(), batch_size=self.tamanho_lote,
+                    chunk_size=max(self.tamanho_lote, len(ordenados) // (self.processos * 4))
+                )
+            else:
+                vetores_ordenados = self.modelo.encode(ordenados, batch_size=self.tamanho_lote, show_progress_bar=False)
+            decorrido = time.perf_counter() - inicio
+            self.total_textos += len(texts)
+            self.total_segundos += decorrido
+
+        vetores: List[Optional[List[float]]] = [None] * len(texts)
+        for posicao, indice_original in enumerate(ordem):
+            vetores[indice_original] = vetores_ordenados[posicao].tolist()
+
+        if self.verboso:
+            print(f"    -> {len(texts)} chunks embutidos em {decorrido:.2f}s ({len(texts) / max(decorrido, 1e-9):.1f} chunks/s)")
+        return vetores
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            return self.modelo.encode([text], show_progress_bar=False)[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Várias perguntas em um único forward (usado pelo micro-batching do gateway); não entra na vazão de chunks."""
+        with self._lock:
+            vetores = self.modelo.encode(texts, batch_size=len(texts), show_progress_bar=False)
+        return [vetor.tolist() for vetor in vetores]
+
+    def resumo(self) -> str:
+        if not self.total_textos:
+            return "nenhum chunk embutido"
+        vazao = self.total_textos / max(self.total_segundos, 1e-9)
+        return (f"{self.total_textos} chunks em {self.total_segundos:.2f}s ({vazao:.1f} chunks/s, "
+                f"lote={self.tamanho_lote}, processos={self.processos})")
@@ -1,89 +1,30 @@
 import os
 import re
-import nltk
 import sys
 
+from motor_chunking import chunkificar, aplicar_formatacao_inline, transformar_fora_do_codigo, PADRAO_ITEM_LISTA
+
 # --- Nova Constante Configurável ---
 # Defina aqui o número mínimo de caracteres que um chunk deve ter.
 # Ajuste este valor conforme sua necessidade.
 TAMANHO_MINIMO_CHUNK = 300
+# Blocos separados por '###' nunca são agrupados no mesmo chunk
+SEPARADOR_BLOCOS = re.compile(r'###')
 
-# --- Configuração Inicial do NLTK ---
-try:
-    nltk.data.find('tokenizers/punkt')
-except nltk.downloader.DownloadError:
-    print("Baixando o pacote 'punkt' do NLTK (necessário para análise de sentenças)...")
-    nltk.download('punkt')
-    print("Download concluído.")
-
-def aplicar_formatacao_inline(texto):
-    """Aplica formatação inline (`) em elementos específicos do texto."""
-    texto = re.sub(r'((?<=[\s,(])(/|./)[\w./\-_]+)', r'`\1`', texto)
-    texto = re.sub(r'(\$\w+)', r'`\1`', texto)
-    texto = re.sub(r'(\b[A-Z_]{3,}=[\w"\./\-_]+)', r'`\1`', texto)
-    return texto
-
-def chunkificar_bloco(bloco_texto):
+def chunkificar_texto(texto):
     """
-    Aplica as regras de chunking com a nova lógica de acumulação
-    para garantir um tamanho mínimo por chunk.
+    Aplica as regras de chunking: acumula sentenças até o tamanho mínimo, fechando o
+    chunk em um ponto final, e força uma "Quebra Forte" em cada item de lista principal
+    (1., 2., etc.) e em cada separador '###'.
     """
-    bloco_texto = aplicar_formatacao_inline(bloco_texto.strip())
-    if not bloco_texto:
-        return []
-
-    try:
-        sentencas = nltk.sent_tokenize(bloco_texto, language='portuguese')
-    except LookupError:
-        print("Pacote 'punkt' do NLTK parece estar faltando ou incompleto. Baixando/Verificando...")
-        nltk.download('punkt')
-        print("Download concluído. Tentando tokenizar novamente...")
-        sentencas = nltk.sent_tokenize(bloco_texto, language='portuguese')
-    except Exception as e:
-        print(f"Erro ao tokenizar sentenças, tratando o bloco como um todo: {e}")
-        sentencas = [s for s in bloco_texto.split('\n') if s]
-
-    chunks_finais = []
-    chunk_temporario = []
-    char_count_temporario = 0
-
-    for i, sentenca in enumerate(sentencas):
-        sentenca_strip = sentenca.strip()
-        
-        # Define o que é uma "Quebra Forte": um item de lista principal (1., 2., etc.)
-        # mas não um sub-item (1.1., 2.3.1., etc.).
-        # Se encontrarmos uma quebra forte e o chunk atual não estiver vazio, forçamos o fechamento.
-        is_hard_break = re.match(r'^\s*\d+\.\s', sentenca_strip) and not re.match(r'^\s*\d+\.\d+', sentenca_strip)
+    texto = transformar_fora_do_codigo(texto, aplicar_formatacao_inline)
+    chunks = chunkificar(texto, tamanho_minimo=TAMANHO_MINIMO_CHUNK, quebras=[PADRAO_ITEM_LISTA],
+                         separador=SEPARADOR_BLOCOS, terminadores=('.',))
+    return [chunk["texto"] for chunk in chunks]
 
-        if is_hard_break and chunk_temporario:
-            chunks_finais.append(" ".join(chunk_temporario).strip())
-            chunk_temporario = []
-            char_count_temporario = 0
-
-        # Acumula a sentença atual
-        chunk_temporario.append(sentenca)
-        char_count_temporario += len(sentenca)
-
-        # Verifica se o chunk atingiu o tamanho e pode ser fechado
-        # Condições: (Tamanho > Mínimo E termina com ".") OU (é a última sentença do bloco)
-        is_last_sentence = (i == len(sentencas) - 1)
-        ends_with_period = sentenca_strip.endswith('.')
-
-        if (char_count_temporario >= TAMANHO_MINIMO_CHUNK and ends_with_period) or is_last_sentence:
-            if chunk_temporario:
-                chunks_finais.append(" ".join(chunk_temporario).strip())
-                chunk_temporario = []
-                char_count_temporario = 0
-
-    # Fallback para blocos que não foram chunkificados pelas regras principais
-    if not chunks_finais and bloco_texto:
-         print("Nenhuma regra de chunking aplicada. Usando fallback da Regra 6 (a cada 10 linhas).")
-         linhas = bloco_texto.strip().split('\n')
-         for i in range(0, len(linhas), 10):
-             pedaco = "\n".join(linhas[i:i+10])
-             chunks_finais.append(pedaco)
-
-    return chunks_finais
+def chunkificar_bloco(bloco_texto):
+    """Chunking de um único bloco de texto (mantido para quem já importava esta função)."""
+    return chunkificar_texto(bloco_texto.strip())
 
 
 def processar_arquivo(caminho_arquivo):
@@ -96,28 +37,9 @@ def processar_arquivo(caminho_arquivo):
         print(f"ERRO: Arquivo '{caminho_arquivo}' não encontrado.")
         return
 
-    code_blocks = re.findall(r'(```.*?```)', conteudo, re.DOTALL)
-    placeholders = []
-    for i, block in enumerate(code_blocks):
-        placeholder = f"__CODE_BLOCK_PLACEHOLDER_{i}__"
-        placeholders.append(placeholder)
-        conteudo = conteudo.replace(block, placeholder, 1)
-
-    blocos_iniciais = conteudo.split('###')
-    chunks_processados = []
-    
-    for bloco in blocos_iniciais:
-        bloco = bloco.strip()
-        if not bloco:
-            continue
-        novos_chunks = chunkificar_bloco(bloco)
-        chunks_processados.extend(novos_chunks)
-
+    chunks_processados = chunkificar_texto(conteudo)
     conteudo_final = '\n\n###\n\n'.join(chunks_processados)
 
-    for i, placeholder in enumerate(placeholders):
-        conteudo_final = conteudo_final.replace(placeholder, code_blocks[i], 1)
-        
     base, ext = os.path.splitext(caminho_arquivo)
     caminho_saida = f"{base}_refatorado.txt"
     
@@ -0,0 +1,321 @@
+import os
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from armazenamento_indice import IndiceMmap, detectar_formato, FORMATO_MMAP, ARQUIVO_INFO_MMAP
+from indice_bm25 import IndiceBM25, ARQUIVO_BM25
+
+PASTA_BASE_INDICES = "indices_rag"
+NOME_MODELO_EMBEDDINGS = "all-MiniLM-L6-v2"
+
+# Cada criação/atualização grava uma versão nova em `indices_rag/<contexto>/versoes/<versao>/`
+# e só então troca o ponteiro `ATUAL` (um os.replace atômico). Quem lê nunca vê um índice pela metade.
+PASTA_VERSOES = "versoes"
+ARQUIVO_VERSAO_ATUAL = "ATUAL"
+# Arquivo criado dentro de uma versão no momento em que ela deixa de ser a atual
+ARQUIVO_SUBSTITUIDA = "SUBSTITUIDA"
+# Uma versão substituída continua no disco por este tempo: o gateway leva até um intervalo de
+# monitoramento para perceber a troca, mais o carregamento, e as buscas em andamento seguem na antiga
+TEMPO_RETENCAO_VERSOES = 600.0
+INTERVALO_MONITORAMENTO_PADRAO = 5.0  # Segundos entre duas verificações de `indices_rag/` no gateway
+
+
+def ler_versao_atual(pasta_contexto: str) -> Optional[str]:
+    try:
+        with open(os.path.join(pasta_contexto, ARQUIVO_VERSAO_ATUAL), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolver_pasta_indice(pasta_contexto: str) -> str:
+    """Pasta da versão publicada do índice; no layout antigo (sem `ATUAL`), a própria pasta do contexto."""
+    versao = ler_versao_atual(pasta_contexto)
+    if versao is None:
+        return pasta_contexto
+    return os.path.join(pasta_contexto, PASTA_VERSOES, versao)
+
+
+def nova_pasta_versao(pasta_contexto: str) -> str:
+    versao = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    pasta_versao = os.path.join(pasta_contexto, PASTA_VERSOES, versao)
+    os.makedirs(pasta_versao)
+    return pasta_versao
+
+
+def publicar_versao(pasta_contexto: str, pasta_versao: str, retencao_segundos: float = TEMPO_RETENCAO_VERSOES):
+    """
+    Torna `pasta_versao` a versão atual do contexto trocando o ponteiro `ATUAL` de forma
+    atômica, marca a versão anterior como substituída e remove as que foram substituídas
+    há mais de `retencao_segundos` (além dos arquivos de um índice ainda no layout antigo,
+    direto na pasta do contexto).
+    """
+    anterior = ler_versao_atual(pasta_contexto)
+    caminho = os.path.join(pasta_contexto, ARQUIVO_VERSAO_ATUAL)
+    with open(caminho + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(pasta_versao))
+    os.replace(caminho + ".tmp", caminho)
+    pasta_versoes = os.path.join(pasta_contexto, PASTA_VERSOES)
+    if anterior not in (None, os.path.basename(pasta_versao)) and os.path.isdir(os.path.join(pasta_versoes, anterior)):
+        open(os.path.join(pasta_versoes, anterior, ARQUIVO_SUBSTITUIDA), 'w').close()
+    for nome in os.listdir(pasta_contexto):
+        if nome not in (ARQUIVO_VERSAO_ATUAL, PASTA_VERSOES) and os.path.isfile(os.path.join(pasta_contexto, nome)):
+            os.remove(os.path.join(pasta_contexto, nome))
+    podar_versoes(pasta_contexto, retencao_segundos)
+
+
+def podar_versoes(pasta_contexto: str, retencao_segundos: float = TEMPO_RETENCAO_VERSOES) -> List[str]:
+    """
+    Remove as versões substituídas há mais de `retencao_segundos`. A versão atual e as que
+    ainda estão sendo gravadas (sem a marca de substituída) nunca são removidas. Retorna as
+    versões removidas.
+    """
+    pasta_versoes = os.path.join(pasta_contexto, PASTA_VERSOES)
+    if not os.path.isdir(pasta_versoes):
+        return []
+    atual = ler_versao_atual(pasta_contexto)
+    agora = time.time()
+    removidas = []
+    for nome in sorted(os.listdir(pasta_versoes)):
+        try:
+            substituida_em = os.stat(os.path.join(pasta_versoes, nome, ARQUIVO_SUBSTITUIDA)).st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        if nome != atual and agora - substituida_em >= retencao_segundos:
+            shutil.rmtree(os.path.join(pasta_versoes, nome), ignore_errors=True)
+            removidas.append(nome)
+    return removidas
+
+
+def assinatura_indice(pasta_contexto: str) -> Optional[str]:
+    """
+    Identifica a versão publicada de um contexto (None se não houver índice): o nome da
+    versão apontada por `ATUAL` ou, no layout antigo, as datas de modificação dos arquivos.
+    """
+    versao = ler_versao_atual(pasta_contexto)
+    if versao is not None:
+        return versao if detectar_formato(resolver_pasta_indice(pasta_contexto)) is not None else None
+    if detectar_formato(pasta_contexto) is None:
+        return None
+    datas = []
+    for nome in (ARQUIVO_INFO_MMAP, "index.faiss", ARQUIVO_BM25):
+        try:
+            datas.append(str(os.stat(os.path.join(pasta_contexto, nome)).st_mtime_ns))
+        except FileNotFoundError:
+            datas.append("-")
+    return "legado:" + ":".join(datas)
+
+
+def listar_contextos_indexados(pasta_base: str = PASTA_BASE_INDICES) -> List[str]:
+    """Retorna os IDs de contexto que possuem um índice salvo em `indices_rag/<contexto>/` (FAISS ou mmap)."""
+    if not os.path.isdir(pasta_base):
+        return []
+    return sorted(
+        nome for nome in os.listdir(pasta_base)
+        if detectar_formato(resolver_pasta_indice(os.path.join(pasta_base, nome))) is not None
+    )
+
+
+def carregar_indice(pasta_indice: str, embeddings: Embeddings) -> Union[FAISS, IndiceMmap]:
+    # O formato mmap é aberto sem desserializar nada; o FAISS do LangChain depende do pickle em index.pkl
+    if detectar_formato(pasta_indice) == FORMATO_MMAP:
+        return IndiceMmap(pasta_indice)
+    return FAISS.load_local(pasta_indice, embeddings, allow_dangerous_deserialization=True)
+
+
+def documentos_por_ids(indice: Union[FAISS, IndiceMmap], ids: List[str]) -> Dict[str, Document]:
+    if isinstance(indice, IndiceMmap):
+        return indice.documentos_por_ids(ids)
+    encontrados = {}
+    for id_chunk in ids:
+        documento = indice.docstore.search(id_chunk)
+        # O InMemoryDocstore devolve uma string de erro quando o id não existe
+        if isinstance(documento, Document):
+            encontrados[id_chunk] = documento
+    return encontrados
+
+
+class VersaoIndice:
+    """
+    Uma versão carregada do índice de um contexto (vetorial + BM25). `referencias` conta as
+    buscas em andamento que a usam: uma versão substituída só é fechada quando a última
+    delas termina.
+    """
+
+    def __init__(self, id_contexto: str, assinatura: str, indice: Union[FAISS, IndiceMmap],
+                 indice_bm25: Optional[IndiceBM25]):
+        self.id_contexto = id_contexto
+        self.assinatura = assinatura
+        self.indice = indice
+        self.indice_bm25 = indice_bm25
+        self.carregada_em = datetime.now().isoformat(timespec='seconds')
+        self.referencias = 0
+        self.aposentada = False
+
+    def fechar(self):
+        if isinstance(self.indice, IndiceMmap):
+            self.indice.fechar()
+        if self.indice_bm25 is not None:
+            self.indice_bm25.fechar()
+
+
+class RepositorioIndices:
+    """
+    Mantém em memória os índices de todos os contextos, compartilhados por todas as
+    requisições do gateway. Com `iniciar_monitoramento`, uma thread verifica
+    `indices_rag/` periodicamente e carrega em segundo plano os índices novos ou
+    recriados, trocando cada um de forma atômica: as buscas em andamento terminam na
+    versão antiga (adquirida com `usar`) e as novas já usam a versão recarregada.
+    """
+
+    def __init__(self, embeddings: Embeddings, pasta_base: str = PASTA_BASE_INDICES):
+        self.embeddings = embeddings
+        self.pasta_base = pasta_base
+        self._versoes: Dict[str, VersaoIndice] = {}
+        self._lock = threading.Lock()
+        # Serializa as sincronizações (a da inicialização e as da thread de monitoramento)
+        self._lock_sincronizacao = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recargas = 0
+
+    def _carregar_versao(self, id_contexto: str, assinatura: str) -> VersaoIndice:
+        pasta_indice = resolver_pasta_indice(os.path.join(self.pasta_base, id_contexto))
+        indice = carregar_indice(pasta_indice, self.embeddings)
+        indice_bm25 = IndiceBM25.carregar(pasta_indice)
+        if indice_bm25 is None:
+            print(f"   ⚠️ AVISO: '{id_contexto}' não tem índice BM25; a busca será apenas vetorial (rode '--acao atualizar' para criá-lo).")
+        return VersaoIndice(id_contexto, assinatura, indice, indice_bm25)
+
+    def _trocar(self, id_contexto: str, nova: Optional[VersaoIndice]):
+        with self._lock:
+            antiga = self._versoes.pop(id_contexto, None)
+            if nova is not None:
+                self._versoes[id_contexto] = nova
+            if antiga is None:
+                return
+            antiga.aposentada = True
+            ociosa = antiga.referencias == 0
+        if ociosa:
+            antiga.fechar()
+
+    def sincronizar(self) -> List[str]:
+        """
+        Compara `indices_rag/` com as versões carregadas: carrega os contextos novos ou
+        alterados (fora do lock, sem bloquear as buscas) e descarta os que foram deletados.
+        Retorna os contextos que mudaram.
+        """
+        with self._lock_sincronizacao:
+            nomes = os.listdir(self.pasta_base) if os.path.isdir(self.pasta_base) else []
+            no_disco = {}
+            for nome in nomes:
+                assinatura = assinatura_indice(os.path.join(self.pasta_base, nome))
+                if assinatura is not None:
+                    no_disco[nome] = assinatura
+            with self._lock:
+                carregadas = {id_contexto: versao.assinatura for id_contexto, versao in self._versoes.items()}
+            alterados = []
+            for id_contexto in sorted(no_disco):
+                if carregadas.get(id_contexto) == no_disco[id_contexto]:
+                    continue
+                acao = "Recarregando" if id_contexto in carregadas else "Carregando"
+                print(f"-> {acao} índice RAG do contexto '{id_contexto}'...")
+                try:
+                    nova = self._carregar_versao(id_contexto, no_disco[id_contexto])
+                except Exception as e:
+                    # Um índice que não abre (ex: ainda sendo gravado no layout antigo) não derruba a versão em uso
+                    print(f"❌ ERRO ao carregar o índice '{id_contexto}': {e}")
+                    continue
+                self._trocar(id_contexto, nova)
+                alterados.append(id_contexto)
+            for id_contexto in sorted(set(carregadas) - set(no_disco)):
+                print(f"-> Índice RAG do contexto '{id_contexto}' removido do disco. Descarregando...")
+                self._trocar(id_contexto, None)
+                alterados.append(id_contexto)
+            return alterados
+
+    def carregar_todos(self):
+        self.sincronizar()
+        print(f"✅ {len(self.contextos())} índice(s) RAG carregado(s): {self.contextos()}")
+
+    def iniciar_monitoramento(self, intervalo_segundos: float = INTERVALO_MONITORAMENTO_PADRAO):
+        if self._thread is not None:
+            return
+        self._parar.clear()
+
+        def monitorar():
+            while not self._parar.wait(intervalo_segundos):
+                try:
+                    alterados = self.sincronizar()
+                except Exception as e:
+                    print(f"❌ ERRO ao verificar a pasta de índices '{self.pasta_base}': {e}")
+                    continue
+                if alterados:
+                    self.recargas += len(alterados)
+                    print(f"✅ Índices RAG atualizados sem reiniciar o servidor: {alterados}")
+
+        self._thread = threading.Thread(target=monitorar, name="monitor-indices", daemon=True)
+        self._thread.start()
+
+    def parar_monitoramento(self):
+        if self._thread is None:
+            return
+        self._parar.set()
+        self._thread.join()
+        self._thread = None
+
+    @contextmanager
+    def usar(self, ids_contextos: Iterable[str]) -> Iterator[Dict[str, VersaoIndice]]:
+        """
+        Adquire a versão atual de cada contexto pedido (os que não estão carregados ficam de
+        fora) e a mantém aberta até o fim do bloco, mesmo que ela seja substituída no meio.
+        """
+        with self._lock:
+            versoes = {id_contexto: self._versoes[id_contexto] for id_contexto in ids_contextos if id_contexto in self._versoes}
+            for versao in versoes.values():
+                versao.referencias += 1
+        try:
+            yield versoes
+        finally:
+            ociosas = []
+            with self._lock:
+                for versao in versoes.values():
+                    versao.referencias -= 1
+                    if versao.aposentada and versao.referencias == 0:
+                        ociosas.append(versao)
+            for versao in ociosas:
+                versao.fechar()
+
+    def obter(self, id_contexto: str) -> Optional[Union[FAISS, IndiceMmap]]:
+        with self._lock:
+            versao = self._versoes.get(id_contexto)
+            return versao.indice if versao else None
+
+    def obter_bm25(self, id_contexto: str) -> Optional[IndiceBM25]:
+        with self._lock:
+            versao = self._versoes.get(id_contexto)
+            return versao.indice_bm25 if versao else None
+
+    def contextos(self) -> List[str]:
+        with self._lock:
+            return sorted(self._versoes)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "monitorando": self._thread is not None,
+                "recargas": self.recargas,
+                "contextos": {
+                    id_contexto: {"versao": versao.assinatura, "carregada_em": versao.carregada_em,
+                                  "buscas_em_andamento": versao.referencias}
+                    for id_contexto, versao in sorted(self._versoes.items())
+                }
+            }
@@ -1,11 +1,50 @@
 import os
+import sys
 import json
 import asyncio
 import httpx
+import hashlib
+import importlib.util
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+# Fila/agendador por modelo local (llama.cpp não é thread-safe)
+from agendador_local import AgendadorModeloLocal, FilaCheia, CAPACIDADE_FILA_PADRAO, TEMPO_MAXIMO_GERACAO
+
+# Cache de respostas (exato e por similaridade de perguntas)
+from cache_respostas import CacheRespostas, CAPACIDADE_PADRAO, TTL_PADRAO_SEGUNDOS, INTERVALO_SALVAMENTO_PADRAO
+
+# Compressão extrativa (sem LLM) como alternativa ao sumarizador
+from compressor_extrativo import (comprimir_contexto, ORCAMENTO_TOKENS_PADRAO, LIMIAR_DUPLICATA_PADRAO, SCORE_MINIMO_PADRAO,
+                                  RESPOSTA_CONTEXTO_INSUFICIENTE)
+
+# Montagem do contexto dentro da janela de tokens do modelo de destino
+from construtor_contexto import criar_contador_tokens, construir_contexto, dividir_em_pedacos, ranquear_por_similaridade
+
+# Análise de documentos em map-reduce (janelas mapeadas em paralelo e respostas parciais reduzidas)
+from analisador_documentos import (RepositorioDocumentos, dividir_em_janelas, mapear_janelas, parcial_relevante,
+                                   agrupar_parciais, CAMINHO_CACHE_MAPEAMENTO, CONCORRENCIA_PADRAO,
+                                   TAMANHO_MAXIMO_JANELA_TOKENS, SOBREPOSICAO_PEDACOS_PADRAO, MAX_RODADAS_REDUCAO,
+                                   CAPACIDADE_DOCUMENTOS_BYTES, TTL_DOCUMENTOS_SEGUNDOS)
+
+# Recuperação RAG residente no gateway
+from motor_embeddings import MotorEmbeddings
+from codificador_consultas import CodificadorConsultas, CAPACIDADE_CACHE_PADRAO, JANELA_MS_PADRAO, TAMANHO_MAXIMO_LOTE_PADRAO
+from repositorio_indices import (RepositorioIndices, VersaoIndice, NOME_MODELO_EMBEDDINGS, INTERVALO_MONITORAMENTO_PADRAO,
+                                 documentos_por_ids)
+
+# Busca híbrida: BM25 + vetorial, fundidas por reciprocal rank fusion
+from indice_bm25 import fundir_rrf
+
+# Subida rápida: etapas cronometradas e componentes pesados carregados em segundo plano ou sob demanda
+from inicializacao_gateway import (InicializacaoGateway, ComponenteIndisponivel, MODOS_CARREGAMENTO, CARREGAMENTO_IMEDIATO,
+                                   CARREGAMENTO_SEGUNDO_PLANO, CARREGAMENTO_SOB_DEMANDA, ESPERA_COMPONENTE_PADRAO)
+
 try:
     from llama_cpp import Llama
 except ImportError:
@@ -81,45 +120,233 @@ def configurar_servicos_interativamente():
     print(f"Acessar a interface em outro terminal com o comando ./chat.sh.")
     return True
 
-if not configurar_servicos_interativamente():
-    exit()
+# --- INICIALIZAÇÃO (INTERATIVA OU HEADLESS) ---
+
+inicializacao = InicializacaoGateway()
+# 'interativo' pergunta os serviços no terminal; 'headless' usa só o config_modelo_local.json e as variáveis
+# de ambiente (containers, health checks). Sem GATEWAY_MODO_INICIO, é interativo apenas com um terminal anexado.
+MODO_INICIO = os.getenv("GATEWAY_MODO_INICIO") or ("interativo" if sys.stdin.isatty() else "headless")
+CHAVES_SERVICO_AMBIENTE = ("tipo", "path_gguf", "id_openrouter")
+PREFIXO_MODELO_LOCAL = "modelo_local:"
+
+def aplicar_variaveis_ambiente(config: dict):
+    """
+    Sobrepõe a configuração lida do arquivo, sem alterá-lo: GATEWAY_<SERVICO>_<CHAVE> para cada serviço
+    (ex: GATEWAY_GERADOR_PRINCIPAL_TIPO=nuvem, GATEWAY_SUMARIZADOR_PATH_GGUF=/modelos/x.gguf) e
+    GATEWAY_CARREGAMENTO_MODELOS para o modo de carregamento.
+    """
+    for service_name, service_config in config.get("servicos", {}).items():
+        for chave in CHAVES_SERVICO_AMBIENTE:
+            valor = os.getenv(f"GATEWAY_{service_name.upper()}_{chave.upper()}")
+            if valor:
+                service_config[chave] = valor
+    if os.getenv("GATEWAY_CARREGAMENTO_MODELOS"):
+        config.setdefault("inicializacao", {})["carregamento_modelos"] = os.getenv("GATEWAY_CARREGAMENTO_MODELOS")
+
+if MODO_INICIO == "interativo":
+    with inicializacao.etapa("configuracao_interativa"):
+        if not configurar_servicos_interativamente():
+            exit()
+else:
+    print("-> Modo headless: usando 'config_modelo_local.json' e as variáveis de ambiente, sem perguntas.")
 
 class PromptRequest(BaseModel): prompt: str
 class RagRequest(BaseModel):
+    contexto: str = ""
+    pergunta: str
+    # 'llm' usa o serviço sumarizador; 'extrativo' seleciona sentenças com embeddings, sem LLM
+    modo_resumo: str = "llm"
+    # Opcional: o contexto já dividido em chunks, em ordem de relevância
+    chunks: Optional[List[str]] = None
+class BuscaRequest(BaseModel):
+    # ID do contexto, ou '*' para buscar em todos os índices carregados
+    contexto: str
+    pergunta: str
+    k: int = 8
+    # 'hibrido' (BM25 + vetorial), 'vetorial' ou 'bm25'
+    modo_busca: str = "hibrido"
+class RagCompletoRequest(BaseModel):
     contexto: str
     pergunta: str
+    k: int = 8
+    modo_busca: str = "hibrido"
+    usar_resumo: bool = False
+    modo_resumo: str = "llm"
+class DocumentoRequest(BaseModel):
+    nome: str
+    texto: str
+class AnaliseDocumentosRequest(BaseModel):
+    ids_documentos: List[str]
+    pergunta: str
 # O PdfAnalysisRequest não é mais necessário
 
 print("\n-> Iniciando o Servidor Gateway...")
-with open("config_modelo_local.json", 'r', encoding='utf-8') as f: CONFIG = json.load(f)
-with open("prompts.json", 'r', encoding='utf-8') as f: PROMPTS_CONFIG = json.load(f)
+with inicializacao.etapa("configuracao"):
+    with open("config_modelo_local.json", 'r', encoding='utf-8') as f: CONFIG = json.load(f)
+    with open("prompts.json", 'r', encoding='utf-8') as f: PROMPTS_CONFIG = json.load(f)
+    # Lido antes das sobreposições, para que as variáveis GATEWAY_* também possam vir do .env
+    load_dotenv()
+    aplicar_variaveis_ambiente(CONFIG)
+config_inicializacao = CONFIG.get("inicializacao", {})
+MODO_CARREGAMENTO = config_inicializacao.get("carregamento_modelos", CARREGAMENTO_SEGUNDO_PLANO)
+if MODO_CARREGAMENTO not in MODOS_CARREGAMENTO:
+    print(f"⚠️ AVISO: carregamento_modelos inválido: '{MODO_CARREGAMENTO}'. Usando '{CARREGAMENTO_SEGUNDO_PLANO}'.")
+    MODO_CARREGAMENTO = CARREGAMENTO_SEGUNDO_PLANO
+ESPERA_COMPONENTE = config_inicializacao.get("espera_componente_segundos", ESPERA_COMPONENTE_PADRAO)
+
+# Preenchidos à medida que cada modelo local termina de carregar
 loaded_local_models = {}
+agendadores_locais = {}
+
+def carregar_modelo_local(service_name: str, model_path: str) -> AgendadorModeloLocal:
+    print(f"-> Carregando modelo local para o serviço '{service_name}': {os.path.basename(model_path)}")
+    params = CONFIG.get("parametros_carregamento_local", {})
+    modelo = Llama(model_path=model_path, **params, verbose=False)
+    # Cada modelo local é atendido por um agendador próprio (fila FIFO limitada + uma thread de geração)
+    agendadores_locais[service_name] = AgendadorModeloLocal(
+        service_name, modelo, CONFIG.get("parametros_inferencia_padrao", {}),
+        capacidade_fila=CONFIG.get("agendador_local", {}).get("capacidade_fila", CAPACIDADE_FILA_PADRAO)
+    )
+    loaded_local_models[service_name] = modelo
+    print(f"✅ Modelo para '{service_name}' carregado.")
+    return agendadores_locais[service_name]
 
+# Índices RAG carregados uma única vez e compartilhados por todos os clientes. O modelo de embeddings
+# só é lido do disco no aquecimento (ou no primeiro uso), junto com os índices.
+embeddings_busca = MotorEmbeddings(NOME_MODELO_EMBEDDINGS, verboso=False, carregar_agora=False)
+repositorio_indices = RepositorioIndices(embeddings_busca)
+inicializacao.registrar("modelo_embeddings", embeddings_busca.carregar_modelo)
+inicializacao.registrar("indices_rag", repositorio_indices.carregar_todos)
+
+# Modelos locais por último: o aquecimento segue essa ordem, e a busca não deve esperar por um GGUF de vários GB
 if Llama:
     for service_name, service_config in CONFIG.get("servicos", {}).items():
         if service_config.get("tipo") == "local":
             model_path = service_config.get("path_gguf")
             if model_path and os.path.exists(model_path):
-                print(f"-> Carregando modelo local para o serviço '{service_name}': {os.path.basename(model_path)}")
-                params = CONFIG.get("parametros_carregamento_local", {})
-                loaded_local_models[service_name] = Llama(model_path=model_path, **params, verbose=False)
-                print(f"✅ Modelo para '{service_name}' carregado.")
+                # No modo sob demanda o gateway fica pronto sem eles; o primeiro uso dispara a carga
+                inicializacao.registrar(PREFIXO_MODELO_LOCAL + service_name, partial(carregar_modelo_local, service_name, model_path),
+                                        obrigatorio=MODO_CARREGAMENTO != CARREGAMENTO_SOB_DEMANDA)
+            else:
+                print(f"⚠️ AVISO: Modelo do serviço '{service_name}' não encontrado em '{model_path}'.")
+
+# Perguntas: cache LRU + micro-batching das requisições simultâneas em um único forward
+config_codificador = CONFIG.get("codificador_consultas", {})
+codificador_consultas = CodificadorConsultas(
+    embeddings_busca,
+    capacidade_cache=config_codificador.get("capacidade_cache", CAPACIDADE_CACHE_PADRAO),
+    janela_ms=config_codificador.get("janela_ms", JANELA_MS_PADRAO),
+    tamanho_maximo_lote=config_codificador.get("tamanho_maximo_lote", TAMANHO_MAXIMO_LOTE_PADRAO)
+)
+# Índices recriados/atualizados pelo gerenciador_indices.py são recarregados em segundo plano, sem reiniciar o servidor
+config_recarga_indices = CONFIG.get("recarga_indices", {})
+
+with inicializacao.etapa("caches"):
+    config_cache_respostas = CONFIG.get("cache_respostas", {})
+    cache_respostas = CacheRespostas(
+        capacidade=config_cache_respostas.get("capacidade", CAPACIDADE_PADRAO),
+        ttl_segundos=config_cache_respostas.get("ttl_segundos", TTL_PADRAO_SEGUNDOS),
+        limiar_similaridade=config_cache_respostas.get("limiar_similaridade"),
+        intervalo_salvamento=config_cache_respostas.get("intervalo_salvamento_segundos", INTERVALO_SALVAMENTO_PADRAO)
+    ) if config_cache_respostas.get("ativo", True) else None
+
+    # Documentos da análise em map-reduce e cache das respostas parciais por (documento, pergunta)
+    config_analise = CONFIG.get("analise_documentos", {})
+    repositorio_documentos = RepositorioDocumentos(
+        capacidade_bytes=int(config_analise.get("capacidade_documentos_mb", CAPACIDADE_DOCUMENTOS_BYTES / 2**20) * 2**20),
+        ttl_segundos=config_analise.get("ttl_documentos_segundos", TTL_DOCUMENTOS_SEGUNDOS)
+    )
+    cache_mapeamentos = CacheRespostas(
+        caminho=CAMINHO_CACHE_MAPEAMENTO,
+        capacidade=config_analise.get("capacidade_cache", CAPACIDADE_PADRAO),
+        ttl_segundos=config_analise.get("ttl_cache_segundos", TTL_PADRAO_SEGUNDOS),
+        intervalo_salvamento=config_analise.get("intervalo_salvamento_cache_segundos", INTERVALO_SALVAMENTO_PADRAO)
+    ) if config_analise.get("cache_ativo", True) else None
+
+# No modo imediato tudo é carregado antes de o servidor aceitar requisições (como nas versões anteriores)
+if MODO_CARREGAMENTO == CARREGAMENTO_IMEDIATO:
+    for nome_componente in list(inicializacao.componentes):
+        try:
+            inicializacao.carregar(nome_componente)
+        except Exception:
+            # O erro fica registrado no componente e aparece em /status/pronto
+            continue
+
+# --- CLIENTE HTTP COMPARTILHADO (OPENROUTER) ---
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# A chave é lida uma única vez na subida do gateway (e não a cada requisição)
+OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY")
+cliente_http: Optional[httpx.AsyncClient] = None
 
-app = FastAPI()
+def criar_cliente_http() -> httpx.AsyncClient:
+    """Cria o cliente com pool de conexões, keep-alive e HTTP/2 usado durante toda a vida do gateway."""
+    cfg = CONFIG.get("cliente_http", {})
+    limites = httpx.Limits(
+        max_connections=cfg.get("max_conexoes", 20),
+        max_keepalive_connections=cfg.get("max_conexoes_keepalive", 10),
+        keepalive_expiry=cfg.get("keepalive_expiry", 30.0)
+    )
+    usar_http2 = cfg.get("http2", True)
+    if usar_http2 and importlib.util.find_spec("h2") is None:
+        print("⚠️ AVISO: pacote 'h2' não instalado. O cliente HTTP usará HTTP/1.1 (instale 'httpx[http2]').")
+        usar_http2 = False
+    timeout = httpx.Timeout(cfg.get("timeout", 180.0), connect=cfg.get("timeout_conexao", 10.0))
+    return httpx.AsyncClient(http2=usar_http2, limits=limites, timeout=timeout)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global cliente_http
+    with inicializacao.etapa("cliente_http"):
+        cliente_http = criar_cliente_http()
+    if MODO_CARREGAMENTO != CARREGAMENTO_IMEDIATO:
+        # Embeddings e índices primeiro (a busca depende deles); os modelos locais só no modo segundo plano
+        inicializacao.aquecer_em_segundo_plano(sorted(
+            (nome for nome in inicializacao.componentes
+             if MODO_CARREGAMENTO == CARREGAMENTO_SEGUNDO_PLANO or not nome.startswith(PREFIXO_MODELO_LOCAL)),
+            key=lambda nome: nome.startswith(PREFIXO_MODELO_LOCAL)
+        ))
+    if config_recarga_indices.get("ativo", True):
+        repositorio_indices.iniciar_monitoramento(
+            config_recarga_indices.get("intervalo_segundos", INTERVALO_MONITORAMENTO_PADRAO))
+    inicializacao.marcar_aceitando_requisicoes()
+    try:
+        yield
+    finally:
+        repositorio_indices.parar_monitoramento()
+        # O que ficou dentro do intervalo de salvamento é gravado na saída
+        for cache in (cache_respostas, cache_mapeamentos):
+            if cache is not None:
+                await asyncio.to_thread(cache.salvar)
+        await cliente_http.aclose()
+        cliente_http = None
+
+app = FastAPI(lifespan=lifespan)
+
+async def aguardar_componente(nome: str):
+    """Espera um componente ainda carregando (ou dispara a sua carga); se não ficar pronto, responde 503."""
+    try:
+        return await inicializacao.aguardar(nome, ESPERA_COMPONENTE)
+    except ComponenteIndisponivel as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def obter_agendador_local(service_name: str) -> AgendadorModeloLocal:
+    if PREFIXO_MODELO_LOCAL + service_name not in inicializacao.componentes:
+        raise HTTPException(status_code=503, detail=f"Modelo local para '{service_name}' não carregado.")
+    return await aguardar_componente(PREFIXO_MODELO_LOCAL + service_name)
 
 async def execute_request(service_name: str, prompt_final: str):
-    load_dotenv()
-    OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY")
     service_config = CONFIG.get("servicos", {}).get(service_name)
     service_type = service_config.get("tipo")
     params_inferencia = CONFIG.get("parametros_inferencia_padrao", {})
     if service_type == "local":
-        model_obj = loaded_local_models.get(service_name)
-        if not model_obj: raise HTTPException(status_code=503, detail=f"Modelo local para '{service_name}' não carregado.")
-        def blocking_call(): return model_obj(prompt_final, stop=["[/INST]", "</s>"], **params_inferencia)
+        agendador = await obter_agendador_local(service_name)
         try:
-            response = await asyncio.wait_for(asyncio.to_thread(blocking_call), timeout=180.0)
-            return {"texto_gerado": response['choices'][0]['text'].strip()}
+            # O limite conta a partir do início da geração (não da espera na fila); ao estourar, a geração é interrompida
+            texto = await agendador.gerar(prompt_final, tempo_maximo=TEMPO_MAXIMO_GERACAO)
+            return {"texto_gerado": texto}
+        except FilaCheia as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
         except asyncio.TimeoutError:
             raise HTTPException(status_code=408, detail=f"A geração do serviço local '{service_name}' excedeu o limite.")
         except Exception as e:
@@ -130,32 +357,440 @@ async def execute_request(service_name: str, prompt_final: str):
         headers = {"Authorization": f"Bearer {OPENROUTER_KEY}"}
         json_data = {"model": model_id, "messages": [{"role": "user", "content": prompt_final}], **params_inferencia}
         try:
-            async with httpx.AsyncClient() as client:
-                print(f"\n-> Roteando req. do serviço '{service_name}' para OpenRouter (Modelo: {model_id})...")
-                response = await client.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=json_data, timeout=180)
-                response.raise_for_status()
-                data = response.json()
-                if "choices" not in data or not data["choices"]: raise Exception("Resposta da API inválida.")
-                return {"texto_gerado": data['choices'][0]['message']['content'].strip()}
+            print(f"\n-> Roteando req. do serviço '{service_name}' para OpenRouter (Modelo: {model_id})...")
+            response = await cliente_http.post(OPENROUTER_URL, headers=headers, json=json_data)
+            response.raise_for_status()
+            data = response.json()
+            if "choices" not in data or not data["choices"]: raise Exception("Resposta da API inválida.")
+            return {"texto_gerado": data['choices'][0]['message']['content'].strip()}
         except httpx.HTTPStatusError as e:
             raise HTTPException(status_code=e.response.status_code, detail=f"Erro da API do OpenRouter: {e.response.text}")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erro na chamada do serviço de nuvem '{service_name}': {e}")
 
-@app.post("/sumarizar")
-async def endpoint_sumarizar(request: RagRequest):
-    service_config = CONFIG.get("servicos", {}).get("sumarizador", {})
-    service_type = service_config.get("tipo")
+def obter_template(service_name: str, tipo_prompt: str) -> str:
+    """Escolhe a variante local/nuvem de um prompt de acordo com o tipo do serviço."""
+    service_type = CONFIG.get("servicos", {}).get(service_name, {}).get("tipo")
+    sufixo = "local" if service_type == 'local' else "nuvem"
+    return PROMPTS_CONFIG[f"{tipo_prompt}_{sufixo}"]["template"]
+
+def montar_prompt_sumarizacao(contexto: str, pergunta: str) -> str:
+    template = obter_template("sumarizador", "sumarizacao")
+    return template.format(pergunta=pergunta, contexto_completo=contexto)
 
+def montar_prompt_rag(contexto: str, pergunta: str) -> str:
+    template = obter_template("gerador_principal", "geracao_rag")
+    service_type = CONFIG.get("servicos", {}).get("gerador_principal", {}).get("tipo")
     if service_type == 'local':
-        template = PROMPTS_CONFIG["sumarizacao_local"]["template"]
+        return template.format(contexto=contexto, pergunta=pergunta)
     else:
-        # Usa o novo template para a nuvem
-        template = PROMPTS_CONFIG["sumarizacao_nuvem"]["template"]
-    
-    prompt_final = template.format(pergunta=request.pergunta, contexto_completo=request.contexto)
-    
-    return await execute_request("sumarizador", prompt_final)
+        return template.format(context=contexto, input=pergunta)
+
+def id_modelo_servico(service_name: str) -> str:
+    service_config = CONFIG.get("servicos", {}).get(service_name, {})
+    return service_config.get("path_gguf") if service_config.get("tipo") == "local" else service_config.get("id_openrouter")
+
+def escopo_cache_rag(ids_chunks: List[str], modo_resumo: Optional[str] = None) -> str:
+    """Escopo do cache de respostas: modelo(s), template(s) e chunks que entram na geração."""
+    id_modelo = id_modelo_servico("gerador_principal")
+    template = obter_template("gerador_principal", "geracao_rag")
+    if modo_resumo == "llm":
+        id_modelo += "|" + (id_modelo_servico("sumarizador") or "")
+        template += obter_template("sumarizador", "sumarizacao")
+    elif modo_resumo == "extrativo":
+        id_modelo += "|extrativo"
+    return CacheRespostas.calcular_escopo("gerador_principal", id_modelo, template, ids_chunks)
+
+def hash_texto(texto: str) -> str:
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+async def embutir_pergunta(pergunta: str) -> List[float]:
+    return await codificador_consultas.codificar(pergunta)
+
+MODOS_BUSCA = ("hibrido", "vetorial", "bm25")
+# Na busca híbrida cada lado devolve mais candidatos do que o k final, para a fusão ter o que escolher
+FATOR_CANDIDATOS_HIBRIDO = 4
+# Valor de "contexto" que faz a busca federada em todos os índices carregados
+CONTEXTO_TODOS = "*"
+
+async def buscar_candidatos(versao: VersaoIndice, pergunta: str, k: int, vetor_pergunta: Optional[List[float]], modo_busca: str):
+    """Candidatos de um contexto: (documentos por id, [(id, distância)], [(id, score BM25)])."""
+    db = versao.indice
+    indice_bm25 = versao.indice_bm25 if modo_busca != "vetorial" else None
+    usar_vetorial = modo_busca != "bm25" or indice_bm25 is None
+    k_candidatos = k * FATOR_CANDIDATOS_HIBRIDO if (usar_vetorial and indice_bm25) else k
+
+    async def busca_vetorial():
+        return await asyncio.to_thread(db.similarity_search_with_score_by_vector, vetor_pergunta, k=k_candidatos)
+
+    async def busca_bm25():
+        return await asyncio.to_thread(indice_bm25.buscar, pergunta, k_candidatos)
+
+    resultados_vetoriais, resultados_bm25 = await asyncio.gather(
+        busca_vetorial() if usar_vetorial else asyncio.sleep(0, result=[]),
+        busca_bm25() if indice_bm25 else asyncio.sleep(0, result=[])
+    )
+    documentos, distancias = {}, []
+    for doc, distancia in resultados_vetoriais:
+        id_chunk = getattr(doc, "id", None) or hash_texto(doc.page_content)
+        documentos[id_chunk] = doc
+        distancias.append((id_chunk, float(distancia)))
+    return documentos, distancias, resultados_bm25
+
+async def buscar_documentos(id_contexto: str, pergunta: str, k: int, vetor_pergunta: List[float] = None,
+                            modo_busca: str = "hibrido") -> List[dict]:
+    """
+    Busca os k chunks mais relevantes de um contexto, ou de todos com `CONTEXTO_TODOS`.
+    A pergunta é embutida uma única vez e o vetor é reaproveitado em todos os índices;
+    as buscas (vetorial e BM25, em cada contexto) rodam em paralelo. Os candidatos de
+    todos os contextos formam um ranking vetorial global (as distâncias são comparáveis,
+    pois o modelo de embeddings é o mesmo) e um ranking BM25 global (score normalizado
+    pelo melhor de cada contexto), fundidos por RRF.
+
+    A busca inteira usa as versões dos índices adquiridas no início: se um índice for
+    recarregado no meio dela, a versão antiga só é liberada quando ela terminar.
+    """
+    if modo_busca not in MODOS_BUSCA:
+        raise HTTPException(status_code=422, detail=f"modo_busca inválido: '{modo_busca}'. Use um de {list(MODOS_BUSCA)}.")
+    # Logo após a subida, os índices ainda podem estar carregando em segundo plano
+    await aguardar_componente("indices_rag")
+    pedidos = repositorio_indices.contextos() if id_contexto == CONTEXTO_TODOS else [id_contexto]
+    with repositorio_indices.usar(pedidos) as versoes:
+        if id_contexto == CONTEXTO_TODOS and not versoes:
+            raise HTTPException(status_code=404, detail="Nenhum contexto está indexado no servidor.")
+        if not versoes:
+            raise HTTPException(status_code=404, detail=f"Contexto '{id_contexto}' não está indexado no servidor. Disponíveis: {repositorio_indices.contextos()}")
+        return await buscar_nas_versoes(versoes, pergunta, k, vetor_pergunta, modo_busca)
+
+async def buscar_nas_versoes(versoes: Dict[str, VersaoIndice], pergunta: str, k: int, vetor_pergunta: Optional[List[float]],
+                             modo_busca: str) -> List[dict]:
+    contextos = list(versoes)
+    if vetor_pergunta is None and modo_busca != "bm25":
+        vetor_pergunta = await embutir_pergunta(pergunta)
+
+    candidatos = await asyncio.gather(*(buscar_candidatos(versoes[ctx], pergunta, k, vetor_pergunta, modo_busca) for ctx in contextos))
+
+    documentos, distancias, scores_bm25 = {}, {}, {}
+    for ctx, (documentos_ctx, distancias_ctx, bm25_ctx) in zip(contextos, candidatos):
+        documentos.update({(ctx, id_chunk): doc for id_chunk, doc in documentos_ctx.items()})
+        distancias.update({(ctx, id_chunk): distancia for id_chunk, distancia in distancias_ctx})
+        melhor_bm25 = max((score for _, score in bm25_ctx), default=0.0) or 1.0
+        scores_bm25.update({(ctx, id_chunk): score / melhor_bm25 for id_chunk, score in bm25_ctx})
+    ranking_vetorial = sorted(distancias, key=distancias.get)
+    ranking_bm25 = sorted(scores_bm25, key=scores_bm25.get, reverse=True)
+    fundidos = fundir_rrf(ranking_vetorial, ranking_bm25)[:k]
+
+    # Chunks encontrados só pelo BM25 são materializados aqui, apenas os que entraram no top-k
+    for ctx in contextos:
+        faltantes = [id_chunk for (c, id_chunk), _ in fundidos if c == ctx and (c, id_chunk) not in documentos]
+        if faltantes:
+            encontrados = await asyncio.to_thread(documentos_por_ids, versoes[ctx].indice, faltantes)
+            documentos.update({(ctx, id_chunk): doc for id_chunk, doc in encontrados.items()})
+
+    return [
+        {"id": id_chunk, "contexto": ctx, "conteudo": documentos[(ctx, id_chunk)].page_content,
+         "metadados": documentos[(ctx, id_chunk)].metadata, "score": distancias.get((ctx, id_chunk)),
+         "score_bm25": scores_bm25.get((ctx, id_chunk)), "score_rrf": score_rrf}
+        for (ctx, id_chunk), score_rrf in fundidos if (ctx, id_chunk) in documentos
+    ]
+
+def validar_modo_resumo(modo_resumo: str):
+    if modo_resumo not in ("llm", "extrativo"):
+        raise HTTPException(status_code=422, detail=f"modo_resumo inválido: '{modo_resumo}'. Use 'llm' ou 'extrativo'.")
+
+def contexto_do_request(request: RagRequest) -> str:
+    """O texto a resumir: os chunks recebidos (em ordem) ou, sem eles, o contexto em texto único."""
+    return "\n\n".join(request.chunks) if request.chunks is not None else request.contexto
+
+
+async def resumir_extrativo(contexto: str, pergunta: str, vetor_pergunta: List[float] = None) -> str:
+    cfg = CONFIG.get("compressor_extrativo", {})
+    return await asyncio.to_thread(
+        comprimir_contexto, contexto, pergunta, embeddings_busca,
+        orcamento_tokens=cfg.get("orcamento_tokens", ORCAMENTO_TOKENS_PADRAO),
+        limiar_duplicata=cfg.get("limiar_duplicata", LIMIAR_DUPLICATA_PADRAO),
+        score_minimo=cfg.get("score_minimo", SCORE_MINIMO_PADRAO),
+        contar_tokens=contador_tokens_servico("gerador_principal"),
+        vetor_pergunta=vetor_pergunta
+    )
+
+# --- MONTAGEM DO CONTEXTO DENTRO DA JANELA DE TOKENS ---
+
+JANELA_CONTEXTO_NUVEM_PADRAO = 32768
+MARGEM_TOKENS_PROMPT = 32
+contadores_tokens = {}
+
+def contador_tokens_servico(service_name: str):
+    if service_name not in contadores_tokens:
+        modelo_local = loaded_local_models.get(service_name)
+        service_config = CONFIG.get("servicos", {}).get(service_name, {})
+        if service_config.get("tipo") == "local":
+            contador = criar_contador_tokens(modelo_local)
+            # Enquanto o modelo local não termina de carregar, a contagem é estimada e não vai para o cache
+            if modelo_local is None:
+                return contador
+        else:
+            contador = criar_contador_tokens(modelo_nuvem=service_config.get("id_openrouter"),
+                                             tokenizador=service_config.get("tokenizador"))
+        contadores_tokens[service_name] = contador
+    return contadores_tokens[service_name]
+
+def janela_contexto_servico(service_name: str) -> int:
+    service_config = CONFIG.get("servicos", {}).get(service_name, {})
+    if service_config.get("tipo") == "local":
+        return CONFIG.get("parametros_carregamento_local", {}).get("n_ctx", 4096)
+    return service_config.get("janela_contexto", CONFIG.get("janela_contexto_nuvem_padrao", JANELA_CONTEXTO_NUVEM_PADRAO))
+
+def orcamento_tokens_contexto(service_name: str, prompt_sem_contexto: str) -> int:
+    """Tokens disponíveis para o contexto: janela - resposta reservada - restante do prompt."""
+    janela = janela_contexto_servico(service_name)
+    max_tokens = CONFIG.get("parametros_inferencia_padrao", {}).get("max_tokens", 1024)
+    # Com max_tokens >= janela (ex: 4096/4096) não sobraria nada para o contexto; reservamos no
+    # máximo metade da janela para a resposta (o llama.cpp já limita a geração ao espaço restante).
+    reserva_resposta = min(max_tokens, janela // 2)
+    contar = contador_tokens_servico(service_name)
+    return max(0, janela - reserva_resposta - contar(prompt_sem_contexto) - MARGEM_TOKENS_PROMPT)
+
+async def ajustar_contexto(service_name: str, pergunta: str, contexto: str = "", chunks: List[str] = None,
+                           vetor_pergunta: List[float] = None) -> dict:
+    """
+    Garante que o contexto caiba no prompt do serviço. Chunks recebidos são usados na ordem
+    dada; um contexto em texto único só é dividido e ranqueado se não couber inteiro.
+    """
+    montar = montar_prompt_sumarizacao if service_name == "sumarizador" else montar_prompt_rag
+    orcamento = orcamento_tokens_contexto(service_name, montar("", pergunta))
+    contar = contador_tokens_servico(service_name)
+    ordem = None
+    if chunks is None:
+        tokens_contexto = await asyncio.to_thread(contar, contexto)
+        if tokens_contexto <= orcamento:
+            return {"contexto": contexto, "tokens_contexto": tokens_contexto, "orcamento_tokens": orcamento,
+                    "chunks_usados": 1, "chunks_descartados_duplicata": 0, "chunks_descartados_orcamento": 0}
+        chunks = dividir_em_pedacos(contexto)
+        ordem = await asyncio.to_thread(ranquear_por_similaridade, chunks, pergunta, embeddings_busca, vetor_pergunta)
+    resultado = await asyncio.to_thread(construir_contexto, chunks, orcamento, contar, ordem)
+    print(f"-> Contexto para '{service_name}': {resultado['tokens_contexto']}/{orcamento} tokens, "
+          f"{resultado['chunks_usados']} chunks ({resultado['chunks_descartados_duplicata']} duplicados e "
+          f"{resultado['chunks_descartados_orcamento']} fora do orçamento descartados)")
+    return resultado
+
+def uso_contexto(ajuste: dict) -> dict:
+    return {chave: valor for chave, valor in ajuste.items() if chave != "contexto"}
+
+async def consultar_cache_respostas(escopo: str, pergunta: str, vetor_pergunta: List[float] = None) -> Optional[str]:
+    if cache_respostas is None:
+        return None
+    return cache_respostas.buscar(escopo, pergunta, vetor_pergunta)
+
+async def gravar_cache_respostas(escopo: str, pergunta: str, resposta: str, vetor_pergunta: List[float] = None):
+    if cache_respostas is None or not resposta:
+        return
+    cache_respostas.armazenar(escopo, pergunta, resposta, vetor_pergunta)
+    await asyncio.to_thread(cache_respostas.talvez_salvar)
+
+# --- STREAMING DE TOKENS (SERVER-SENT EVENTS) ---
+
+def formatar_evento_sse(dados: dict, evento: str = None) -> str:
+    linhas = f"event: {evento}\n" if evento else ""
+    return linhas + f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+async def stream_nuvem(service_name: str, prompt_final: str) -> AsyncIterator[str]:
+    service_config = CONFIG.get("servicos", {}).get(service_name)
+    params_inferencia = CONFIG.get("parametros_inferencia_padrao", {})
+    model_id = service_config.get("id_openrouter")
+    headers = {"Authorization": f"Bearer {OPENROUTER_KEY}"}
+    json_data = {"model": model_id, "messages": [{"role": "user", "content": prompt_final}], "stream": True, **params_inferencia}
+    print(f"\n-> Roteando req. (stream) do serviço '{service_name}' para OpenRouter (Modelo: {model_id})...")
+    async with cliente_http.stream("POST", OPENROUTER_URL, headers=headers, json=json_data) as response:
+        if response.status_code >= 400:
+            corpo = await response.aread()
+            raise Exception(f"Erro da API do OpenRouter ({response.status_code}): {corpo.decode('utf-8', 'replace')}")
+        async for linha in response.aiter_lines():
+            # Linhas vazias separam eventos; linhas iniciadas com ':' são comentários de keep-alive
+            if not linha.startswith("data: "):
+                continue
+            conteudo = linha[len("data: "):]
+            if conteudo.strip() == "[DONE]":
+                break
+            dados = json.loads(conteudo)
+            if dados.get("error"):
+                raise Exception(f"Erro da API do OpenRouter: {dados['error']}")
+            escolhas = dados.get("choices") or []
+            token = escolhas[0].get("delta", {}).get("content") if escolhas else None
+            if token:
+                yield token
+
+def stream_resposta_pronta(texto: str, eventos_iniciais: List[str] = None) -> StreamingResponse:
+    """Entrega no formato SSE uma resposta que já estava pronta (ex: vinda do cache)."""
+    async def eventos():
+        for evento in eventos_iniciais or []:
+            yield evento
+        yield formatar_evento_sse({"token": texto})
+        yield formatar_evento_sse({"texto_gerado": texto, "cache": True}, evento="fim")
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def execute_request_stream(service_name: str, prompt_final: str, eventos_iniciais: List[str] = None,
+                           ao_concluir: Callable[[str], Awaitable[None]] = None) -> StreamingResponse:
+    """
+    Versão em streaming de `execute_request`. As validações acontecem antes de abrir o
+    stream (para que erros de configuração ainda virem respostas HTTP normais); erros
+    durante a geração são enviados como um evento SSE 'erro'. `ao_concluir` recebe o
+    texto completo quando a geração termina sem erros.
+    """
+    service_config = CONFIG.get("servicos", {}).get(service_name)
+    service_type = service_config.get("tipo")
+    agendador = None
+    if service_type == "local":
+        agendador = await obter_agendador_local(service_name)
+        try:
+            agendador.verificar_vaga()
+        except FilaCheia as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    elif service_type == "nuvem":
+        if not OPENROUTER_KEY: raise HTTPException(status_code=401, detail="A chave OPENROUTER_API_KEY não foi encontrada.")
+    else:
+        raise HTTPException(status_code=500, detail=f"Tipo de serviço inválido para '{service_name}': {service_type}")
+
+    async def eventos():
+        # A tarefa só entra na fila quando o stream começa: um cliente que desconecta antes disso
+        # nunca chega a iterar este gerador, e nada ficaria para cancelar a geração
+        tarefa = None
+        texto_completo = []
+        try:
+            if agendador is not None:
+                tarefa = agendador.submeter(prompt_final)
+                gerador_tokens = agendador.consumir(tarefa)
+            else:
+                gerador_tokens = stream_nuvem(service_name, prompt_final)
+            for evento in eventos_iniciais or []:
+                yield evento
+            async for token in gerador_tokens:
+                texto_completo.append(token)
+                yield formatar_evento_sse({"token": token})
+            texto_final = "".join(texto_completo).strip()
+            yield formatar_evento_sse({"texto_gerado": texto_final}, evento="fim")
+            if ao_concluir:
+                await ao_concluir(texto_final)
+        except Exception as e:
+            yield formatar_evento_sse({"detail": f"Erro no serviço '{service_name}': {e}"}, evento="erro")
+        finally:
+            # Cliente desconectado: interrompe a geração (ou libera a vaga na fila)
+            if tarefa is not None:
+                agendador.cancelar(tarefa)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/status/vivo")
+async def endpoint_status_vivo():
+    """Liveness: responde assim que o servidor sobe, sem depender de modelos ou índices."""
+    return {"vivo": True, "segundos_desde_inicio": round(inicializacao.decorrido(), 3)}
+
+@app.get("/status/pronto")
+async def endpoint_status_pronto():
+    """Readiness: 200 quando todos os componentes obrigatórios estão carregados, 503 enquanto aquecem."""
+    status = inicializacao.status()
+    if not status["pronto"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/status/inicializacao")
+async def endpoint_status_inicializacao():
+    """Tempo de cada etapa da subida e de cada componente carregado em segundo plano."""
+    return {**inicializacao.status(), "modo_inicio": MODO_INICIO, "carregamento_modelos": MODO_CARREGAMENTO}
+
+@app.get("/status/filas")
+async def endpoint_status_filas():
+    """Profundidade da fila, tempos de espera e contadores de cada modelo local."""
+    return {nome: agendador.status() for nome, agendador in agendadores_locais.items()}
+
+@app.get("/status/indices")
+async def endpoint_status_indices():
+    """Versão carregada de cada índice, buscas em andamento sobre ela e recargas feitas em segundo plano."""
+    return repositorio_indices.status()
+
+@app.get("/contextos")
+async def endpoint_contextos():
+    await aguardar_componente("indices_rag")
+    return {"contextos": repositorio_indices.contextos()}
+
+@app.post("/buscar")
+async def endpoint_buscar(request: BuscaRequest):
+    resultados = await buscar_documentos(request.contexto, request.pergunta, request.k, modo_busca=request.modo_busca)
+    return {"contexto": request.contexto, "resultados": resultados}
+
+def formatar_fonte(resultado: dict, com_contexto: bool) -> str:
+    fonte = resultado["metadados"].get("source", "desconhecida")
+    return f"[{resultado['contexto']}] {fonte}" if com_contexto else fonte
+
+async def preparar_rag(request: RagCompletoRequest):
+    """Busca os chunks e consulta o cache. Devolve (resultados, fontes, vetor da pergunta, escopo, resposta em cache)."""
+    validar_modo_resumo(request.modo_resumo)
+    vetor_pergunta = await embutir_pergunta(request.pergunta)
+    resultados = await buscar_documentos(request.contexto, request.pergunta, request.k, vetor_pergunta, request.modo_busca)
+    fontes = sorted({formatar_fonte(r, request.contexto == CONTEXTO_TODOS) for r in resultados})
+    escopo = escopo_cache_rag([r["id"] for r in resultados], request.modo_resumo if request.usar_resumo else None)
+    resposta_em_cache = await consultar_cache_respostas(escopo, request.pergunta, vetor_pergunta) if resultados else None
+    return resultados, fontes, vetor_pergunta, escopo, resposta_em_cache
+
+async def montar_contexto_rag(request: RagCompletoRequest, resultados: List[dict], vetor_pergunta: List[float] = None) -> dict:
+    """Aplica a sumarização escolhida e ajusta o contexto à janela do modelo. Devolve o resultado de `ajustar_contexto`."""
+    chunks = [r["conteudo"] for r in resultados]
+    if request.usar_resumo and request.modo_resumo == "extrativo":
+        chunks = [await resumir_extrativo("\n\n".join(chunks), request.pergunta, vetor_pergunta)]
+    elif request.usar_resumo:
+        ajuste_resumo = await ajustar_contexto("sumarizador", request.pergunta, chunks=chunks, vetor_pergunta=vetor_pergunta)
+        resumo = await execute_request("sumarizador", montar_prompt_sumarizacao(ajuste_resumo["contexto"], request.pergunta))
+        chunks = [resumo["texto_gerado"]]
+    return await ajustar_contexto("gerador_principal", request.pergunta, chunks=chunks, vetor_pergunta=vetor_pergunta)
+
+@app.post("/rag")
+async def endpoint_rag(request: RagCompletoRequest):
+    """Fluxo RAG completo no servidor: busca -> (sumarização opcional) -> geração."""
+    resultados, fontes, vetor_pergunta, escopo, resposta_em_cache = await preparar_rag(request)
+    if not resultados:
+        return {"texto_gerado": "Não encontrei documentos relevantes.", "fontes": []}
+    if resposta_em_cache is not None:
+        return {"texto_gerado": resposta_em_cache, "fontes": fontes, "cache": True}
+    ajuste = await montar_contexto_rag(request, resultados, vetor_pergunta)
+    resposta = await execute_request("gerador_principal", montar_prompt_rag(ajuste["contexto"], request.pergunta))
+    await gravar_cache_respostas(escopo, request.pergunta, resposta["texto_gerado"], vetor_pergunta)
+    return {**resposta, "fontes": fontes, "uso_contexto": uso_contexto(ajuste)}
+
+@app.post("/rag_stream")
+async def endpoint_rag_stream(request: RagCompletoRequest):
+    """Igual ao /rag, mas a resposta final é enviada token a token (SSE). As fontes vão no primeiro evento."""
+    resultados, fontes, vetor_pergunta, escopo, resposta_em_cache = await preparar_rag(request)
+    if not resultados:
+        raise HTTPException(status_code=404, detail="Não encontrei documentos relevantes.")
+    eventos_iniciais = [formatar_evento_sse({"fontes": fontes}, evento="fontes")]
+    if resposta_em_cache is not None:
+        return stream_resposta_pronta(resposta_em_cache, eventos_iniciais)
+    ajuste = await montar_contexto_rag(request, resultados, vetor_pergunta)
+    eventos_iniciais.append(formatar_evento_sse({"uso_contexto": uso_contexto(ajuste)}, evento="contexto"))
+
+    async def ao_concluir(texto: str):
+        await gravar_cache_respostas(escopo, request.pergunta, texto, vetor_pergunta)
+
+    return await execute_request_stream("gerador_principal", montar_prompt_rag(ajuste["contexto"], request.pergunta),
+                                  eventos_iniciais=eventos_iniciais, ao_concluir=ao_concluir)
+
+@app.get("/status/cache")
+async def endpoint_status_cache():
+    return cache_respostas.status() if cache_respostas else {"ativo": False}
+
+@app.get("/status/embeddings")
+async def endpoint_status_embeddings():
+    """Acertos do cache de embeddings de perguntas e tamanho médio dos lotes codificados."""
+    return codificador_consultas.status()
+
+@app.post("/sumarizar")
+async def endpoint_sumarizar(request: RagRequest):
+    validar_modo_resumo(request.modo_resumo)
+    if request.modo_resumo == "extrativo":
+        return {"texto_gerado": await resumir_extrativo(contexto_do_request(request), request.pergunta)}
+    ajuste = await ajustar_contexto("sumarizador", request.pergunta, request.contexto, request.chunks)
+    prompt_final = montar_prompt_sumarizacao(ajuste["contexto"], request.pergunta)
+    return {**await execute_request("sumarizador", prompt_final), "uso_contexto": uso_contexto(ajuste)}
 
 @app.post("/gerar")
 async def endpoint_gerar(request: PromptRequest):
@@ -163,15 +798,200 @@ async def endpoint_gerar(request: PromptRequest):
 
 @app.post("/gerar_rag")
 async def endpoint_gerar_rag(request: RagRequest):
-    service_config = CONFIG.get("servicos", {}).get("gerador_principal", {})
-    service_type = service_config.get("tipo")
-    if service_type == 'local':
-        template = PROMPTS_CONFIG["geracao_rag_local"]["template"]
-        prompt_final = template.format(contexto=request.contexto, pergunta=request.pergunta)
-    else:
-        template = PROMPTS_CONFIG["geracao_rag_nuvem"]["template"]
-        prompt_final = template.format(context=request.contexto, input=request.pergunta)
-    return await execute_request("gerador_principal", prompt_final)
+    # Sem IDs de chunks, o próprio contexto enviado identifica o escopo no cache
+    escopo = escopo_cache_rag([hash_texto(c) for c in request.chunks] if request.chunks else [hash_texto(request.contexto)])
+    resposta_em_cache = await consultar_cache_respostas(escopo, request.pergunta)
+    if resposta_em_cache is not None:
+        return {"texto_gerado": resposta_em_cache, "cache": True}
+    ajuste = await ajustar_contexto("gerador_principal", request.pergunta, request.contexto, request.chunks)
+    prompt_final = montar_prompt_rag(ajuste["contexto"], request.pergunta)
+    resposta = await execute_request("gerador_principal", prompt_final)
+    await gravar_cache_respostas(escopo, request.pergunta, resposta["texto_gerado"])
+    return {**resposta, "uso_contexto": uso_contexto(ajuste)}
+
+@app.post("/sumarizar_stream")
+async def endpoint_sumarizar_stream(request: RagRequest):
+    validar_modo_resumo(request.modo_resumo)
+    if request.modo_resumo == "extrativo":
+        return stream_resposta_pronta(await resumir_extrativo(contexto_do_request(request), request.pergunta))
+    ajuste = await ajustar_contexto("sumarizador", request.pergunta, request.contexto, request.chunks)
+    return await execute_request_stream("sumarizador", montar_prompt_sumarizacao(ajuste["contexto"], request.pergunta),
+                                  eventos_iniciais=[formatar_evento_sse({"uso_contexto": uso_contexto(ajuste)}, evento="contexto")])
+
+@app.post("/gerar_stream")
+async def endpoint_gerar_stream(request: PromptRequest):
+    return await execute_request_stream("gerador_principal", request.prompt)
+
+# --- ANÁLISE DE DOCUMENTOS (MAP-REDUCE) ---
+
+def concorrencia_mapeamento(service_name: str) -> int:
+    limite = config_analise.get("concorrencia", CONCORRENCIA_PADRAO)
+    agendador = agendadores_locais.get(service_name)
+    if agendador:
+        # O modelo local gera uma resposta por vez; mais chamadas simultâneas do que a fila comporta virariam 429
+        limite = min(limite, agendador.capacidade_fila)
+    return limite
+
+async def execute_request_com_espera(service_name: str, prompt_final: str, tentativas: int = 3):
+    """Como `execute_request`, mas aguarda o Retry-After e tenta de novo quando a fila local está cheia."""
+    for tentativa in range(tentativas):
+        try:
+            return await execute_request(service_name, prompt_final)
+        except HTTPException as e:
+            if e.status_code != 429 or tentativa == tentativas - 1:
+                raise
+            await asyncio.sleep(int((e.headers or {}).get("Retry-After", 1)))
+
+async def resumir_janelas(janelas: List[str], pergunta: str, ao_concluir_janela: Callable[[], None] = None) -> List[str]:
+    async def mapear(janela: str) -> str:
+        resposta = await execute_request_com_espera("sumarizador", montar_prompt_sumarizacao(janela, pergunta))
+        if ao_concluir_janela:
+            ao_concluir_janela()
+        return resposta["texto_gerado"]
+    return await mapear_janelas(janelas, mapear, concorrencia_mapeamento("sumarizador"))
+
+def obter_documentos(ids_documentos: List[str]) -> List[dict]:
+    documentos = []
+    for id_documento in ids_documentos:
+        documento = repositorio_documentos.obter(id_documento)
+        if documento is None:
+            raise HTTPException(status_code=404, detail=f"Documento '{id_documento}' não encontrado. Envie-o antes em /documentos.")
+        documentos.append(documento)
+    return documentos
+
+async def preparar_analise(documentos: List[dict], pergunta: str, ao_progredir: Callable[[dict], None] = None):
+    """
+    Fase de mapeamento e redução. Cada documento é dividido em janelas que cabem no
+    sumarizador; as janelas de todos os documentos são mapeadas em paralelo (com limite
+    de concorrência) e as respostas parciais de cada documento ficam em cache por
+    (documento, pergunta). Se as parciais juntas não couberem no gerador principal, elas
+    são condensadas em rodadas pelo próprio sumarizador. Devolve (ajuste do contexto, estatísticas).
+    """
+    contar_sumarizador = contador_tokens_servico("sumarizador")
+    orcamento_janela = min(orcamento_tokens_contexto("sumarizador", montar_prompt_sumarizacao("", pergunta)),
+                           config_analise.get("tamanho_maximo_janela_tokens", TAMANHO_MAXIMO_JANELA_TOKENS))
+    template_mapeamento = obter_template("sumarizador", "sumarizacao")
+    estatisticas = {"documentos": len(documentos), "janelas": 0, "janelas_em_cache": 0, "rodadas_reducao": 0}
+
+    parciais_por_documento, pendentes = {}, []
+    for documento in documentos:
+        escopo = CacheRespostas.calcular_escopo("sumarizador", id_modelo_servico("sumarizador"), template_mapeamento,
+                                                [documento["id"], str(orcamento_janela)])
+        em_cache = cache_mapeamentos.buscar(escopo, pergunta) if cache_mapeamentos else None
+        if em_cache is not None:
+            parciais_por_documento[documento["id"]] = json.loads(em_cache)
+            estatisticas["janelas_em_cache"] += len(parciais_por_documento[documento["id"]])
+            continue
+        janelas = await asyncio.to_thread(dividir_em_janelas, documento["texto"], orcamento_janela, contar_sumarizador,
+                                          config_analise.get("sobreposicao_pedacos", SOBREPOSICAO_PEDACOS_PADRAO))
+        pendentes.append((documento, escopo, janelas))
+    estatisticas["janelas"] = estatisticas["janelas_em_cache"] + sum(len(janelas) for _, _, janelas in pendentes)
+
+    # Todas as janelas pendentes passam por um único semáforo, não um por documento
+    todas_janelas = [janela for _, _, janelas in pendentes for janela in janelas]
+    concluidas = [estatisticas["janelas_em_cache"]]
+
+    def progredir():
+        concluidas[0] += 1
+        if ao_progredir:
+            ao_progredir({"janelas_concluidas": concluidas[0], "janelas": estatisticas["janelas"]})
+
+    print(f"-> Análise de documentos: {estatisticas['janelas']} janelas ({estatisticas['janelas_em_cache']} em cache), "
+          f"concorrência {concorrencia_mapeamento('sumarizador')}")
+    parciais_mapeadas = await resumir_janelas(todas_janelas, pergunta, progredir)
+    posicao = 0
+    for documento, escopo, janelas in pendentes:
+        parciais = parciais_mapeadas[posicao:posicao + len(janelas)]
+        posicao += len(janelas)
+        parciais_por_documento[documento["id"]] = parciais
+        if cache_mapeamentos:
+            cache_mapeamentos.armazenar(escopo, pergunta, json.dumps(parciais, ensure_ascii=False))
+    if pendentes and cache_mapeamentos:
+        await asyncio.to_thread(cache_mapeamentos.talvez_salvar)
+
+    parciais = []
+    for documento in documentos:
+        parciais_documento = parciais_por_documento[documento["id"]]
+        parciais.extend(f"--- {documento['nome']} (trecho {i}/{len(parciais_documento)}) ---\n{parcial.strip()}"
+                        for i, parcial in enumerate(parciais_documento, start=1) if parcial_relevante(parcial))
+
+    contar_gerador = contador_tokens_servico("gerador_principal")
+    orcamento_final = orcamento_tokens_contexto("gerador_principal", montar_prompt_rag("", pergunta))
+    while (len(parciais) > 1 and estatisticas["rodadas_reducao"] < MAX_RODADAS_REDUCAO
+           and sum(contar_gerador(p) for p in parciais) > orcamento_final):
+        grupos = agrupar_parciais(parciais, orcamento_janela, contar_sumarizador)
+        parciais = [p for p in await resumir_janelas(grupos, pergunta) if parcial_relevante(p)]
+        estatisticas["rodadas_reducao"] += 1
+
+    ajuste = await ajustar_contexto("gerador_principal", pergunta, chunks=parciais or [RESPOSTA_CONTEXTO_INSUFICIENTE])
+    estatisticas["parciais_relevantes"] = len(parciais)
+    return ajuste, estatisticas
+
+@app.post("/documentos")
+async def endpoint_registrar_documento(request: DocumentoRequest):
+    """Guarda o texto de um documento e devolve o id usado nas perguntas seguintes."""
+    id_documento = await asyncio.to_thread(repositorio_documentos.registrar, request.nome, request.texto)
+    return {"id": id_documento, "nome": request.nome}
+
+@app.delete("/documentos/{id_documento}")
+async def endpoint_remover_documento(id_documento: str):
+    """Apaga um documento enviado antes (as parciais em cache expiram pelo TTL/LRU do cache de mapeamentos)."""
+    if not await asyncio.to_thread(repositorio_documentos.remover, id_documento):
+        raise HTTPException(status_code=404, detail=f"Documento '{id_documento}' não encontrado.")
+    return {"id": id_documento, "removido": True}
+
+@app.post("/analisar_documentos")
+async def endpoint_analisar_documentos(request: AnaliseDocumentosRequest):
+    documentos = obter_documentos(request.ids_documentos)
+    ajuste, estatisticas = await preparar_analise(documentos, request.pergunta)
+    resposta = await execute_request("gerador_principal", montar_prompt_rag(ajuste["contexto"], request.pergunta))
+    return {**resposta, "analise": estatisticas, "uso_contexto": uso_contexto(ajuste)}
+
+@app.post("/analisar_documentos_stream")
+async def endpoint_analisar_documentos_stream(request: AnaliseDocumentosRequest):
+    """Envia eventos 'progresso' durante o mapeamento e depois os tokens da resposta final."""
+    documentos = obter_documentos(request.ids_documentos)
+
+    async def eventos():
+        progresso = asyncio.Queue()
+        preparo = asyncio.create_task(preparar_analise(documentos, request.pergunta, ao_progredir=progresso.put_nowait))
+        try:
+            while not preparo.done() or not progresso.empty():
+                try:
+                    yield formatar_evento_sse(await asyncio.wait_for(progresso.get(), timeout=1.0), evento="progresso")
+                except asyncio.TimeoutError:
+                    continue
+            ajuste, estatisticas = preparo.result()
+            resposta = await execute_request_stream(
+                "gerador_principal", montar_prompt_rag(ajuste["contexto"], request.pergunta),
+                eventos_iniciais=[formatar_evento_sse({"analise": estatisticas, "uso_contexto": uso_contexto(ajuste)}, evento="contexto")]
+            )
+        except Exception as e:
+            detalhe = e.detail if isinstance(e, HTTPException) else str(e)
+            yield formatar_evento_sse({"detail": f"Erro na análise de documentos: {detalhe}"}, evento="erro")
+            return
+        finally:
+            # Cliente desconectado durante o mapeamento: as chamadas pendentes são canceladas
+            preparo.cancel()
+        async for evento in resposta.body_iterator:
+            yield evento
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/gerar_rag_stream")
+async def endpoint_gerar_rag_stream(request: RagRequest):
+    escopo = escopo_cache_rag([hash_texto(c) for c in request.chunks] if request.chunks else [hash_texto(request.contexto)])
+    resposta_em_cache = await consultar_cache_respostas(escopo, request.pergunta)
+    if resposta_em_cache is not None:
+        return stream_resposta_pronta(resposta_em_cache)
+    ajuste = await ajustar_contexto("gerador_principal", request.pergunta, request.contexto, request.chunks)
+
+    async def ao_concluir(texto: str):
+        await gravar_cache_respostas(escopo, request.pergunta, texto)
+
+    return await execute_request_stream("gerador_principal", montar_prompt_rag(ajuste["contexto"], request.pergunta),
+                                  eventos_iniciais=[formatar_evento_sse({"uso_contexto": uso_contexto(ajuste)}, evento="contexto")],
+                                  ao_concluir=ao_concluir)
 
 # para subir o servidor, use:
 # uvicorn servidor_modelo_local:app --reload
\ No newline at end of file
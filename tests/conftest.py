@@ -0,0 +1,30 @@
+import os
+import sys
+import hashlib
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# Os módulos ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class EmbeddingsDeterministicos(Embeddings):
+    """Vetores derivados do hash do texto: rápidos, sem modelo, e iguais para textos iguais."""
+
+    def __init__(self, dimensao: int = 16):
+        self.dimensao = dimensao
+        self.textos_embutidos = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.textos_embutidos += len(texts)
+        return [[float(b) for b in hashlib.sha256(t.encode('utf-8')).digest()[:self.dimensao]] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def embeddings():
+    return EmbeddingsDeterministicos()
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+import agendador_local
+from agendador_local import AgendadorModeloLocal, FilaCheia
+
+
+class ModeloFalso:
+    """Imita o `Llama` em modo stream; `liberar` segura a primeira geração até ser sinalizado."""
+
+    def __init__(self, tokens=("a", "b"), pausa: float = 0.0):
+        self.tokens = tokens
+        self.pausa = pausa
+        self.liberar = threading.Event()
+        self.liberar.set()
+        self.prompts = []
+
+    def __call__(self, prompt, stop=None, stream=True, **params):
+        self.prompts.append(prompt)
+        self.liberar.wait(5)
+        for token in self.tokens:
+            time.sleep(self.pausa)
+            yield {"choices": [{"text": token}]}
+
+
+async def esperar_gerando(agendador):
+    while not agendador.status()["gerando"]:
+        await asyncio.sleep(0.01)
+
+
+def test_gera_em_ordem_fifo():
+    modelo = ModeloFalso()
+    agendador = AgendadorModeloLocal("teste", modelo, {})
+
+    async def cenario():
+        return await asyncio.gather(*(agendador.gerar(f"p{i}") for i in range(3)))
+
+    assert asyncio.run(cenario()) == ["ab"] * 3
+    assert modelo.prompts == ["p0", "p1", "p2"]
+    assert agendador.status()["concluidas"] == 3
+
+
+def test_tarefa_cancelada_na_fila_libera_a_vaga():
+    modelo = ModeloFalso()
+    modelo.liberar.clear()
+    agendador = AgendadorModeloLocal("teste", modelo, {}, capacidade_fila=1)
+
+    async def cenario():
+        em_execucao = agendador.submeter("p0")
+        await esperar_gerando(agendador)
+        na_fila = agendador.submeter("p1")
+        with pytest.raises(FilaCheia):
+            agendador.submeter("p2")
+        agendador.cancelar(na_fila)
+        assert agendador.status()["profundidade_fila"] == 0
+        seguinte = agendador.submeter("p2")
+        modelo.liberar.set()
+        return [[t async for t in agendador.consumir(tarefa)] for tarefa in (em_execucao, na_fila, seguinte)]
+
+    assert asyncio.run(cenario()) == [["a", "b"], [], ["a", "b"]]
+    assert modelo.prompts == ["p0", "p2"]
+
+
+def test_espera_na_fila_nao_conta_no_timeout(monkeypatch):
+    monkeypatch.setattr(agendador_local, "TIMEOUT_ENTRE_TOKENS", 0.5)
+    modelo = ModeloFalso(pausa=0.3)
+    agendador = AgendadorModeloLocal("teste", modelo, {})
+
+    async def cenario():
+        # A terceira tarefa espera ~1.2s na fila, mais que o timeout entre tokens
+        return await asyncio.gather(*(agendador.gerar(f"p{i}", tempo_maximo=1.0) for i in range(3)))
+
+    assert asyncio.run(cenario()) == ["ab"] * 3
+
+
+def test_tempo_maximo_interrompe_a_geracao():
+    modelo = ModeloFalso(tokens=("a",) * 20, pausa=0.1)
+    agendador = AgendadorModeloLocal("teste", modelo, {})
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(agendador.gerar("p0", tempo_maximo=0.3))
+    inicio = time.monotonic()
+    while agendador.status()["gerando"] and time.monotonic() - inicio < 2:
+        time.sleep(0.01)
+    assert agendador.status()["canceladas"] == 1
@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+
+from analisador_documentos import RepositorioDocumentos, agrupar_parciais, dividir_em_janelas
+from construtor_contexto import SEPARADOR_CHUNKS
+
+
+def contar_palavras(texto: str) -> int:
+    return len(texto.split())
+
+
+def paragrafos(quantidade: int) -> list:
+    # ~1200 caracteres cada: um parágrafo por pedaço de `dividir_em_pedacos`
+    return [" ".join([f"p{i}"] * 300) for i in range(quantidade)]
+
+
+def test_janelas_respeitam_o_orcamento_e_cobrem_o_texto():
+    partes = paragrafos(6)
+    janelas = dividir_em_janelas(SEPARADOR_CHUNKS.join(partes), 700, contar_palavras, sobreposicao_pedacos=0)
+    assert len(janelas) == 3
+    assert all(contar_palavras(janela) <= 700 for janela in janelas)
+    assert SEPARADOR_CHUNKS.join(janelas) == SEPARADOR_CHUNKS.join(partes)
+
+
+def test_sobreposicao_repete_o_ultimo_pedaco_na_janela_seguinte():
+    partes = paragrafos(4)
+    janelas = dividir_em_janelas(SEPARADOR_CHUNKS.join(partes), 700, contar_palavras, sobreposicao_pedacos=1)
+    assert janelas[0] == SEPARADOR_CHUNKS.join(partes[0:2])
+    assert janelas[1] == SEPARADOR_CHUNKS.join(partes[1:3])
+    assert janelas[-1].endswith(partes[-1])
+
+
+def test_sobreposicao_cede_quando_o_novo_pedaco_nao_caberia():
+    partes = paragrafos(3)
+    janelas = dividir_em_janelas(SEPARADOR_CHUNKS.join(partes), 350, contar_palavras, sobreposicao_pedacos=1)
+    assert janelas == partes
+
+
+def test_agrupar_parciais_respeita_o_orcamento():
+    grupos = agrupar_parciais(["a b", "c d", "e f"], 5, contar_palavras)
+    assert grupos == ["a b\n\nc d", "e f"]
+
+
+def test_registrar_o_mesmo_documento_em_paralelo(tmp_path):
+    repositorio = RepositorioDocumentos(pasta=str(tmp_path))
+    erros, ids = [], []
+
+    def enviar():
+        try:
+            ids.append(repositorio.registrar("doc.txt", "conteúdo do documento"))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=enviar) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not erros
+    assert len(set(ids)) == 1
+    assert repositorio.obter(ids[0])["texto"] == "conteúdo do documento"
+    assert not [nome for nome in os.listdir(tmp_path) if nome.endswith(".tmp")]
+
+
+def test_obter_rejeita_id_que_nao_e_hash(tmp_path):
+    repositorio = RepositorioDocumentos(pasta=str(tmp_path))
+    repositorio.registrar("doc.txt", "texto")
+    assert repositorio.obter("../doc") is None
+    assert repositorio.obter("") is None
+
+
+def envelhecer(repositorio, id_documento: str, segundos: float):
+    instante = time.time() - segundos
+    os.utime(repositorio._caminho(id_documento), (instante, instante))
+
+
+def test_documentos_sem_uso_expiram(tmp_path):
+    repositorio = RepositorioDocumentos(pasta=str(tmp_path), ttl_segundos=60)
+    antigo = repositorio.registrar("antigo.txt", "texto antigo")
+    envelhecer(repositorio, antigo, 120)
+    novo = repositorio.registrar("novo.txt", "texto novo")
+    assert repositorio.obter(antigo) is None
+    assert repositorio.obter(novo)["nome"] == "novo.txt"
+
+
+def test_acima_da_capacidade_apaga_os_usados_ha_mais_tempo(tmp_path):
+    repositorio = RepositorioDocumentos(pasta=str(tmp_path), capacidade_bytes=250)
+    ids = [repositorio.registrar(f"doc{i}.txt", f"{i}" * 100) for i in range(2)]
+    envelhecer(repositorio, ids[0], 20)
+    envelhecer(repositorio, ids[1], 10)
+    repositorio.obter(ids[0])  # usado agora: o mais antigo passa a ser o segundo
+    terceiro = repositorio.registrar("doc2.txt", "2" * 100)
+    assert repositorio.obter(ids[1]) is None
+    assert repositorio.obter(ids[0]) is not None and repositorio.obter(terceiro) is not None
+
+
+def test_remover_documento(tmp_path):
+    repositorio = RepositorioDocumentos(pasta=str(tmp_path))
+    id_documento = repositorio.registrar("doc.txt", "texto")
+    assert repositorio.remover(id_documento)
+    assert repositorio.obter(id_documento) is None
+    assert not repositorio.remover(id_documento)
+    assert not repositorio.remover("../doc")
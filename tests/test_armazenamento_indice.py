@@ -0,0 +1,55 @@
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from armazenamento_indice import IndiceMmap, carregar_faiss_de_mmap, salvar_indice_mmap
+from tipos_indice import construir_indice, normalizar_config_indice
+
+
+def criar_db(embeddings, quantidade: int = 200) -> FAISS:
+    textos = [f"chunk número {i}" for i in range(quantidade)]
+    metadados = [{"source": f"fonte{i % 3}"} for i in range(quantidade)]
+    return FAISS.from_texts(textos, embeddings, metadatas=metadados, ids=[f"id{i}" for i in range(quantidade)])
+
+
+def resultados(pares):
+    return [(doc.id, doc.page_content, doc.metadata, round(distancia, 2)) for doc, distancia in pares]
+
+
+def test_busca_mmap_igual_a_do_faiss(tmp_path, embeddings):
+    db = criar_db(embeddings)
+    salvar_indice_mmap(str(tmp_path), db, "modelo")
+    indice = IndiceMmap(str(tmp_path))
+    for consulta in ("chunk número 7", "outra pergunta", "fonte"):
+        vetor = embeddings.embed_query(consulta)
+        assert resultados(indice.similarity_search_with_score_by_vector(vetor, k=5)) == \
+            resultados(db.similarity_search_with_score_by_vector(vetor, k=5))
+    assert indice.documentos_por_ids(["id3", "inexistente"])["id3"].page_content == "chunk número 3"
+    indice.fechar()
+
+
+def test_indice_ann_e_lido_mapeado_e_busca_igual(tmp_path, embeddings):
+    db = criar_db(embeddings)
+    vetores = db.index.reconstruct_n(0, db.index.ntotal)
+    config = normalizar_config_indice({"tipo": "ivf_flat", "nlist": 4, "nprobe": 4})
+    salvar_indice_mmap(str(tmp_path), db, "modelo", indice_ann=construir_indice(vetores, config))
+    indice = IndiceMmap(str(tmp_path))
+    listas = faiss.extract_index_ivf(indice._indice_ann).invlists
+    assert isinstance(faiss.downcast_InvertedLists(listas), faiss.OnDiskInvertedLists)
+
+    # Com nprobe == nlist o IVF percorre todas as listas: o resultado é o da busca exata
+    vetor = embeddings.embed_query("chunk número 42")
+    assert resultados(indice.similarity_search_with_score_by_vector(vetor, k=5)) == \
+        resultados(db.similarity_search_with_score_by_vector(vetor, k=5))
+    indice.fechar()
+
+
+def test_reabrir_como_faiss(tmp_path, embeddings):
+    db = criar_db(embeddings, quantidade=20)
+    salvar_indice_mmap(str(tmp_path), db, "modelo")
+    reaberto = carregar_faiss_de_mmap(str(tmp_path), embeddings)
+    assert reaberto.index.ntotal == 20
+    assert np.allclose(reaberto.index.reconstruct_n(0, 20), db.index.reconstruct_n(0, 20))
+    vetor = embeddings.embed_query("chunk número 3")
+    assert resultados(reaberto.similarity_search_with_score_by_vector(vetor, k=3)) == \
+        resultados(db.similarity_search_with_score_by_vector(vetor, k=3))
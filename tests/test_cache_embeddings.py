@@ -0,0 +1,117 @@
+import multiprocessing
+
+import numpy as np
+
+from cache_embeddings import CacheEmbeddings, EmbeddingsComCache
+
+
+def vetor(i: int, dimensao: int = 8) -> list:
+    return [float(i)] * dimensao
+
+
+def test_salvar_e_carregar(tmp_path):
+    cache = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    cache.armazenar({f"k{i}": vetor(i) for i in range(5)})
+    cache.salvar()
+    recarregado = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    assert recarregado.buscar(["k3", "ausente"]) == {"k3": vetor(3)}
+
+
+def test_segundo_escritor_so_le_enquanto_o_primeiro_grava(tmp_path):
+    # Dois objetos abrem o '.lock' separadamente: o flock conflita como entre dois processos
+    primeiro = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    segundo = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    primeiro.armazenar({"a": vetor(1)})
+    segundo.armazenar({"b": vetor(2)})
+    assert len(segundo) == 0
+    primeiro.salvar()
+
+    # Liberado o lock, o segundo recarrega o que o primeiro gravou antes de reservar slots
+    segundo.armazenar({"b": vetor(2)})
+    segundo.salvar()
+    final = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    assert final.buscar(["a", "b"]) == {"a": vetor(1), "b": vetor(2)}
+
+
+def test_leitor_recarrega_quando_o_indice_muda(tmp_path):
+    leitor = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    escritor = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    escritor.armazenar({"a": vetor(1)})
+    escritor.salvar()
+    assert leitor.buscar(["a"]) == {"a": vetor(1)}
+
+
+def test_despejo_nao_devolve_vetor_de_outra_chave(tmp_path):
+    escritor = CacheEmbeddings("modelo", pasta_base=str(tmp_path), capacidade_maxima=10)
+    escritor.armazenar({f"k{i}": vetor(i) for i in range(10)})
+    escritor.salvar()
+    leitor = CacheEmbeddings("modelo", pasta_base=str(tmp_path), capacidade_maxima=10)
+
+    escritor.armazenar({"novo": vetor(99)})  # despeja a entrada mais antiga e reaproveita o slot
+    encontrados = leitor.buscar([f"k{i}" for i in range(10)])
+    assert len(encontrados) == 9
+    assert all(v == vetor(int(k[1:])) for k, v in encontrados.items())
+    escritor.salvar()
+
+
+def _construir(pasta: str, inicio: int, barreira):
+    cache = CacheEmbeddings("modelo", pasta_base=pasta)
+    barreira.wait()
+    for lote in range(inicio, inicio + 200, 20):
+        cache.armazenar({f"k{i}": vetor(i) for i in range(lote, lote + 20)})
+        cache.salvar()
+
+
+def test_processos_concorrentes_nao_trocam_vetores(tmp_path):
+    contexto = multiprocessing.get_context("fork")
+    barreira = contexto.Barrier(2)
+    processos = [contexto.Process(target=_construir, args=(str(tmp_path), inicio, barreira)) for inicio in (0, 1000)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join(30)
+        assert processo.exitcode == 0
+
+    cache = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    encontrados = cache.buscar([f"k{i}" for i in list(range(200)) + list(range(1000, 1200))])
+    assert encontrados
+    assert all(v == vetor(int(k[1:])) for k, v in encontrados.items())
+
+
+def test_embeddings_com_cache_embute_cada_texto_uma_vez(tmp_path, embeddings):
+    cache = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+    com_cache = EmbeddingsComCache(embeddings, "modelo", cache=cache)
+    primeira = com_cache.embed_documents(["x", "y", "x"])
+    segunda = com_cache.embed_documents(["y", "x"])
+    assert embeddings.textos_embutidos == 2
+    assert np.allclose(segunda, [primeira[1], primeira[0]])
+
+
+class ModeloConsulta:
+    def embed_query(self, texto: str) -> list:
+        return vetor(len(texto))
+
+
+def _consultar_e_esperar(pasta: str, consultou, terminar):
+    com_cache = EmbeddingsComCache(ModeloConsulta(), "modelo", cache=CacheEmbeddings("modelo", pasta_base=pasta))
+    com_cache.embed_query("pergunta")
+    consultou.set()
+    terminar.wait(30)
+
+
+def test_consulta_nao_segura_o_lock_de_escrita(tmp_path):
+    # Um gateway que só responde perguntas não pode impedir outro processo de gravar no cache
+    contexto = multiprocessing.get_context("fork")
+    consultou, terminar = contexto.Event(), contexto.Event()
+    gateway = contexto.Process(target=_consultar_e_esperar, args=(str(tmp_path), consultou, terminar))
+    gateway.start()
+    try:
+        assert consultou.wait(30)
+        construtor = CacheEmbeddings("modelo", pasta_base=str(tmp_path))
+        construtor.armazenar({"a": vetor(1)})
+        construtor.salvar()
+    finally:
+        terminar.set()
+        gateway.join(30)
+    assert gateway.exitcode == 0
+    assert CacheEmbeddings("modelo", pasta_base=str(tmp_path)).buscar(["a"]) == {"a": vetor(1)}
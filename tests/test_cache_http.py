@@ -0,0 +1,82 @@
+import os
+import time
+
+import cache_http
+from cache_http import CacheHTTP
+
+
+class RespostaFalsa:
+    def __init__(self, status_code: int, text: str = "", headers: dict = None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def close(self):
+        pass
+
+
+class ServidorFalso:
+    """Responde 304 quando o If-None-Match bate com o ETag atual, e a página inteira caso contrário."""
+
+    def __init__(self, html: str = "<p>v1</p>", etag: str = '"v1"'):
+        self.html, self.etag = html, etag
+        self.requisicoes = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requisicoes.append(dict(headers or {}))
+        if (headers or {}).get("If-None-Match") == self.etag:
+            return RespostaFalsa(304)
+        return RespostaFalsa(200, self.html, {"ETag": self.etag})
+
+
+def envelhecer(cache: CacheHTTP, url: str, segundos: float):
+    entrada = cache.ler_entrada(url)
+    entrada["buscado_em"] -= segundos
+    cache._gravar_entrada(entrada)
+    instante = time.time() - segundos
+    os.utime(cache._caminho(url), (instante, instante))
+
+
+def test_revalidacao_com_304_reaproveita_a_entrada(tmp_path, monkeypatch):
+    servidor = ServidorFalso()
+    monkeypatch.setattr(cache_http.requests, "get", servidor.get)
+    cache = CacheHTTP(pasta=str(tmp_path), ttl_segundos=60)
+    url = "https://exemplo.com/pagina"
+
+    assert cache.buscar_html(url)[1] == 'rede'
+    cache.salvar_texto(url, "extrator", "texto extraído")
+    assert cache.buscar_html(url)[1] == 'cache'
+    assert len(servidor.requisicoes) == 1
+
+    envelhecer(cache, url, 120)
+    entrada, origem = cache.buscar_html(url)
+    assert origem == 'revalidado'
+    assert servidor.requisicoes[-1]["If-None-Match"] == '"v1"'
+    assert entrada["textos"] == {"extrator": "texto extraído"}
+    assert cache.esta_fresca(cache.ler_entrada(url))
+
+    # Página alterada: baixada de novo, sem os textos extraídos da versão anterior
+    servidor.html, servidor.etag = "<p>v2</p>", '"v2"'
+    envelhecer(cache, url, 120)
+    entrada, origem = cache.buscar_html(url)
+    assert (origem, entrada["html"], entrada["textos"]) == ('rede', "<p>v2</p>", {})
+
+
+def test_entradas_sem_uso_expiram_e_capacidade_apaga_as_mais_antigas(tmp_path):
+    cache = CacheHTTP(pasta=str(tmp_path), expiracao_segundos=3600, capacidade_bytes=10_000)
+    for i in range(3):
+        cache.registrar(f"https://exemplo.com/{i}", "x" * 1000)
+    envelhecer(cache, "https://exemplo.com/0", 7200)
+    envelhecer(cache, "https://exemplo.com/1", 60)
+    assert cache.podar() == 1
+    assert cache.ler_entrada("https://exemplo.com/0") is None
+
+    # Passando da capacidade, as gravadas há mais tempo saem primeiro
+    cache.registrar("https://exemplo.com/grande", "y" * 9000)
+    assert cache.ler_entrada("https://exemplo.com/1") is None
+    assert cache.ler_entrada("https://exemplo.com/grande") is not None
+    assert sum(os.path.getsize(os.path.join(tmp_path, nome)) for nome in os.listdir(tmp_path)) <= 10_000
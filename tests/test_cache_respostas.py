@@ -0,0 +1,98 @@
+import os
+import threading
+
+from cache_respostas import CacheRespostas
+
+
+def escopo(i: int = 0) -> str:
+    return CacheRespostas.calcular_escopo("gerador_principal", "modelo", "template", [f"chunk-{i}"])
+
+
+def test_acerto_exato_ignora_caixa_e_pontuacao(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "c.json"))
+    cache.armazenar(escopo(), "Como instalar o pacote?", "resposta")
+    assert cache.buscar(escopo(), "  como instalar o PACOTE ") == "resposta"
+    assert cache.buscar(escopo(1), "como instalar o pacote") is None
+
+
+def test_acerto_por_similaridade_respeita_o_limiar(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "c.json"), limiar_similaridade=0.95)
+    cache.armazenar(escopo(), "pergunta original", "resposta", vetor_pergunta=[1.0, 0.0])
+    assert cache.buscar(escopo(), "outra forma de perguntar", vetor_pergunta=[0.99, 0.05]) == "resposta"
+    assert cache.buscar(escopo(), "assunto diferente", vetor_pergunta=[0.5, 0.5]) is None
+
+
+def test_lru_descarta_a_entrada_menos_usada(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "c.json"), capacidade=2)
+    cache.armazenar(escopo(), "a", "1")
+    cache.armazenar(escopo(), "b", "2")
+    cache.buscar(escopo(), "a")
+    cache.armazenar(escopo(), "c", "3")
+    assert cache.buscar(escopo(), "b") is None
+    assert cache.buscar(escopo(), "a") == "1"
+
+
+def test_salvar_e_carregar(tmp_path):
+    caminho = str(tmp_path / "sub" / "c.json")
+    cache = CacheRespostas(caminho=caminho)
+    cache.armazenar(escopo(), "pergunta", "resposta", vetor_pergunta=[3.0, 4.0])
+    assert cache.salvar()
+    recarregado = CacheRespostas(caminho=caminho)
+    assert recarregado.buscar(escopo(), "pergunta") == "resposta"
+
+
+def test_salvamentos_concorrentes_nao_falham(tmp_path):
+    caminho = str(tmp_path / "c.json")
+    cache = CacheRespostas(caminho=caminho)
+    erros = []
+
+    def responder(i):
+        try:
+            for j in range(20):
+                cache.armazenar(escopo(i), f"pergunta {j}", f"resposta {i}-{j}")
+                assert cache.salvar()
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=responder, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not erros
+    assert [nome for nome in os.listdir(tmp_path) if nome.endswith(".tmp")] == []
+    assert CacheRespostas(caminho=caminho).status()["entradas"] == 160
+
+
+def test_talvez_salvar_respeita_o_intervalo(tmp_path):
+    caminho = str(tmp_path / "c.json")
+    cache = CacheRespostas(caminho=caminho, intervalo_salvamento=3600)
+    cache.armazenar(escopo(), "pergunta", "resposta")
+    assert not cache.talvez_salvar()
+    assert not os.path.exists(caminho)
+    cache.intervalo_salvamento = 0
+    assert cache.talvez_salvar()
+    assert os.path.exists(caminho)
+
+
+def test_falha_ao_salvar_nao_propaga(tmp_path, monkeypatch):
+    cache = CacheRespostas(caminho=str(tmp_path / "c.json"))
+    cache.armazenar(escopo(), "pergunta", "resposta")
+
+    def disco_cheio(origem, destino):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "replace", disco_cheio)
+    assert cache.salvar() is False
+    assert [nome for nome in os.listdir(tmp_path) if nome.endswith(".tmp")] == []
+    assert cache.buscar(escopo(), "pergunta") == "resposta"
+
+
+def test_salvar_descarta_entradas_vencidas(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "c.json"), ttl_segundos=60)
+    cache.armazenar(escopo(), "antiga", "1")
+    cache.armazenar(escopo(), "nova", "2")
+    next(iter(cache._entradas.values()))["criada_em"] -= 120
+    assert cache.salvar()
+    assert cache.status()["entradas"] == 1
+    assert CacheRespostas(caminho=str(tmp_path / "c.json")).status()["entradas"] == 1
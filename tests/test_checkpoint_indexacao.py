@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from armazenamento_indice import IndiceMmap
+from checkpoint_indexacao import CheckpointIndexacao, ARQUIVO_ESTADO
+from repositorio_indices import resolver_pasta_indice
+
+
+def ids_no_indice(pasta_contexto) -> list:
+    indice = IndiceMmap(resolver_pasta_indice(str(pasta_contexto)))
+    try:
+        return sorted(id_chunk for ids, _, _ in indice.iterar_lotes() for id_chunk in ids)
+    finally:
+        indice.fechar()
+
+
+def acumular_lote(checkpoint, embeddings, ids, fonte):
+    textos = [f"texto do chunk {id_chunk}" for id_chunk in ids]
+    checkpoint.acumular(ids, textos, [{"source": fonte} for _ in ids], embeddings.embed_documents(textos))
+    checkpoint.concluir_fonte(fonte, {"hash": fonte, "ids_chunks": ids})
+
+
+def test_retoma_com_os_segmentos_confirmados(tmp_path, embeddings):
+    checkpoint = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path))
+    acumular_lote(checkpoint, embeddings, ["a", "b"], "f1")
+    checkpoint.salvar()
+    acumular_lote(checkpoint, embeddings, ["c"], "f2")
+    checkpoint.salvar()
+
+    retomado = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path))
+    assert set(retomado.carregar()) == {"f1", "f2"}
+    segmentos = list(retomado.iterar_segmentos())
+    assert [ids for ids, _, _, _ in segmentos] == [["a", "b"], ["c"]]
+    ids, textos, metadados, vetores = segmentos[1]
+    assert textos == ["texto do chunk c"] and metadados == [{"source": "f2"}]
+    assert vetores.shape == (1, embeddings.dimensao)
+
+
+def test_segmento_sem_estado_e_ignorado(tmp_path, embeddings):
+    checkpoint = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path))
+    acumular_lote(checkpoint, embeddings, ["a"], "f1")
+    checkpoint.salvar()
+    estado = open(os.path.join(checkpoint.pasta, ARQUIVO_ESTADO), encoding='utf-8').read()
+    # Interrupção depois de gravar o segundo segmento, antes de confirmar o estado
+    acumular_lote(checkpoint, embeddings, ["b"], "f2")
+    checkpoint.salvar()
+    with open(os.path.join(checkpoint.pasta, ARQUIVO_ESTADO), 'w', encoding='utf-8') as f:
+        f.write(estado)
+
+    retomado = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path))
+    assert set(retomado.carregar()) == {"f1"}
+    assert [ids for ids, _, _, _ in retomado.iterar_segmentos()] == [["a"]]
+
+
+def test_outro_modelo_invalida_o_checkpoint(tmp_path, embeddings):
+    checkpoint = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path))
+    acumular_lote(checkpoint, embeddings, ["a"], "f1")
+    checkpoint.salvar()
+    assert CheckpointIndexacao("ctx", "outro-modelo", pasta_base=str(tmp_path)).carregar() is None
+
+
+def test_talvez_salvar_respeita_o_intervalo_em_chunks(tmp_path, embeddings):
+    checkpoint = CheckpointIndexacao("ctx", "modelo", intervalo_chunks=3, intervalo_segundos=3600, pasta_base=str(tmp_path))
+    acumular_lote(checkpoint, embeddings, ["a", "b"], "f1")
+    assert not checkpoint.talvez_salvar()
+    acumular_lote(checkpoint, embeddings, ["c"], "f2")
+    assert checkpoint.talvez_salvar()
+    assert checkpoint.existe()
+    checkpoint.descartar()
+    assert not checkpoint.existe()
+
+
+def test_criacao_interrompida_retoma_sem_embutir_de_novo(tmp_path, monkeypatch, embeddings):
+    gerenciador_indices = pytest.importorskip("gerenciador_indices")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gerenciador_indices, "PASTA_BASE_INDICES", str(tmp_path / "indices"))
+    fontes = []
+    for i in range(4):
+        caminho = tmp_path / f"f{i}.txt"
+        caminho.write_text(" ".join(f"Frase {j} do arquivo {i} com conteúdo suficiente." for j in range(600)), encoding='utf-8')
+        fontes.append(str(caminho))
+    contexto = {"nome_exibicao": "Teste", "fontes": fontes}
+
+    registrar = gerenciador_indices.registrar_fonte_no_manifesto
+    chamadas = []
+
+    # Com ~120 chunks por fonte, os primeiros lotes (e checkpoints) já foram gravados na última fonte
+    def interromper_na_ultima(*args):
+        chamadas.append(args[1])
+        if len(chamadas) == len(fontes):
+            raise KeyboardInterrupt
+        return registrar(*args)
+
+    monkeypatch.setattr(gerenciador_indices, "registrar_fonte_no_manifesto", interromper_na_ultima)
+    with pytest.raises(KeyboardInterrupt):
+        gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, embeddings, checkpoint_a_cada=1)
+    monkeypatch.setattr(gerenciador_indices, "registrar_fonte_no_manifesto", registrar)
+    embutidos_antes = embeddings.textos_embutidos
+
+    retomado = type(embeddings)()
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, retomado, checkpoint_a_cada=1)
+    referencia = type(embeddings)()
+    monkeypatch.setattr(gerenciador_indices, "PASTA_BASE_INDICES", str(tmp_path / "referencia"))
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, referencia)
+
+    assert embutidos_antes > 0
+    assert retomado.textos_embutidos < referencia.textos_embutidos
+    assert ids_no_indice(tmp_path / "indices" / "ctx") == ids_no_indice(tmp_path / "referencia" / "ctx")
+    assert not os.path.exists(os.path.join("checkpoints_indices", "ctx"))
+
+
+def test_retomada_reprocessa_fonte_que_duplicava_uma_fonte_removida(tmp_path, embeddings):
+    gerenciador_indices = pytest.importorskip("gerenciador_indices")
+    checkpoint = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path / "checkpoints"))
+    acumular_lote(checkpoint, embeddings, ["a"], "f1")
+    acumular_lote(checkpoint, embeddings, ["b"], "f2")
+    checkpoint.concluir_fonte("f2", {"hash": "f2", "ids_chunks": ["b"], "duplicados": {"x": "a"}})
+    checkpoint.salvar()
+
+    # f1 (dona do chunk mantido no lugar de 'x') saiu do contexto: f2 volta a ser pendente
+    retomado = CheckpointIndexacao("ctx", "modelo", pasta_base=str(tmp_path / "checkpoints"))
+    manifesto = gerenciador_indices.novo_manifesto()
+    gravacao = gerenciador_indices.GravacaoIndice(str(tmp_path / "indices" / "ctx"))
+    reaproveitados = gerenciador_indices.retomar_checkpoint(retomado, retomado.carregar(), ["f2"], manifesto, gravacao, None)
+    gravacao.descartar()
+    assert manifesto["fontes"] == {}
+    assert len(gravacao) == 0
+    assert set(reaproveitados) == {"b"}
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from codificador_consultas import CodificadorConsultas
+
+
+class ModeloFalso:
+    """Registra cada lote recebido; o vetor de uma pergunta é o seu tamanho."""
+
+    def __init__(self, falhar: bool = False):
+        self.lotes = []
+        self.falhar = falhar
+
+    def embed_queries(self, textos):
+        self.lotes.append(list(textos))
+        if self.falhar:
+            raise RuntimeError("modelo indisponível")
+        return [[float(len(texto))] for texto in textos]
+
+
+def test_perguntas_simultaneas_em_um_unico_lote():
+    modelo = ModeloFalso()
+    codificador = CodificadorConsultas(modelo, janela_ms=50)
+    perguntas = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    async def cenario():
+        return await asyncio.gather(*(codificador.codificar(p) for p in perguntas))
+
+    assert asyncio.run(cenario()) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert modelo.lotes == [perguntas]
+    assert codificador.status()["tamanho_medio_lote"] == 5
+
+
+def test_lote_respeita_o_tamanho_maximo():
+    modelo = ModeloFalso()
+    codificador = CodificadorConsultas(modelo, janela_ms=50, tamanho_maximo_lote=4)
+
+    async def cenario():
+        return await asyncio.gather(*(codificador.codificar(f"p{i}") for i in range(10)))
+
+    asyncio.run(cenario())
+    assert [len(lote) for lote in modelo.lotes] == [4, 4, 2]
+
+
+def test_perguntas_repetidas_usam_o_cache_e_o_mesmo_resultado_em_voo():
+    modelo = ModeloFalso()
+    codificador = CodificadorConsultas(modelo, janela_ms=10, capacidade_cache=2)
+
+    async def cenario():
+        iguais = await asyncio.gather(*(codificador.codificar("  pergunta ") for _ in range(3)))
+        repetida = await codificador.codificar("pergunta")
+        await codificador.codificar("outra")
+        await codificador.codificar("mais uma")  # despeja "pergunta" (LRU)
+        await codificador.codificar("pergunta")
+        return iguais, repetida
+
+    iguais, repetida = asyncio.run(cenario())
+    assert iguais == [[8.0]] * 3 and repetida == [8.0]
+    assert modelo.lotes == [["pergunta"], ["outra"], ["mais uma"], ["pergunta"]]
+    assert codificador.status()["acertos"] == 1
+
+
+def test_erro_do_modelo_chega_a_todos_e_o_trabalhador_continua():
+    modelo = ModeloFalso(falhar=True)
+    codificador = CodificadorConsultas(modelo, janela_ms=10)
+
+    async def cenario():
+        resultados = await asyncio.gather(*(codificador.codificar(p) for p in ("a", "b")), return_exceptions=True)
+        modelo.falhar = False
+        return resultados, await codificador.codificar("a")
+
+    resultados, depois = asyncio.run(cenario())
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+    assert depois == [1.0]
+
+
+def test_cancelar_uma_requisicao_nao_afeta_quem_espera_a_mesma_pergunta():
+    codificador = CodificadorConsultas(ModeloFalso(), janela_ms=50)
+
+    async def cenario():
+        cancelada = asyncio.ensure_future(codificador.codificar("pergunta"))
+        outra = asyncio.ensure_future(codificador.codificar("pergunta"))
+        await asyncio.sleep(0)
+        cancelada.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelada
+        return await outra
+
+    assert asyncio.run(cenario()) == [8.0]
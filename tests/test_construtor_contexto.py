@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import construtor_contexto
+from construtor_contexto import construir_contexto, criar_contador_tokens
+
+
+class TokenizadorDenso:
+    """Imita um tokenizer que gera mais tokens que a estimativa (~3 caracteres por token)."""
+
+    def contar(self, texto: str) -> int:
+        return -(-len(texto) // 3)
+
+
+class TiktokenFalso:
+    """Conhece só os modelos da OpenAI, como o `tiktoken.encoding_for_model`."""
+
+    class Codificacao:
+        def __init__(self, nome):
+            self.nome = nome
+
+        def encode(self, texto, disallowed_special=()):
+            return texto.split()
+
+    def list_encoding_names(self):
+        return ["cl100k_base", "o200k_base"]
+
+    def get_encoding(self, nome):
+        return self.Codificacao(nome)
+
+    def encoding_for_model(self, modelo):
+        if not modelo.startswith("gpt-"):
+            raise KeyError(modelo)
+        return self.Codificacao("o200k_base")
+
+
+def test_contexto_e_resposta_cabem_na_janela_com_a_estimativa(monkeypatch):
+    monkeypatch.setattr(construtor_contexto, "tiktoken", None)
+    contar = criar_contador_tokens()
+    real = TokenizadorDenso()
+    janela, reserva_resposta = 1024, 256
+    chunks = [f"Trecho {i}: " + "configuração do índice vetorial " * 12 for i in range(40)]
+
+    resultado = construir_contexto(chunks, janela - reserva_resposta, contar)
+    assert resultado["chunks_usados"] > 0
+    assert real.contar(resultado["contexto"]) + reserva_resposta <= janela
+
+
+def test_codificacao_escolhida_por_modelo(monkeypatch):
+    monkeypatch.setattr(construtor_contexto, "tiktoken", TiktokenFalso())
+    texto = "uma frase com seis palavras aqui"
+
+    # Modelo conhecido pelo tiktoken: contagem exata, sem margem
+    assert criar_contador_tokens(modelo_nuvem="openai/gpt-4o-mini")(texto) == 6
+    # Codificação configurada no serviço
+    assert criar_contador_tokens(modelo_nuvem="qwen/qwen3-32b:free", tokenizador="o200k_base")(texto) == 6
+    # Modelo desconhecido: cl100k_base com margem
+    assert criar_contador_tokens(modelo_nuvem="qwen/qwen3-32b:free")(texto) == 7
+
+
+def test_prompt_do_gateway_e_resposta_cabem_na_janela(monkeypatch):
+    servidor = pytest.importorskip("servidor_modelo_local")
+    monkeypatch.setattr(construtor_contexto, "tiktoken", None)
+    monkeypatch.setitem(servidor.CONFIG, "servicos", {"gerador_principal": {"tipo": "nuvem", "id_openrouter": "qwen/qwen3-32b",
+                                                                            "janela_contexto": 2048}})
+    monkeypatch.setitem(servidor.CONFIG, "parametros_inferencia_padrao", {"max_tokens": 512})
+    monkeypatch.setattr(servidor, "contadores_tokens", {})
+    pergunta = "Como configurar o índice vetorial?"
+    chunks = [f"Trecho {i}: " + "configuração do índice vetorial " * 12 for i in range(60)]
+
+    ajuste = asyncio.run(servidor.ajustar_contexto("gerador_principal", pergunta, chunks=chunks))
+    prompt = servidor.montar_prompt_rag(ajuste["contexto"], pergunta)
+    assert ajuste["chunks_descartados_orcamento"] > 0
+    assert TokenizadorDenso().contar(prompt) + 512 <= 2048
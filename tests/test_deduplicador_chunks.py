@@ -0,0 +1,39 @@
+from deduplicador_chunks import DeduplicadorChunks, MOTIVO_EXATA, MOTIVO_QUASE
+
+BASE = ("O serviço de ingestão lê os arquivos do bucket, valida o esquema de cada registro, "
+        "descarta as linhas inválidas e grava o resultado particionado por data no data lake. ")
+
+
+def test_duplicata_exata_ignora_caixa_e_espacos():
+    deduplicador = DeduplicadorChunks()
+    assert deduplicador.verificar("a", BASE * 2) is None
+    assert deduplicador.verificar("b", "  " + (BASE * 2).upper()) == MOTIVO_EXATA
+    assert deduplicador.descartados_exatos == 1
+
+
+def test_quase_duplicata_respeita_o_limiar():
+    original = " ".join(f"{BASE} Parte {i}." for i in range(4))
+    quase = original.replace("data lake", "data lakehouse", 1)  # Jaccard estimado ~0.84
+    diferente = "Um texto completamente diferente sobre o cache de respostas do gateway e o seu TTL."
+    deduplicador = DeduplicadorChunks(limiar_jaccard=0.7)
+    assert deduplicador.verificar("a", original) is None
+    assert deduplicador.verificar("b", quase) == MOTIVO_QUASE
+    assert deduplicador.verificar("c", diferente) is None
+
+    exigente = DeduplicadorChunks(limiar_jaccard=0.95)
+    assert exigente.verificar("a", original) is None
+    assert exigente.verificar("b", quase) is None
+
+    # Sem limiar, só duplicatas exatas são descartadas
+    sem_limiar = DeduplicadorChunks(limiar_jaccard=None)
+    assert sem_limiar.verificar("a", original) is None
+    assert sem_limiar.verificar("b", quase) is None
+
+
+def test_remover_libera_o_texto_para_um_novo_id():
+    deduplicador = DeduplicadorChunks()
+    deduplicador.registrar("antigo", BASE)
+    assert deduplicador.verificar("novo", BASE) == MOTIVO_EXATA
+    deduplicador.remover("antigo")
+    assert deduplicador.verificar("novo", BASE) is None
+    assert deduplicador.total_descartados == 1
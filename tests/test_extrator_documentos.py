@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import pytest
+
+extrator_documentos = pytest.importorskip("extrator_documentos")
+
+from extrator_documentos import CacheExtracao, extrair_documentos
+
+
+@pytest.fixture
+def extracoes(monkeypatch):
+    """Conta os arquivos realmente extraídos (com processos=1 a extração roda no próprio processo)."""
+    extraidos = []
+    extrair = extrator_documentos.extrair_texto_de_arquivo
+
+    def contar(caminho):
+        extraidos.append(os.path.basename(caminho))
+        return extrair(caminho)
+
+    monkeypatch.setattr(extrator_documentos, "extrair_texto_de_arquivo", contar)
+    return extraidos
+
+
+def escrever(caminho, texto: str):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(texto)
+
+
+def test_arquivo_sem_mudancas_vem_do_cache(tmp_path, extracoes):
+    cache = CacheExtracao(str(tmp_path / "cache"))
+    fonte = str(tmp_path / "a.txt")
+    escrever(fonte, "conteúdo original")
+    assert extrair_documentos([fonte], processos=1, cache=cache)[0]["texto"] == "conteúdo original"
+
+    # Uma nova sessão (índice relido do disco) não extrai de novo
+    documentos = extrair_documentos([fonte], processos=1, cache=CacheExtracao(str(tmp_path / "cache")))
+    assert documentos == [{"nome": "a.txt", "caminho": fonte, "texto": "conteúdo original"}]
+    assert extracoes == ["a.txt"]
+
+
+def test_arquivo_alterado_e_extraido_de_novo(tmp_path, extracoes):
+    cache = CacheExtracao(str(tmp_path / "cache"))
+    fonte = str(tmp_path / "a.txt")
+    escrever(fonte, "versão 1")
+    extrair_documentos([fonte], processos=1, cache=cache)
+    escrever(fonte, "versão 2 do arquivo")
+    assert extrair_documentos([fonte], processos=1, cache=cache)[0]["texto"] == "versão 2 do arquivo"
+    assert extracoes == ["a.txt", "a.txt"]
+
+
+def test_mtime_alterado_sem_mudar_o_conteudo_reaproveita_o_texto(tmp_path, extracoes):
+    cache = CacheExtracao(str(tmp_path / "cache"))
+    fonte = str(tmp_path / "a.txt")
+    escrever(fonte, "mesmo conteúdo")
+    extrair_documentos([fonte], processos=1, cache=cache)
+    os.utime(fonte, (1, 1))
+    copia = str(tmp_path / "copia.txt")
+    shutil.copy(fonte, copia)
+    textos = [d["texto"] for d in extrair_documentos([fonte, copia], processos=1, cache=cache)]
+    assert textos == ["mesmo conteúdo"] * 2
+    assert extracoes == ["a.txt"]
+
+
+def test_nova_versao_do_extrator_invalida_o_cache(tmp_path, extracoes, monkeypatch):
+    fonte = str(tmp_path / "a.txt")
+    escrever(fonte, "texto")
+    extrair_documentos([fonte], processos=1, cache=CacheExtracao(str(tmp_path / "cache")))
+    monkeypatch.setattr(extrator_documentos, "VERSAO_EXTRATOR", extrator_documentos.VERSAO_EXTRATOR + 1)
+    extrair_documentos([fonte], processos=1, cache=CacheExtracao(str(tmp_path / "cache")))
+    assert extracoes == ["a.txt", "a.txt"]
+
+
+def test_planilha_lida_em_modo_read_only(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    caminho = str(tmp_path / "dados.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "Vendas"
+    workbook.active.append(["produto", "total"])
+    workbook.active.append(["caneta", 3])
+    workbook.save(caminho)
+    assert extrator_documentos.extrair_texto_de_xlsx(caminho) == "--- Planilha: Vendas ---\n\nproduto\ttotal\ncaneta\t3\n"
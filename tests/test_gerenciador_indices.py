@@ -0,0 +1,223 @@
+import os
+import time
+import argparse
+import threading
+
+import pytest
+
+gerenciador_indices = pytest.importorskip("gerenciador_indices")
+
+from cache_embeddings import CacheEmbeddings, EmbeddingsComCache
+from indice_bm25 import fundir_rrf
+from repositorio_indices import RepositorioIndices, listar_contextos_indexados
+
+
+def escrever_fonte(caminho, paragrafos):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(paragrafos))
+
+
+def paragrafo(i: int) -> str:
+    return " ".join(f"O componente {i} processa a etapa {j} do pipeline de ingestão sem perder dados." for j in range(6))
+
+
+@pytest.fixture
+def contexto(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gerenciador_indices, "PASTA_BASE_INDICES", str(tmp_path / "indices"))
+    fonte = str(tmp_path / "fonte.txt")
+    escrever_fonte(fonte, [paragrafo(i) for i in range(6)])
+    return {"nome_exibicao": "Teste", "fontes": [fonte]}
+
+
+def busca_hibrida(versao, pergunta, vetor, k):
+    """Mesmo critério do gateway: vetoriais identificados por `Document.id`, BM25 pelo id do chunk."""
+    resultados = versao.indice.similarity_search_with_score_by_vector(vetor, k=k)
+    ranking_vetorial = [doc.id for doc, _ in resultados]
+    ranking_bm25 = [id_chunk for id_chunk, _ in versao.indice_bm25.buscar(pergunta, k)]
+    return ranking_vetorial, fundir_rrf(ranking_vetorial, ranking_bm25)
+
+
+@pytest.mark.parametrize("formato", ["faiss", "mmap"])
+def test_busca_hibrida_sem_chunks_duplicados_apos_atualizacao(contexto, embeddings, tmp_path, formato):
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, embeddings, formato=formato)
+    # Edita só o último parágrafo: os chunks anteriores são mantidos, os do fim são trocados
+    escrever_fonte(contexto["fontes"][0], [paragrafo(i) for i in range(5)] + ["Um parágrafo final novo sobre o pipeline. " * 8])
+    gerenciador_indices.atualizar_indice_incremental("ctx", contexto, embeddings)
+
+    repositorio = RepositorioIndices(embeddings, str(tmp_path / "indices"))
+    repositorio.carregar_todos()
+    with repositorio.usar(["ctx"]) as versoes:
+        versao = versoes["ctx"]
+        total = len(versao.indice_bm25)
+        pergunta = "componente pipeline ingestão"
+        ranking_vetorial, fundidos = busca_hibrida(versao, pergunta, embeddings.embed_query(pergunta), total)
+
+    assert None not in ranking_vetorial
+    ids = [id_chunk for id_chunk, _ in fundidos]
+    assert len(ids) == len(set(ids)) == total
+
+
+def test_espera_pelo_host_respeita_o_orcamento_da_fonte(monkeypatch):
+    monkeypatch.setattr(gerenciador_indices, "ORCAMENTO_TEMPO_POR_FONTE", 1.5)
+    monkeypatch.setattr(gerenciador_indices, "extrair_documento_url",
+                        lambda url, config: pytest.fail("não deveria baixar sem vaga no host"))
+    limitador = gerenciador_indices.LimitadorPorHost(1)
+    semaforo = limitador.semaforo("https://lento.example/a")
+    semaforo.acquire()  # outra fonte do mesmo host ocupando a única vaga
+    try:
+        inicio = time.monotonic()
+        assert gerenciador_indices.raspar_com_retentativas("https://lento.example/b", limitador) is None
+        assert time.monotonic() - inicio < 3
+    finally:
+        semaforo.release()
+
+
+def test_criacao_grava_em_fluxo_sem_faiss_em_memoria(contexto, embeddings, tmp_path, monkeypatch):
+    def falhar(*args, **kwargs):
+        raise AssertionError("o índice não deveria ser montado em memória")
+
+    monkeypatch.setattr(gerenciador_indices.FAISS, "from_embeddings", falhar)
+    monkeypatch.setattr(gerenciador_indices.FAISS, "add_embeddings", falhar)
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, embeddings)
+    escrever_fonte(contexto["fontes"][0], [paragrafo(i) for i in range(1, 8)])
+    gerenciador_indices.atualizar_indice_incremental("ctx", contexto, embeddings)
+
+    pasta = gerenciador_indices.resolver_pasta_indice(str(tmp_path / "indices" / "ctx"))
+    manifesto = gerenciador_indices.carregar_manifesto(pasta)
+    indice = gerenciador_indices.IndiceMmap(pasta)
+    ids = [id_chunk for lote, _, _ in indice.iterar_lotes() for id_chunk in lote]
+    indice.fechar()
+    assert sorted(ids) == sorted(manifesto["fontes"][contexto["fontes"][0]]["ids_chunks"])
+
+
+@pytest.mark.parametrize("formato", ["faiss", "mmap"])
+def test_atualizacao_com_indice_aproximado(contexto, embeddings, tmp_path, formato):
+    contexto["indice"] = {"tipo": "ivf_flat", "nlist": 2, "nprobe": 2}
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, embeddings, formato=formato)
+    escrever_fonte(contexto["fontes"][0], [paragrafo(i) for i in range(1, 8)])
+    gerenciador_indices.atualizar_indice_incremental("ctx", contexto, embeddings)
+
+    repositorio = RepositorioIndices(embeddings, str(tmp_path / "indices"))
+    repositorio.carregar_todos()
+    with repositorio.usar(["ctx"]) as versoes:
+        versao = versoes["ctx"]
+        total = len(versao.indice_bm25)
+        resultados = versao.indice.similarity_search_with_score_by_vector(embeddings.embed_query("componente 7"), k=total)
+    pasta = gerenciador_indices.resolver_pasta_indice(str(tmp_path / "indices" / "ctx"))
+    assert gerenciador_indices.detectar_formato(pasta) == formato
+    assert len({doc.id for doc, _ in resultados}) == total
+    assert any("componente 7" in doc.page_content for doc, _ in resultados)
+
+
+def test_lote_do_pipeline_ocupa_o_pool_de_processos(embeddings):
+    class MotorFalso:
+        tamanho_lote = 64
+
+        def __init__(self, processos):
+            self.processos = processos
+
+    class ComCache:
+        def __init__(self, base):
+            self.embeddings_base = base
+
+    assert gerenciador_indices.calcular_chunks_por_lote(embeddings) == gerenciador_indices.CHUNKS_POR_LOTE
+    assert gerenciador_indices.calcular_chunks_por_lote(ComCache(MotorFalso(1))) == gerenciador_indices.CHUNKS_POR_LOTE
+    assert gerenciador_indices.calcular_chunks_por_lote(ComCache(MotorFalso(8))) == 8 * 64 * 4
+    assert gerenciador_indices.calcular_chunks_por_lote(MotorFalso(2)) >= 2 * gerenciador_indices.MINIMO_TEXTOS_MULTIPROCESSO
+
+
+def textos_no_indice(tmp_path) -> list:
+    indice = gerenciador_indices.IndiceMmap(gerenciador_indices.resolver_pasta_indice(str(tmp_path / "indices" / "ctx")))
+    try:
+        return [documento.page_content for _, documentos, _ in indice.iterar_lotes() for documento in documentos]
+    finally:
+        indice.fechar()
+
+
+@pytest.mark.parametrize("mudanca", ["remover", "editar"])
+def test_paragrafo_compartilhado_continua_no_indice(contexto, embeddings, tmp_path, mudanca):
+    compartilhado = paragrafo(99)
+    fontes = [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+    escrever_fonte(fontes[0], [compartilhado] + [paragrafo(i) for i in range(3)])
+    escrever_fonte(fontes[1], [compartilhado] + [paragrafo(i) for i in range(3, 6)])
+    contexto["fontes"] = fontes
+    gerenciador_indices.criar_ou_atualizar_indice("ctx", contexto, embeddings)
+
+    pasta = gerenciador_indices.resolver_pasta_indice(str(tmp_path / "indices" / "ctx"))
+    registros = gerenciador_indices.carregar_manifesto(pasta)["fontes"]
+    dependente = next(fonte for fonte in fontes if registros[fonte]["duplicados"])
+    dona = next(fonte for fonte in fontes if fonte != dependente)
+    assert set(registros[dependente]["duplicados"].values()) <= set(registros[dona]["ids_chunks"])
+    frases = [f"O componente 99 processa a etapa {j} " for j in range(6)]
+    assert all(any(frase in texto for texto in textos_no_indice(tmp_path)) for frase in frases)
+
+    # A fonte que guardava a cópia mantida sai do contexto (ou deixa de ter o parágrafo)
+    if mudanca == "remover":
+        contexto["fontes"] = [dependente]
+    else:
+        escrever_fonte(dona, [paragrafo(i) for i in range(10, 13)])
+    gerenciador_indices.atualizar_indice_incremental("ctx", contexto, embeddings)
+
+    assert all(any(frase in texto for texto in textos_no_indice(tmp_path)) for frase in frases)
+    registros = gerenciador_indices.carregar_manifesto(gerenciador_indices.resolver_pasta_indice(str(tmp_path / "indices" / "ctx")))["fontes"]
+    assert not registros[dependente]["duplicados"]
+
+
+def argumentos_lote(**valores) -> argparse.Namespace:
+    """Os argumentos da linha de comando usados por `executar_acao_contexto`, com os valores padrão."""
+    padrao = {"formato": None, "checkpoint_a_cada": gerenciador_indices.INTERVALO_CHECKPOINT_CHUNKS,
+              "recomecar": False, "sem_deduplicacao": False, "amostras": 20, "k": 3}
+    return argparse.Namespace(**{**padrao, **valores})
+
+
+def contextos_lote(tmp_path, quantidade: int) -> dict:
+    contextos = {}
+    for c in range(quantidade):
+        fonte = str(tmp_path / f"fonte{c}.txt")
+        # Metade dos parágrafos se repete entre os contextos
+        escrever_fonte(fonte, [paragrafo(i) for i in range(3)] + [paragrafo(100 * (c + 1) + i) for i in range(3)])
+        contextos[f"ctx{c}"] = {"nome_exibicao": f"Contexto {c}", "fontes": [fonte]}
+    return contextos
+
+
+def test_lote_compartilha_o_modelo_e_o_cache_entre_contextos(contexto, embeddings, tmp_path):
+    contextos = contextos_lote(tmp_path, 3)
+    com_cache = EmbeddingsComCache(embeddings, "modelo", cache=CacheEmbeddings("modelo", pasta_base=str(tmp_path / "cache")))
+    resultados = gerenciador_indices.processar_contextos_em_lote("criar", list(contextos), contextos, com_cache,
+                                                                 argumentos_lote(), trabalhadores=1)
+
+    assert [(r["contexto"], r["status"]) for r in resultados] == [(c, "ok") for c in contextos]
+    assert listar_contextos_indexados(str(tmp_path / "indices")) == sorted(contextos)
+    # Os chunks repetidos entre contextos são embutidos uma única vez pelo modelo compartilhado
+    assert com_cache.acertos > 0
+    assert embeddings.textos_embutidos == com_cache.faltas
+
+
+def test_lote_em_paralelo_mantem_a_ordem_e_isola_erros(contexto, embeddings, tmp_path, monkeypatch):
+    contextos = contextos_lote(tmp_path, 3)
+    contextos["ctx1"]["indice"] = {"tipo": "inexistente"}
+    threads = set()
+    executar = gerenciador_indices.executar_acao_contexto
+
+    def registrar_thread(*args, **kwargs):
+        threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return executar(*args, **kwargs)
+
+    monkeypatch.setattr(gerenciador_indices, "executar_acao_contexto", registrar_thread)
+    resultados = gerenciador_indices.processar_contextos_em_lote("criar", list(contextos), contextos, embeddings,
+                                                                 argumentos_lote(), trabalhadores=2)
+
+    assert [r["contexto"] for r in resultados] == list(contextos)
+    assert [r["status"] == "ok" for r in resultados] == [True, False, True]
+    assert len(threads) == 2
+    assert listar_contextos_indexados(str(tmp_path / "indices")) == ["ctx0", "ctx2"]
+
+
+def test_resumo_do_lote_mostra_o_tempo_de_cada_contexto(capsys):
+    gerenciador_indices.exibir_resumo_lote([{"contexto": "ctx0", "segundos": 1.25, "status": "ok"},
+                                            {"contexto": "contexto_longo", "segundos": 2.0, "status": "erro: x"}], 2.5)
+    saida = capsys.readouterr().out
+    assert "ctx0" in saida and "1.2" in saida and "erro: x" in saida
+    assert "Tempo total: 2.5s (soma dos contextos: 3.2s) | com erro: 1" in saida
@@ -0,0 +1,55 @@
+from indice_bm25 import IndiceBM25, fundir_rrf, tokenizar
+
+
+def test_rrf_soma_as_contribuicoes_de_cada_ranking():
+    fundidos = dict(fundir_rrf(["a", "b", "c"], ["c", "a"], k_rrf=60))
+    assert fundidos["a"] == 1 / 61 + 1 / 62
+    assert fundidos["c"] == 1 / 63 + 1 / 61
+    assert fundidos["b"] == 1 / 62
+    assert [id_chunk for id_chunk, _ in fundir_rrf(["a", "b", "c"], ["c", "a"])] == ["a", "c", "b"]
+
+
+def test_rrf_sem_ids_repetidos():
+    fundidos = fundir_rrf(["a", "b"], ["b", "a"], ["a"])
+    assert sorted(id_chunk for id_chunk, _ in fundidos) == ["a", "b"]
+
+
+def test_tokenizar_mantem_elementos_tecnicos_inteiros():
+    tokens = tokenizar("Defina `MAX_WORKERS=8` e exporte $HOME antes de rodar ./scripts/build.sh")
+    assert "max_workers=8" in tokens
+    assert "$home" in tokens
+    assert "./scripts/build.sh" in tokens
+    assert "de" not in tokens
+
+
+def test_busca_e_persistencia(tmp_path):
+    indice = IndiceBM25.construir(
+        ["c1", "c2", "c3"],
+        ["O cache de respostas expira pelo TTL.", "O índice FAISS guarda os vetores.", "Configure o TTL do cache."])
+    assert [id_chunk for id_chunk, _ in indice.buscar("TTL do cache", 2)] in (["c1", "c3"], ["c3", "c1"])
+    assert indice.buscar("inexistente", 3) == []
+
+    indice.salvar(str(tmp_path))
+    recarregado = IndiceBM25.carregar(str(tmp_path))
+    assert recarregado.buscar("vetores", 1) == indice.buscar("vetores", 1)
+    assert IndiceBM25.carregar(str(tmp_path / "vazio")) is None
+
+
+def test_lotes_equivalem_a_construcao_de_uma_vez(tmp_path):
+    ids = [f"c{i}" for i in range(6)]
+    textos = [f"documento {i} sobre cache" + " ttl" * i for i in range(6)]
+    indice = IndiceBM25(str(tmp_path / "bm25.sqlite"))
+    indice.adicionar(ids[:4], textos[:4])
+    indice.adicionar(ids[4:], textos[4:])
+    indice.finalizar()
+    assert indice.buscar("ttl cache", 4) == IndiceBM25.construir(ids, textos).buscar("ttl cache", 4)
+    indice.fechar()
+
+    recarregado = IndiceBM25.carregar(str(tmp_path))
+    assert len(recarregado) == 6
+    assert [id_chunk for id_chunk, _ in recarregado.buscar("ttl", 2)] == ["c5", "c4"]
+
+
+def test_ignora_o_formato_json_antigo(tmp_path):
+    (tmp_path / "bm25.json").write_text('{"versao": 1}')
+    assert IndiceBM25.carregar(str(tmp_path)) is None
@@ -0,0 +1,73 @@
+import time
+import asyncio
+
+import pytest
+
+from inicializacao_gateway import InicializacaoGateway, ComponenteIndisponivel, ESTADO_ERRO, ESTADO_PRONTO
+
+
+def test_aquecimento_segue_a_ordem_pedida():
+    inicializacao = InicializacaoGateway()
+    ordem = []
+    for nome in ("modelo_local:gerador", "modelo_embeddings", "indices_rag"):
+        inicializacao.registrar(nome, lambda nome=nome: ordem.append(nome))
+    inicializacao.aquecer_em_segundo_plano(["modelo_embeddings", "indices_rag", "modelo_local:gerador"])
+    inicializacao._thread.join(timeout=5)
+    assert ordem == ["modelo_embeddings", "indices_rag", "modelo_local:gerador"]
+    assert inicializacao.pronto()
+
+
+def test_carga_unica_com_pedidos_simultaneos():
+    inicializacao = InicializacaoGateway()
+    cargas = []
+
+    def carregar():
+        cargas.append(1)
+        time.sleep(0.1)
+        return "modelo"
+
+    inicializacao.registrar("modelo", carregar)
+
+    async def pedidos():
+        return await asyncio.gather(*(inicializacao.aguardar("modelo", timeout=5) for _ in range(5)))
+
+    assert asyncio.run(pedidos()) == ["modelo"] * 5
+    assert len(cargas) == 1
+
+
+def test_componente_com_erro_nao_e_recarregado_a_cada_pedido():
+    inicializacao = InicializacaoGateway()
+    cargas = []
+
+    def falhar():
+        cargas.append(1)
+        raise RuntimeError("sem memória")
+
+    inicializacao.registrar("modelo", falhar)
+    with pytest.raises(ComponenteIndisponivel):
+        asyncio.run(inicializacao.aguardar("modelo", timeout=5))
+    with pytest.raises(ComponenteIndisponivel):
+        asyncio.run(inicializacao.aguardar("modelo", timeout=5))
+    assert len(cargas) == 1
+    assert inicializacao.componentes["modelo"].estado == ESTADO_ERRO
+    assert not inicializacao.pronto()
+
+
+def test_espera_esgotada_responde_indisponivel():
+    inicializacao = InicializacaoGateway()
+    inicializacao.registrar("modelo", lambda: time.sleep(0.3) or "ok")
+    with pytest.raises(ComponenteIndisponivel):
+        asyncio.run(inicializacao.aguardar("modelo", timeout=0.01))
+    assert asyncio.run(inicializacao.aguardar("modelo", timeout=5)) == "ok"
+    assert inicializacao.componentes["modelo"].estado == ESTADO_PRONTO
+
+
+def test_componente_opcional_nao_bloqueia_prontidao():
+    inicializacao = InicializacaoGateway()
+    inicializacao.registrar("indices_rag", lambda: None)
+    inicializacao.registrar("modelo_local:gerador", lambda: None, obrigatorio=False)
+    inicializacao.carregar("indices_rag")
+    assert inicializacao.pronto()
+    with inicializacao.etapa("configuracao"):
+        pass
+    assert [etapa["etapa"] for etapa in inicializacao.status()["etapas"]] == ["configuracao"]
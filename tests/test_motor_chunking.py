@@ -0,0 +1,43 @@
+from motor_chunking import chunkificar, gerar_id_chunk
+
+
+def texto_exemplo(ultimo: str = "O fim do documento chega aqui.") -> str:
+    paragrafos = [" ".join(f"Frase {i}.{j} sobre o pipeline de ingestão de dados." for j in range(5)) for i in range(6)]
+    return "\n\n".join(paragrafos + [ultimo])
+
+
+def test_offsets_apontam_para_o_texto_original():
+    texto = texto_exemplo()
+    chunks = chunkificar(texto, tamanho_minimo=200, sobreposicao=1)
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert texto[chunk["inicio"]:chunk["fim"]] == chunk["texto"]
+    assert all(len(chunk["texto"]) >= 200 for chunk in chunks[:-1])
+
+
+def test_sobreposicao_repete_a_ultima_sentenca():
+    chunks = chunkificar(texto_exemplo(), tamanho_minimo=200, sobreposicao=1)
+    for anterior, seguinte in zip(chunks, chunks[1:]):
+        assert seguinte["inicio"] < anterior["fim"]
+
+
+def test_ids_estaveis_quando_outra_parte_muda():
+    antes = chunkificar(texto_exemplo(), tamanho_minimo=200, namespace="fonte.txt")
+    depois = chunkificar(texto_exemplo("Um final reescrito, bem diferente."), tamanho_minimo=200, namespace="fonte.txt")
+    assert [c["id"] for c in antes[:-1]] == [c["id"] for c in depois[:-1]]
+    assert antes[-1]["id"] != depois[-1]["id"]
+
+
+def test_ids_dependem_do_namespace_e_da_ocorrencia():
+    assert gerar_id_chunk("x", "a") != gerar_id_chunk("x", "b")
+    texto = "Bloco repetido aqui.\n\nBloco repetido aqui."
+    chunks = chunkificar(texto, tamanho_minimo=1, separador=None)
+    assert [c["texto"] for c in chunks] == ["Bloco repetido aqui."] * 2
+    assert chunks[0]["id"] != chunks[1]["id"]
+
+
+def test_bloco_de_codigo_nao_e_cortado():
+    codigo = "```\nx = 1.\ny = 2.\n```"
+    texto = f"Introdução curta. {codigo} Depois do código."
+    chunks = chunkificar(texto, tamanho_minimo=5, quebrar_em_codigo=True)
+    assert codigo in [c["texto"] for c in chunks]
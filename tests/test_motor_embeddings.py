@@ -0,0 +1,68 @@
+import numpy as np
+
+from motor_embeddings import MotorEmbeddings, MINIMO_TEXTOS_MULTIPROCESSO
+
+
+class ModeloFalso:
+    """Imita o SentenceTransformer: o vetor de cada texto é (tamanho, soma dos códigos dos caracteres)."""
+
+    def __init__(self):
+        self.chamadas = []
+
+    @staticmethod
+    def _vetores(textos):
+        return np.array([[len(t), sum(map(ord, t))] for t in textos], dtype=np.float32)
+
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        self.chamadas.append(("encode", list(textos), batch_size))
+        return self._vetores(textos)
+
+    def start_multi_process_pool(self, target_devices):
+        return {"dispositivos": target_devices}
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+    def encode_multi_process(self, textos, pool, batch_size=32, chunk_size=None):
+        self.chamadas.append(("multi", list(textos), batch_size, chunk_size, len(pool["dispositivos"])))
+        return self._vetores(textos)
+
+
+def criar_motor(**parametros) -> MotorEmbeddings:
+    motor = MotorEmbeddings("modelo", carregar_agora=False, verboso=False, **parametros)
+    motor._modelo = ModeloFalso()
+    return motor
+
+
+def test_lotes_ordenados_por_tamanho_e_resultado_na_ordem_original():
+    motor = criar_motor(tamanho_lote=8)
+    textos = ["médio texto", "a", "um texto bem mais longo que os outros", "bb"]
+    vetores = motor.embed_documents(textos)
+
+    assert vetores == ModeloFalso._vetores(textos).tolist()
+    operacao, enviados, tamanho_lote = motor.modelo.chamadas[0]
+    assert operacao == "encode" and tamanho_lote == 8
+    assert enviados == sorted(textos, key=len, reverse=True)
+    assert motor.total_textos == 4
+
+
+def test_pool_de_processos_so_a_partir_do_minimo_de_textos():
+    motor = criar_motor(tamanho_lote=16, processos=2)
+    poucos = [f"texto {i}" for i in range(MINIMO_TEXTOS_MULTIPROCESSO - 1)]
+    muitos = [f"texto {'x' * (i % 7)} {i}" for i in range(MINIMO_TEXTOS_MULTIPROCESSO * 2)]
+    motor.embed_documents(poucos)
+    vetores = motor.embed_documents(muitos)
+
+    assert [chamada[0] for chamada in motor.modelo.chamadas] == ["encode", "multi"]
+    _, _, tamanho_lote, chunk_size, processos = motor.modelo.chamadas[1]
+    assert (tamanho_lote, processos) == (16, 2)
+    assert chunk_size == len(muitos) // (2 * 4)
+    assert vetores == ModeloFalso._vetores(muitos).tolist()
+
+
+def test_perguntas_em_um_unico_lote():
+    motor = criar_motor(tamanho_lote=4)
+    perguntas = [f"pergunta {i}" for i in range(10)]
+    assert motor.embed_queries(perguntas) == ModeloFalso._vetores(perguntas).tolist()
+    assert motor.modelo.chamadas == [("encode", perguntas, 10)]
+    assert motor.total_textos == 0
@@ -0,0 +1,83 @@
+import os
+import shutil
+
+from langchain_community.vectorstores import FAISS
+
+from armazenamento_indice import salvar_indice_mmap
+from indice_bm25 import IndiceBM25
+from repositorio_indices import (RepositorioIndices, nova_pasta_versao, publicar_versao, ler_versao_atual,
+                                 PASTA_VERSOES)
+
+
+def publicar(pasta_contexto: str, embeddings, textos: list, **parametros) -> str:
+    """Grava e publica uma versão do contexto com os textos dados (um chunk por texto)."""
+    pasta_versao = nova_pasta_versao(pasta_contexto)
+    ids = [f"id{i}" for i in range(len(textos))]
+    db = FAISS.from_texts(textos, embeddings, metadatas=[{"source": "fonte"}] * len(textos), ids=ids)
+    salvar_indice_mmap(pasta_versao, db, "modelo")
+    bm25 = IndiceBM25.construir(ids, textos)
+    bm25.salvar(pasta_versao)
+    bm25.fechar()
+    publicar_versao(pasta_contexto, pasta_versao, **parametros)
+    return os.path.basename(pasta_versao)
+
+
+def primeiro_texto(versao, embeddings) -> str:
+    documento, _ = versao.indice.similarity_search_with_score_by_vector(embeddings.embed_query("x"), k=1)[0]
+    return documento.page_content
+
+
+def test_sincronizar_carrega_recarrega_e_descarrega(tmp_path, embeddings):
+    pasta_contexto = str(tmp_path / "ctx")
+    repositorio = RepositorioIndices(embeddings, str(tmp_path))
+    assert repositorio.sincronizar() == []
+
+    primeira = publicar(pasta_contexto, embeddings, ["versão um"])
+    assert repositorio.sincronizar() == ["ctx"]
+    assert repositorio.sincronizar() == []
+    assert repositorio.status()["contextos"]["ctx"]["versao"] == primeira
+
+    segunda = publicar(pasta_contexto, embeddings, ["versão dois"])
+    assert repositorio.sincronizar() == ["ctx"]
+    assert repositorio.status()["contextos"]["ctx"]["versao"] == segunda
+    assert [id_chunk for id_chunk, _ in repositorio.obter_bm25("ctx").buscar("dois", 1)] == ["id0"]
+
+    shutil.rmtree(pasta_contexto)
+    assert repositorio.sincronizar() == ["ctx"]
+    assert repositorio.contextos() == []
+
+
+def test_versao_substituida_so_fecha_depois_da_ultima_busca(tmp_path, embeddings):
+    pasta_contexto = str(tmp_path / "ctx")
+    publicar(pasta_contexto, embeddings, ["versão um"])
+    repositorio = RepositorioIndices(embeddings, str(tmp_path))
+    repositorio.carregar_todos()
+    fechadas = []
+
+    with repositorio.usar(["ctx"]) as versoes:
+        antiga = versoes["ctx"]
+        fechar = antiga.fechar
+        antiga.fechar = lambda: (fechadas.append(antiga), fechar())
+        publicar(pasta_contexto, embeddings, ["versão dois"])
+        repositorio.sincronizar()
+
+        # A busca em andamento continua na versão antiga; as novas já usam a recarregada
+        assert antiga.aposentada and not fechadas
+        assert primeiro_texto(antiga, embeddings) == "versão um"
+        with repositorio.usar(["ctx"]) as novas:
+            assert primeiro_texto(novas["ctx"], embeddings) == "versão dois"
+        assert repositorio.status()["contextos"]["ctx"]["buscas_em_andamento"] == 0
+    assert fechadas == [antiga]
+
+
+def test_publicar_so_apaga_versoes_substituidas_ha_mais_que_a_retencao(tmp_path, embeddings):
+    pasta_contexto = str(tmp_path / "ctx")
+    pasta_versoes = os.path.join(pasta_contexto, PASTA_VERSOES)
+    versoes = [publicar(pasta_contexto, embeddings, [f"versão {i}"]) for i in range(3)]
+    # Substituídas agora há pouco: o gateway pode ainda nem ter trocado para a nova
+    assert sorted(os.listdir(pasta_versoes)) == versoes
+
+    em_gravacao = os.path.basename(nova_pasta_versao(pasta_contexto))
+    ultima = publicar(pasta_contexto, embeddings, ["versão final"], retencao_segundos=0)
+    assert sorted(os.listdir(pasta_versoes)) == sorted([em_gravacao, ultima])
+    assert ler_versao_atual(pasta_contexto) == ultima
@@ -0,0 +1,264 @@
+import os
+import json
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+servidor = pytest.importorskip("servidor_modelo_local")
+
+from agendador_local import AgendadorModeloLocal
+from analisador_documentos import RepositorioDocumentos
+from armazenamento_indice import salvar_indice_mmap
+from cache_respostas import CacheRespostas
+from indice_bm25 import IndiceBM25
+from repositorio_indices import RepositorioIndices, VersaoIndice, nova_pasta_versao, publicar_versao
+
+
+class ModeloFalso:
+    """Imita o `Llama` em modo stream; segura a geração até `liberar` ser sinalizado."""
+
+    def __init__(self):
+        self.liberar = threading.Event()
+        self.prompts = []
+
+    def __call__(self, prompt, stop=None, stream=True, **params):
+        self.prompts.append(prompt)
+        self.liberar.wait(5)
+        for token in ("a", "b"):
+            yield {"choices": [{"text": token}]}
+
+
+@pytest.fixture
+def agendador(monkeypatch):
+    agendador = AgendadorModeloLocal("gerador", ModeloFalso(), {}, capacidade_fila=1)
+
+    async def obter_agendador_local(service_name):
+        return agendador
+
+    monkeypatch.setitem(servidor.CONFIG, "servicos", {"gerador": {"tipo": "local"}})
+    monkeypatch.setattr(servidor, "obter_agendador_local", obter_agendador_local)
+    return agendador
+
+
+def test_stream_abandonado_antes_de_comecar_nao_ocupa_a_fila(agendador):
+    async def cenario():
+        # O cliente desconecta antes do primeiro evento: o corpo da resposta nunca é iterado
+        await servidor.execute_request_stream("gerador", "p0")
+        assert agendador.status()["profundidade_fila"] == 0
+        agendador.modelo.liberar.set()
+        return await agendador.gerar("p1")
+
+    assert asyncio.run(cenario()) == "ab"
+    assert agendador.modelo.prompts == ["p1"]
+
+
+def test_stream_fechado_no_primeiro_evento_cancela_a_tarefa(agendador):
+    async def cenario():
+        resposta = await servidor.execute_request_stream("gerador", "p0", eventos_iniciais=["evento: contexto\n\n"])
+        assert await resposta.body_iterator.__anext__() == "evento: contexto\n\n"
+        await resposta.body_iterator.aclose()
+        assert agendador.status()["profundidade_fila"] == 0
+        agendador.modelo.liberar.set()
+        return await agendador.gerar("p1")
+
+    assert asyncio.run(cenario()) == "ab"
+
+
+def test_fila_cheia_responde_429_antes_de_abrir_o_stream(agendador):
+    async def cenario():
+        ocupada = agendador.submeter("p0")
+        with pytest.raises(HTTPException) as erro:
+            await servidor.execute_request_stream("gerador", "p1")
+        agendador.cancelar(ocupada)
+        return erro.value
+
+    erro = asyncio.run(cenario())
+    assert erro.status_code == 429
+    assert "Retry-After" in erro.headers
+
+
+def test_documento_enviado_pode_ser_apagado(tmp_path, monkeypatch):
+    monkeypatch.setattr(servidor, "repositorio_documentos", RepositorioDocumentos(pasta=str(tmp_path)))
+    cliente = TestClient(servidor.app)
+    id_documento = cliente.post("/documentos", json={"nome": "doc.txt", "texto": "conteúdo"}).json()["id"]
+    assert cliente.delete(f"/documentos/{id_documento}").json() == {"id": id_documento, "removido": True}
+    assert cliente.delete(f"/documentos/{id_documento}").status_code == 404
+    assert cliente.post("/analisar_documentos", json={"ids_documentos": [id_documento], "pergunta": "?"}).status_code == 404
+
+
+def publicar_contexto(pasta_base: str, id_contexto: str, textos: list, embeddings):
+    pasta_contexto = os.path.join(pasta_base, id_contexto)
+    pasta_versao = nova_pasta_versao(pasta_contexto)
+    ids = [f"{id_contexto}-{i}" for i in range(len(textos))]
+    metadados = [{"source": f"{id_contexto}.txt"}] * len(textos)
+    salvar_indice_mmap(pasta_versao, FAISS.from_texts(textos, embeddings, metadatas=metadados, ids=ids), "modelo")
+    bm25 = IndiceBM25.construir(ids, textos)
+    bm25.salvar(pasta_versao)
+    bm25.fechar()
+    publicar_versao(pasta_contexto, pasta_versao)
+
+
+@pytest.fixture
+def gateway(tmp_path, monkeypatch, embeddings):
+    """Gateway com dois contextos indexados; a geração e o embedding das perguntas são simulados."""
+    pasta_indices = str(tmp_path / "indices")
+    publicar_contexto(pasta_indices, "python", ["Listas em Python são mutáveis.", "Tuplas em Python são imutáveis.",
+                                                "O GIL serializa bytecode Python."], embeddings)
+    publicar_contexto(pasta_indices, "redes", ["O TCP garante a entrega em ordem.", "O UDP não garante entrega."], embeddings)
+    repositorio = RepositorioIndices(embeddings, pasta_indices)
+    repositorio.carregar_todos()
+    geracoes = []
+    perguntas_embutidas = []
+
+    async def pronto(nome):
+        return None
+
+    async def embutir_pergunta(pergunta):
+        perguntas_embutidas.append(pergunta)
+        return embeddings.embed_query(pergunta)
+
+    async def execute_request(service_name, prompt_final):
+        geracoes.append((service_name, prompt_final))
+        return {"texto_gerado": f"resposta {len(geracoes)}"}
+
+    monkeypatch.setattr(servidor, "repositorio_indices", repositorio)
+    monkeypatch.setattr(servidor, "aguardar_componente", pronto)
+    monkeypatch.setattr(servidor, "embutir_pergunta", embutir_pergunta)
+    monkeypatch.setattr(servidor, "execute_request", execute_request)
+    monkeypatch.setattr(servidor, "cache_respostas", CacheRespostas(caminho=str(tmp_path / "respostas.json")))
+    monkeypatch.setitem(servidor.contadores_tokens, "gerador_principal", lambda texto: len(texto.split()))
+    monkeypatch.setitem(servidor.contadores_tokens, "sumarizador", lambda texto: len(texto.split()))
+    return {"cliente": TestClient(servidor.app), "geracoes": geracoes, "perguntas_embutidas": perguntas_embutidas}
+
+
+def test_buscar_usa_o_indice_residente_do_gateway(gateway):
+    cliente = gateway["cliente"]
+    resposta = cliente.post("/buscar", json={"contexto": "python", "pergunta": "tuplas imutáveis", "k": 2}).json()
+    assert resposta["contexto"] == "python"
+    assert len(resposta["resultados"]) == 2
+    assert resposta["resultados"][0]["conteudo"] == "Tuplas em Python são imutáveis."
+    assert {r["contexto"] for r in resposta["resultados"]} == {"python"}
+
+    bm25 = cliente.post("/buscar", json={"contexto": "python", "pergunta": "GIL", "k": 1, "modo_busca": "bm25"}).json()
+    assert [r["id"] for r in bm25["resultados"]] == ["python-2"]
+    assert cliente.post("/buscar", json={"contexto": "inexistente", "pergunta": "x"}).status_code == 404
+    assert cliente.post("/buscar", json={"contexto": "python", "pergunta": "x", "modo_busca": "outro"}).status_code == 422
+
+
+def test_rag_busca_gera_e_reaproveita_a_resposta(gateway):
+    cliente = gateway["cliente"]
+    pedido = {"contexto": "redes", "pergunta": "O TCP garante a entrega?", "k": 2}
+    primeira = cliente.post("/rag", json=pedido).json()
+    assert primeira["texto_gerado"] == "resposta 1"
+    assert primeira["fontes"] == ["redes.txt"]
+    assert primeira["uso_contexto"]["chunks_usados"] == 2
+    servico, prompt = gateway["geracoes"][0]
+    assert servico == "gerador_principal" and "O TCP garante a entrega em ordem." in prompt
+
+    segunda = cliente.post("/rag", json=pedido).json()
+    assert (segunda["texto_gerado"], segunda.get("cache")) == ("resposta 1", True)
+    assert len(gateway["geracoes"]) == 1
+
+
+def test_rag_com_resumo_passa_pelo_sumarizador(gateway):
+    cliente = gateway["cliente"]
+    resposta = cliente.post("/rag", json={"contexto": "python", "pergunta": "listas", "k": 2, "usar_resumo": True}).json()
+    assert [servico for servico, _ in gateway["geracoes"]] == ["sumarizador", "gerador_principal"]
+    assert "resposta 1" in gateway["geracoes"][1][1]
+    assert resposta["texto_gerado"] == "resposta 2"
+
+
+def test_cliente_http_usa_o_pool_configurado(monkeypatch):
+    criados = []
+    monkeypatch.setattr(servidor.httpx, "AsyncClient", lambda **parametros: criados.append(parametros))
+    monkeypatch.setitem(servidor.CONFIG, "cliente_http", {"max_conexoes": 5, "max_conexoes_keepalive": 2,
+                                                          "keepalive_expiry": 12.0, "http2": True, "timeout": 60.0})
+    # Sem o pacote 'h2' o cliente cai para HTTP/1.1 em vez de falhar na subida
+    monkeypatch.setattr(servidor.importlib.util, "find_spec", lambda nome: None)
+    servidor.criar_cliente_http()
+    parametros = criados[0]
+    assert (parametros["limits"].max_connections, parametros["limits"].max_keepalive_connections) == (5, 2)
+    assert parametros["limits"].keepalive_expiry == 12.0
+    assert parametros["http2"] is False
+    assert parametros["timeout"].read == 60.0
+
+
+def test_chamadas_a_nuvem_reutilizam_o_cliente_do_gateway(monkeypatch):
+    requisicoes = []
+
+    def responder(requisicao):
+        requisicoes.append(requisicao)
+        if json.loads(requisicao.content).get("stream"):
+            corpo = 'data: {"choices": [{"delta": {"content": "o"}}]}\n\ndata: {"choices": [{"delta": {"content": "i"}}]}\n\ndata: [DONE]\n\n'
+            return servidor.httpx.Response(200, text=corpo)
+        return servidor.httpx.Response(200, json={"choices": [{"message": {"content": " oi "}}]})
+
+    cliente = servidor.httpx.AsyncClient(transport=servidor.httpx.MockTransport(responder))
+    monkeypatch.setattr(servidor, "cliente_http", cliente)
+    monkeypatch.setattr(servidor, "OPENROUTER_KEY", "chave")
+    monkeypatch.setitem(servidor.CONFIG, "servicos", {"gerador": {"tipo": "nuvem", "id_openrouter": "modelo"}})
+    monkeypatch.setattr(servidor.httpx, "AsyncClient", lambda *a, **k: pytest.fail("não deveria abrir outro cliente"))
+
+    async def cenario():
+        respostas = [await servidor.execute_request("gerador", "p") for _ in range(2)]
+        tokens = [token async for token in servidor.stream_nuvem("gerador", "p")]
+        await cliente.aclose()
+        return respostas, tokens
+
+    respostas, tokens = asyncio.run(cenario())
+    assert respostas == [{"texto_gerado": "oi"}] * 2
+    assert tokens == ["o", "i"]
+    assert len(requisicoes) == 3
+    assert all(r.headers["Authorization"] == "Bearer chave" for r in requisicoes)
+
+
+class IndiceFalso:
+    """Devolve resultados vetoriais fixos; `docstore` materializa os chunks achados só pelo BM25."""
+
+    def __init__(self, contexto: str, distancias: list, ids: list):
+        self.documentos = {i: Document(page_content=f"{contexto}:{i}", metadata={"source": contexto}, id=i) for i in ids}
+        self.distancias = distancias
+        self.docstore = self
+
+    def similarity_search_with_score_by_vector(self, vetor, k):
+        return [(self.documentos[i], distancia) for i, distancia in self.distancias][:k]
+
+    def search(self, id_chunk):
+        return self.documentos[id_chunk]
+
+
+class BM25Falso:
+    def __init__(self, scores: list):
+        self.scores = scores
+
+    def buscar(self, pergunta, k):
+        return self.scores[:k]
+
+
+def test_busca_federada_funde_os_rankings_de_todos_os_contextos():
+    versoes = {
+        "a": VersaoIndice("a", "v1", IndiceFalso("a", [("x", 0.1), ("y", 0.5)], ["x", "y"]), BM25Falso([("y", 10.0)])),
+        "b": VersaoIndice("b", "v1", IndiceFalso("b", [("x", 0.3)], ["x", "z"]), BM25Falso([("z", 2.0)])),
+    }
+    resultados = asyncio.run(servidor.buscar_nas_versoes(versoes, "pergunta", 4, [0.0], "hibrido"))
+
+    # Distâncias comparadas entre contextos; o BM25 de cada um é normalizado pelo seu melhor score
+    assert [(r["contexto"], r["id"]) for r in resultados] == [("a", "y"), ("a", "x"), ("b", "x"), ("b", "z")]
+    assert [r["conteudo"] for r in resultados] == ["a:y", "a:x", "b:x", "b:z"]
+    assert (resultados[3]["score"], resultados[3]["score_bm25"]) == (None, 1.0)
+    assert resultados[0]["score_rrf"] == pytest.approx(1 / 61 + 1 / 63)
+
+
+def test_buscar_em_todos_os_contextos_embute_a_pergunta_uma_vez(gateway):
+    cliente = gateway["cliente"]
+    resposta = cliente.post("/buscar", json={"contexto": "*", "pergunta": "TCP Python", "k": 5}).json()
+    assert {r["contexto"] for r in resposta["resultados"]} == {"python", "redes"}
+    assert gateway["perguntas_embutidas"] == ["TCP Python"]
+
+    rag = cliente.post("/rag", json={"contexto": "*", "pergunta": "TCP Python", "k": 5}).json()
+    assert rag["fontes"] == ["[python] python.txt", "[redes] redes.txt"]
@@ -0,0 +1,73 @@
+import faiss
+import numpy as np
+import pytest
+
+import tipos_indice
+from tipos_indice import (avaliar_tipos_indice, construir_indice, descrever_factory, normalizar_config_indice,
+                          PONTOS_TREINO_POR_LISTA)
+
+
+def vetores_aleatorios(total: int, dimensao: int = 16, semente: int = 0) -> np.ndarray:
+    return np.random.default_rng(semente).normal(size=(total, dimensao)).astype(np.float32)
+
+
+def test_config_completa_os_padroes_e_rejeita_tipo_desconhecido():
+    assert normalizar_config_indice(None) == {"tipo": "flat"}
+    assert normalizar_config_indice({"tipo": "IVF_FLAT", "nprobe": 4}) == {"tipo": "ivf_flat", "nlist": 256, "nprobe": 4}
+    with pytest.raises(ValueError):
+        normalizar_config_indice({"tipo": "lsh"})
+
+
+def test_nlist_reduzido_quando_a_base_e_pequena():
+    config = normalizar_config_indice({"tipo": "ivf_flat", "nlist": 256})
+    assert descrever_factory(config, 10 * PONTOS_TREINO_POR_LISTA, 16) == "IVF10,Flat"
+    assert descrever_factory(config, 5, 16) == "IVF1,Flat"
+    indice = construir_indice(vetores_aleatorios(10 * PONTOS_TREINO_POR_LISTA), config)
+    assert faiss.extract_index_ivf(indice).nlist == 10
+    assert indice.ntotal == 10 * PONTOS_TREINO_POR_LISTA
+
+
+def test_pq_com_poucos_vetores_cai_para_ivf_flat():
+    indice = construir_indice(vetores_aleatorios(200), {"tipo": "ivf_pq", "nlist": 4, "m": 4, "nbits": 8})
+    assert isinstance(faiss.downcast_index(faiss.extract_index_ivf(indice)), faiss.IndexIVFFlat)
+
+    indice = construir_indice(vetores_aleatorios(300), {"tipo": "ivf_pq", "nlist": 4, "nprobe": 3, "m": 4, "nbits": 4})
+    ivf = faiss.downcast_index(faiss.extract_index_ivf(indice))
+    assert isinstance(ivf, faiss.IndexIVFPQ)
+    assert (ivf.nprobe, ivf.pq.M, ivf.pq.nbits) == (3, 4, 4)
+
+
+def test_pq_exige_m_divisor_da_dimensao():
+    with pytest.raises(ValueError):
+        construir_indice(vetores_aleatorios(300), {"tipo": "ivf_pq", "nlist": 4, "m": 5, "nbits": 4})
+
+
+def test_hnsw_aplica_os_parametros_de_construcao_e_busca():
+    indice = construir_indice(vetores_aleatorios(100), {"tipo": "hnsw", "m": 8, "ef_construcao": 40, "ef_busca": 20})
+    assert (indice.hnsw.efConstruction, indice.hnsw.efSearch) == (40, 20)
+
+
+def test_memmap_em_blocos_com_amostra_de_treino_limitada(tmp_path, monkeypatch):
+    vetores = vetores_aleatorios(1000)
+    caminho = str(tmp_path / "vetores.f32")
+    vetores.tofile(caminho)
+    mapeados = np.memmap(caminho, dtype=np.float32, mode='r', shape=vetores.shape)
+    amostras = []
+    amostra_treino = tipos_indice.amostra_treino
+    monkeypatch.setattr(tipos_indice, "amostra_treino", lambda v, maximo: amostras.append(maximo) or amostra_treino(v, maximo))
+    monkeypatch.setattr(tipos_indice, "MAXIMO_PONTOS_TREINO_POR_LISTA", 50)
+    monkeypatch.setattr(tipos_indice, "VETORES_POR_BLOCO", 300)
+
+    indice = construir_indice(mapeados, {"tipo": "ivf_flat", "nlist": 4, "nprobe": 4})
+    assert amostras == [50 * 4]
+    # Com nprobe == nlist a busca é exata, e as posições seguem a ordem dos vetores
+    _, vizinhos = indice.search(vetores[[0, 499, 999]], 1)
+    assert vizinhos[:, 0].tolist() == [0, 499, 999]
+
+
+def test_relatorio_compara_com_a_busca_exata():
+    relatorio = avaliar_tipos_indice(vetores_aleatorios(400), [{"tipo": "flat"}, {"tipo": "ivf_flat", "nlist": 4, "nprobe": 4}],
+                                     amostras=20, k=5)
+    assert [linha["tipo"] for linha in relatorio] == ["flat", "ivf_flat"]
+    assert all(linha["recall"] == 1.0 for linha in relatorio)
+    assert relatorio[1]["parametros"] == {"nlist": 4, "nprobe": 4}
@@ -0,0 +1,144 @@
+import time
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+# Tipos de índice selecionáveis por contexto em contexts.json, ex:
+#   "indice": {"tipo": "hnsw", "m": 32, "ef_construcao": 200, "ef_busca": 64}
+TIPOS_INDICE = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+PARAMETROS_PADRAO = {
+    "flat": {},
+    "ivf_flat": {"nlist": 256, "nprobe": 16},
+    "ivf_pq": {"nlist": 256, "nprobe": 16, "m": 16, "nbits": 8},
+    "hnsw": {"m": 32, "ef_construcao": 200, "ef_busca": 64},
+}
+# O k-means do FAISS pede ~39 pontos de treino por lista; com menos vetores o nlist é reduzido
+PONTOS_TREINO_POR_LISTA = 39
+# Acima disso o k-means do FAISS já subamostra; a amostra é tirada antes para não copiar a base inteira
+MAXIMO_PONTOS_TREINO_POR_LISTA = 256
+VETORES_POR_BLOCO = 65536
+
+
+def normalizar_config_indice(config: Optional[dict]) -> dict:
+    """Completa a configuração do contexto com os parâmetros padrão do tipo escolhido."""
+    config = dict(config or {})
+    tipo = str(config.pop("tipo", "flat")).lower()
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice inválido: '{tipo}'. Use um de {TIPOS_INDICE}.")
+    return {"tipo": tipo, **PARAMETROS_PADRAO[tipo], **config}
+
+
+def descrever_factory(config: dict, total: int, dimensao: int) -> str:
+    """Traduz a configuração para a string do `faiss.index_factory`, ajustando-a ao tamanho da base."""
+    tipo = config["tipo"]
+    if tipo == "flat":
+        return "Flat"
+    if tipo == "hnsw":
+        return f"HNSW{config['m']}"
+    nlist = max(1, min(config["nlist"], total // PONTOS_TREINO_POR_LISTA))
+    if tipo == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if dimensao % config["m"] != 0:
+        raise ValueError(f"Para IVF-PQ, 'm' ({config['m']}) precisa dividir a dimensão dos vetores ({dimensao}).")
+    return f"IVF{nlist},PQ{config['m']}x{config['nbits']}"
+
+
+def aplicar_parametros_busca(indice: faiss.Index, config: dict):
+    if "nprobe" in config:
+        try:
+            faiss.extract_index_ivf(indice).nprobe = config["nprobe"]
+        except RuntimeError:
+            pass
+    if "ef_busca" in config and hasattr(indice, "hnsw"):
+        indice.hnsw.efSearch = config["ef_busca"]
+
+
+def amostra_treino(vetores: np.ndarray, maximo: int, semente: int = 42) -> np.ndarray:
+    """Até `maximo` vetores sorteados (em ordem de posição, para ler o arquivo mapeado sequencialmente)."""
+    if len(vetores) <= maximo:
+        return np.ascontiguousarray(vetores, dtype=np.float32)
+    posicoes = np.sort(np.random.default_rng(semente).choice(len(vetores), maximo, replace=False))
+    return np.ascontiguousarray(vetores[posicoes], dtype=np.float32)
+
+
+def construir_indice(vetores: np.ndarray, config: Optional[dict]) -> faiss.Index:
+    """
+    Treina (quando necessário) e preenche um índice do tipo configurado. As posições seguem a
+    ordem de `vetores`, que pode ser um np.memmap: o treino usa uma amostra e os vetores são
+    adicionados em blocos, então a matriz inteira nunca é copiada para a memória.
+    """
+    config = normalizar_config_indice(config)
+    total, dimensao = vetores.shape
+    if config["tipo"] == "ivf_pq" and total < 2 ** config["nbits"]:
+        print(f"  ⚠️ AVISO: {total} vetores não bastam para treinar o PQ (mínimo {2 ** config['nbits']}). Usando IVF-Flat.")
+        config = {**config, "tipo": "ivf_flat"}
+    indice = faiss.index_factory(dimensao, descrever_factory(config, total, dimensao), faiss.METRIC_L2)
+    if "ef_construcao" in config and hasattr(indice, "hnsw"):
+        indice.hnsw.efConstruction = config["ef_construcao"]
+    if not indice.is_trained:
+        # Os centróides do IVF e (no IVF-PQ) os do quantizador de produto
+        centroides = max(faiss.extract_index_ivf(indice).nlist, 2 ** config.get("nbits", 0))
+        indice.train(amostra_treino(vetores, MAXIMO_PONTOS_TREINO_POR_LISTA * centroides))
+    for inicio in range(0, total, VETORES_POR_BLOCO):
+        indice.add(np.ascontiguousarray(vetores[inicio:inicio + VETORES_POR_BLOCO], dtype=np.float32))
+    aplicar_parametros_busca(indice, config)
+    return indice
+
+
+def ler_indice_mapeado(caminho: str) -> faiss.Index:
+    """
+    Lê um índice salvo mapeando-o em memória (somente leitura), sem copiá-lo para a RAM.
+    Os IVF mapeiam as listas invertidas (IO_FLAG_MMAP); os demais (Flat, HNSW) mapeiam os
+    vetores (IO_FLAG_MMAP_IFC). O FAISS não aceita as duas flags juntas num IVF.
+    """
+    with open(caminho, "rb") as arquivo:
+        cabecalho = arquivo.read(4)
+    if cabecalho[:2] in (b"Iw", b"Iv"):
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    else:
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(caminho, flags)
+
+
+def avaliar_tipos_indice(vetores: np.ndarray, configs: List[dict], amostras: int = 200, k: int = 10,
+                         semente: int = 42) -> List[dict]:
+    """
+    Compara cada configuração com a busca exata (Flat): recall@k, latência por consulta e
+    tamanho serializado. As consultas são vetores da própria base com um pequeno ruído,
+    para que o resultado não se resuma a achar o próprio chunk.
+    """
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    total, dimensao = vetores.shape
+    k = min(k, total)
+    gerador = np.random.default_rng(semente)
+    consultas = vetores[gerador.choice(total, size=min(amostras, total), replace=False)]
+    consultas = consultas + gerador.normal(scale=0.01, size=consultas.shape).astype(np.float32)
+
+    base = faiss.IndexFlatL2(dimensao)
+    base.add(vetores)
+    _, vizinhos_exatos = base.search(consultas, k)
+
+    relatorio = []
+    for config in configs:
+        config = normalizar_config_indice(config)
+        inicio = time.perf_counter()
+        indice = construir_indice(vetores, config)
+        tempo_construcao = time.perf_counter() - inicio
+
+        latencias, acertos = [], 0
+        for posicao, consulta in enumerate(consultas):
+            inicio = time.perf_counter()
+            _, vizinhos = indice.search(consulta[None, :], k)
+            latencias.append(time.perf_counter() - inicio)
+            acertos += len(set(vizinhos[0].tolist()) & set(vizinhos_exatos[posicao].tolist()))
+        relatorio.append({
+            "tipo": config["tipo"],
+            "parametros": {chave: valor for chave, valor in config.items() if chave != "tipo"},
+            "recall": acertos / (len(consultas) * k) if k else 0.0,
+            "latencia_media_ms": 1000 * float(np.mean(latencias)),
+            "latencia_p95_ms": 1000 * float(np.percentile(latencias, 95)),
+            "construcao_s": tempo_construcao,
+            "tamanho_mb": faiss.serialize_index(indice).nbytes / (1024 * 1024)
+        })
+    return relatorio